@@ -0,0 +1,188 @@
+"""Load generator for the booking HTTP API.
+
+Starts src/api.py against a local PostgreSQL (or targets a running server
+with --url), then runs many concurrent virtual customers, each on its own
+keep-alive connection. A customer opens a random showtime's seat map,
+holds one to three free seats, and confirms the hold (--confirm) or
+releases it. Reports throughput and p50/p95/p99 latency per endpoint,
+plus how often holds lost a race for a seat.
+
+Run it against a scratch database with showtimes provisioned
+(src/provision.py). --reset returns the chosen showtimes' seats to
+Available first, so repeated runs do not sell out.
+
+    python benchmarks/bench_api.py --dsn "dbname=movie_pilot_bench user=postgres" --users 2000 --duration 30
+"""
+import argparse, asyncio, collections, json, os, random, socket, subprocess, sys, time
+from urllib.parse import quote, urlsplit
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+from common import percentile, reset_seats
+from db import DEFAULT_DSN
+
+
+class Client:
+    """Minimal HTTP/1.1 keep-alive client over asyncio streams."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.writer.write((f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n'
+                           f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n').encode() + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length)) if length else None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.statuses = collections.Counter()
+        self.errors = collections.Counter()
+
+    async def timed(self, client, name, method, path, payload=None):
+        start = time.perf_counter()
+        status, body = await client.request(method, path, payload)
+        self.latencies[name].append((time.perf_counter() - start) * 1000)
+        self.statuses[name, status] += 1
+        return status, body
+
+
+async def customer(address, showtime_ids, stats, deadline, confirm_ratio, rng):
+    client = Client(*address)
+    try:
+        while time.monotonic() < deadline:
+            showtime_id = rng.choice(showtime_ids)
+            status, seats = await stats.timed(client, 'seat map', 'GET', f'/showtimes/{showtime_id}/seats')
+            free = [seat['seat_id'] for seat in seats or () if seat['status'] == 'Available'] if status == 200 else []
+            if not free:
+                continue
+            wanted = rng.sample(free, min(len(free), rng.randint(1, 3)))
+            status, held = await stats.timed(client, 'hold', 'POST', f'/showtimes/{showtime_id}/holds', {'seat_ids': wanted})
+            if status != 200:
+                continue
+            path = f"/showtimes/{showtime_id}/holds/{quote(held['session_id'], safe='')}"
+            if rng.random() < confirm_ratio:
+                await stats.timed(client, 'confirm', 'POST', path + '/confirm')
+            else:
+                await stats.timed(client, 'release', 'DELETE', path)
+    except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+        stats.errors[type(e).__name__] += 1
+    finally:
+        await client.close()
+
+
+async def pick_showtimes(address, count):
+    client = Client(*address)
+    try:
+        _, movies = await client.request('GET', '/movies')
+        showtime_ids = []
+        for movie in movies:
+            _, showtimes = await client.request('GET', f"/movies/{movie['movie_id']}/showtimes?limit=20")
+            showtime_ids.extend(showtime['showtime_id'] for showtime in showtimes or ())
+    finally:
+        await client.close()
+    random.shuffle(showtime_ids)
+    return showtime_ids[:count]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(dsn, port, pool_size):
+    server = subprocess.Popen([sys.executable, os.path.join(SRC, 'api.py'), '--dsn', dsn, '--port', str(port),
+                               '--pool-size', str(pool_size)], cwd=os.path.join(SRC, '..'))
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit('The API server exited during startup')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    sys.exit('The API server did not start within 30s')
+
+
+async def run(args, address):
+    showtime_ids = await pick_showtimes(address, args.showtimes)
+    if not showtime_ids:
+        sys.exit('No upcoming showtimes; provision some with src/provision.py first')
+    if args.reset:
+        reset_seats(args.dsn, showtime_ids)
+
+    stats = Stats()
+    rng = random.Random(args.seed)
+    deadline = time.monotonic() + args.duration
+    start = time.perf_counter()
+    await asyncio.gather(*(customer(address, showtime_ids, stats, deadline, args.confirm, random.Random(rng.random()))
+                           for _ in range(args.users)))
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(samples) for samples in stats.latencies.values())
+    print(f'{args.users} customers over {len(showtime_ids)} showtimes for {elapsed:.1f}s: '
+          f'{total} requests ({total / elapsed:,.0f}/s)')
+    for name, samples in stats.latencies.items():
+        codes = ' '.join(f'{status}x{count}' for (endpoint, status), count in sorted(stats.statuses.items()) if endpoint == name)
+        print(f'  {name:>8}: {len(samples) / elapsed:8,.0f}/s  p50={percentile(samples, 50):.1f}ms '
+              f'p95={percentile(samples, 95):.1f}ms p99={percentile(samples, 99):.1f}ms max={max(samples):.1f}ms  [{codes}]')
+    holds = sum(count for (endpoint, _), count in stats.statuses.items() if endpoint == 'hold')
+    if holds:
+        print(f'  holds that lost a race for a seat: {stats.statuses["hold", 409] / holds:.1%}')
+    if stats.errors:
+        print(f'  connection errors: {dict(stats.errors)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=DEFAULT_DSN)
+    parser.add_argument('--url', help='target a running API instead of starting one, e.g. http://127.0.0.1:8080')
+    parser.add_argument('--users', type=int, default=1000, help='concurrent customers, one connection each')
+    parser.add_argument('--duration', type=float, default=20, help='seconds')
+    parser.add_argument('--showtimes', type=int, default=50, help='showtimes the customers spread over')
+    parser.add_argument('--confirm', type=float, default=0.3, help='share of holds that are confirmed')
+    parser.add_argument('--pool-size', type=int, default=20, help="started server's database connections")
+    parser.add_argument('--reset', action='store_true', help="make the chosen showtimes' seats Available first")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        address = (url.hostname, url.port or 80)
+    else:
+        port = free_port()
+        server = start_server(args.dsn, port, args.pool_size)
+        address = ('127.0.0.1', port)
+    try:
+        asyncio.run(run(args, address))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Headless benchmark of the kiosk's book_seats flow, for catching regressions in CI.
+
+Several simulated kiosks book seats against a seeded local PostgreSQL
+through the same code the app uses: BookingService steps run by
+run_steps on a Database pool whose cursors are timed by metrics.QueryTimer.
+Each flow loads a seat map by title, date and time, checks out one to
+MAX_SEATS_PER_BOOKING free seats, then confirms the hold (--confirm of
+the time) or releases it.
+
+Prints p50/p95/p99 per booking step and the slowest SQL statements.
+With --baseline, the step p95s are compared with a saved run and the
+script exits non-zero if any regressed by more than --tolerance;
+--save-baseline writes the current run as the new baseline.
+
+Use a scratch database: --provision creates the schema, movies, seats and
+a schedule if they are missing, and --reset makes every seat of the
+showtimes used Available again so runs are comparable.
+
+    python benchmarks/bench_booking.py --dsn "dbname=movie_pilot_ci user=postgres" --provision --reset \\
+        --baseline benchmarks/booking-baseline.json
+"""
+import argparse, datetime, json, os, random, sys, threading, time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from booking import BookingService
+from catalog import ShowtimeCatalog, time_key
+from common import percentile, reset_seats, seed_movies
+from db import Database, DEFAULT_DSN
+from metrics import Metrics, MetricsExporter, QueryTimer
+from provision import provision_schedule, provision_seats
+from reservations import SeatSelection, new_session_id, run_steps
+from schema import apply_migrations
+
+STEPS = ['seat_map', 'hold', 'confirm', 'release', 'flow']
+
+
+def provision(dsn, movies, days):
+    connection = psycopg2.connect(dsn)
+    try:
+        apply_migrations(connection)
+        with connection.cursor() as cursor:
+            seed_movies(cursor, movies)
+            provision_seats(cursor, 10, 12)
+        connection.commit()
+        # Already scheduled slots are skipped, so this only fills in what is missing
+        times = [datetime.time(hour) for hour in (10, 13, 16, 19, 22)]
+        provision_schedule(connection, datetime.date.today(), days, ['Screen 1', 'Screen 2', 'Screen 3'], times)
+    finally:
+        connection.close()
+
+
+def kiosk(db, booking, showtimes, flows, confirm_ratio, rng, samples, lock):
+    """One kiosk's customers, booking one after another like book_seats and build_seat_map do."""
+    timings = {step: [] for step in STEPS}
+    sold_out = conflicts = 0
+    for _ in range(flows):
+        title, show_date, show_time = rng.choice(showtimes)
+        flow_start = start = time.perf_counter()
+        showtime_id, seats = db.run(lambda connection: run_steps(connection, booking.load_seat_map(title, show_date, show_time)))
+        timings['seat_map'].append(time.perf_counter() - start)
+
+        free = [seat_id for seat_id, status, *_ in seats if status == 'Available']
+        if not free:
+            sold_out += 1
+            continue
+        selection = SeatSelection(showtime_id, booking.max_seats)
+        for seat_id in rng.sample(free, min(len(free), rng.randint(1, booking.max_seats))):
+            selection.toggle(seat_id)
+        session_id = new_session_id()
+        start = time.perf_counter()
+        result = db.run(lambda connection: run_steps(connection, booking.checkout(selection, session_id)))
+        timings['hold'].append(time.perf_counter() - start)
+        if not result.ok:
+            conflicts += 1
+            continue
+
+        step = 'confirm' if rng.random() < confirm_ratio else 'release'
+        start = time.perf_counter()
+        # Like the kiosk: a sale is never retried, a release is
+        db.run(lambda connection: run_steps(connection, getattr(booking, step)(showtime_id, session_id)),
+               retry=step == 'release')
+        timings[step].append(time.perf_counter() - start)
+        timings['flow'].append(time.perf_counter() - flow_start)
+    with lock:
+        for step, values in timings.items():
+            samples[step].extend(values)
+        samples['sold_out'] += sold_out
+        samples['conflicts'] += conflicts
+
+
+def compare(results, baseline, tolerance, slack_ms):
+    regressions = []
+    for step, p95 in results.items():
+        previous = baseline.get(step)
+        if previous is not None and p95 > previous * (1 + tolerance) + slack_ms:
+            regressions.append(f'{step} p95 {previous:.2f}ms -> {p95:.2f}ms')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=DEFAULT_DSN)
+    parser.add_argument('--provision', action='store_true', help='create the schema and seed data if missing')
+    parser.add_argument('--movies', type=int, default=20, help='movies to seed with --provision')
+    parser.add_argument('--days', type=int, default=14, help='days of showtimes to seed with --provision')
+    parser.add_argument('--reset', action='store_true', help="make the chosen showtimes' seats Available first")
+    parser.add_argument('--kiosks', type=int, default=4, help='concurrent kiosks, one pooled connection each')
+    parser.add_argument('--flows', type=int, default=200, help='bookings per kiosk')
+    parser.add_argument('--showtimes', type=int, default=20, help='showtimes the kiosks book')
+    parser.add_argument('--confirm', type=float, default=0.5, help='share of holds that are confirmed')
+    parser.add_argument('--seed', type=int, default=15)
+    parser.add_argument('--metrics-file', help='also write the run as Prometheus text, e.g. for a CI artifact')
+    parser.add_argument('--baseline', help='JSON of step p95s to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='write this run to --baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed p95 growth over the baseline (0.5 = 50%%)')
+    parser.add_argument('--slack-ms', type=float, default=2.0, help='allowed absolute p95 growth, for very fast steps')
+    args = parser.parse_args()
+
+    if args.provision:
+        provision(args.dsn, args.movies, args.days)
+
+    metrics = Metrics()
+    db = Database(args.dsn, max_connections=args.kiosks, query_timer=QueryTimer(metrics, log_path=None))
+    catalog = ShowtimeCatalog()
+    db.run(catalog.refresh)
+    booking = BookingService(catalog)
+
+    rng = random.Random(args.seed)
+    today = datetime.date.today()
+    upcoming = sorted((showtime for showtime in catalog.showtimes() if showtime['show_date'] >= today),
+                      key=lambda showtime: showtime['showtime_id'])
+    if not upcoming:
+        sys.exit('No upcoming showtimes; run with --provision or seed them with src/provision.py')
+    chosen = rng.sample(upcoming, min(args.showtimes, len(upcoming)))
+    if args.reset:
+        reset_seats(args.dsn, [showtime['showtime_id'] for showtime in chosen])
+    # What the kiosk's dropdowns hand to book_seats
+    showtimes = [(catalog.movie(showtime['movie_id'])['title'], str(showtime['show_date']), time_key(showtime['show_time']))
+                 for showtime in chosen]
+
+    samples = {step: [] for step in STEPS}
+    samples.update(sold_out=0, conflicts=0)
+    lock = threading.Lock()
+    threads = [threading.Thread(target=kiosk, args=(db, booking, showtimes, args.flows, args.confirm,
+                                                    random.Random(rng.random()), samples, lock))
+               for _ in range(args.kiosks)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    db.close()
+
+    completed = len(samples['flow'])
+    print(f'{args.kiosks} kiosks x {args.flows} flows over {len(showtimes)} showtimes in {elapsed:.2f}s: '
+          f'{completed} bookings completed ({completed / elapsed:,.0f}/s), '
+          f"{samples['conflicts']} lost a seat to another kiosk, {samples['sold_out']} found the showtime sold out")
+    results = {}
+    for step in STEPS:
+        values = [seconds * 1000 for seconds in samples[step]]
+        if not values:
+            continue
+        results[step] = percentile(values, 95)
+        print(f'  {step:>8}: n={len(values):<6} p50={percentile(values, 50):.2f}ms '
+              f'p95={results[step]:.2f}ms p99={percentile(values, 99):.2f}ms max={max(values):.2f}ms')
+
+    print('slowest statements (by total time; p95 is a histogram bucket bound):')
+    statements = sorted(metrics.histograms('db_query_seconds').items(), key=lambda item: -item[1][1])
+    for labels, (count, total, p50, p95, p99, worst) in statements[:8]:
+        print(f'  {total * 1000:9.1f}ms n={count:<6} p95<={p95 * 1000:.1f}ms max={worst * 1000:.1f}ms  {dict(labels)["statement"]}')
+
+    if args.metrics_file:
+        MetricsExporter(metrics, args.metrics_file).write()
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'Saved baseline to {args.baseline}')
+    elif args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.slack_ms)
+        if regressions:
+            sys.exit('FAIL: ' + '; '.join(regressions))
+        print(f'OK: no step regressed more than {args.tolerance:.0%} against {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark for the offline booking journal.
+
+Measures what an offline checkout waits for: the time from `book` until
+the record is fsynced, for one kiosk clicking alone and for several
+threads booking at once (where the writer batches their fsyncs). Also
+times reopening the journal and a compaction.
+
+    python benchmarks/bench_journal.py --bookings 2000 --threads 8
+"""
+import argparse, os, sys, tempfile, threading, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from common import percentile
+from journal import BookingJournal
+
+
+def book(journal, count, latencies):
+    for n in range(count):
+        start = time.perf_counter()
+        _, written = journal.book(n % 500, [n % 300 + 1, n % 300 + 2], [f'A{n % 300 + 1}', f'A{n % 300 + 2}'])
+        queued = time.perf_counter()
+        written.result()
+        latencies.append(((queued - start) * 1000, (time.perf_counter() - start) * 1000))
+
+
+def report(name, latencies, seconds):
+    queued = [sample[0] for sample in latencies]
+    durable = [sample[1] for sample in latencies]
+    print(f'{name}: {len(latencies)} bookings in {seconds:.2f}s ({len(latencies) / seconds:,.0f}/s)')
+    print(f'  queued:  p50={percentile(queued, 50):.3f}ms p99={percentile(queued, 99):.3f}ms')
+    print(f'  durable: p50={percentile(durable, 50):.2f}ms p99={percentile(durable, 99):.2f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bookings', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--dir', default=None, help='directory for the journal (default: a temporary one)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        path = os.path.join(directory, 'bookings.journal')
+        journal = BookingJournal(path, compact_after=10 ** 9)
+
+        latencies = []
+        start = time.perf_counter()
+        book(journal, args.bookings, latencies)
+        report('one kiosk', latencies, time.perf_counter() - start)
+
+        latencies = []
+        per_thread = args.bookings // args.threads
+        threads = [threading.Thread(target=book, args=(journal, per_thread, latencies)) for _ in range(args.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        report(f'{args.threads} threads', latencies, time.perf_counter() - start)
+
+        # Settle half of the bookings, as a replay would, then compact on the next write
+        for booking in journal.pending()[::2]:
+            journal.mark_synced(booking['id'], booking['seat_numbers'], {})
+        journal.close()
+        size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        journal = BookingJournal(path, compact_after=1)
+        reopen = time.perf_counter() - start
+        start = time.perf_counter()
+        journal.book(0, [1], ['A1'])[1].result()
+        compact = time.perf_counter() - start
+        journal.close()
+        print(f'reopen {size / 1024:,.0f} KiB journal: {reopen * 1000:.1f}ms; '
+              f'compaction to {os.path.getsize(path) / 1024:,.0f} KiB: {compact * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark for bulk provisioning and the seat map query.
+
+Seeds a season of showtimes (90 days x 8 screens x 6 times over a
+15 x 20 hall is ~1.3M showtime_seats rows), records the load time, then
+times book_seats' seat map query for random showtimes and prints its plan.
+
+Run it against a scratch database; it inserts synthetic movies if there are
+fewer than --movies.
+
+    python benchmarks/bench_provision.py --dsn "dbname=movie_pilot_bench user=postgres"
+"""
+import argparse, datetime, os, random, sys, time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from common import percentile, seed_movies
+from db import DEFAULT_DSN
+from provision import provision_schedule, provision_seats
+from reservations import SEAT_MAP_SQL
+from schema import apply_migrations
+
+SEASON_TIMES = ['10:00', '12:30', '15:00', '17:30', '20:00', '22:30']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=DEFAULT_DSN)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--screens', type=int, default=8)
+    parser.add_argument('--movies', type=int, default=20)
+    parser.add_argument('--seat-rows', type=int, default=15)
+    parser.add_argument('--seat-columns', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(args.dsn)
+    apply_migrations(connection)
+    with connection.cursor() as cursor:
+        seed_movies(cursor, args.movies)
+        seat_count = provision_seats(cursor, args.seat_rows, args.seat_columns)
+    connection.commit()
+
+    # Start after anything already scheduled so reruns always add a fresh season
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(max(show_date) + 1, current_date) FROM showtimes")
+        start_date = cursor.fetchone()[0]
+    screens = [f'Screen {n}' for n in range(1, args.screens + 1)]
+    times = [datetime.time.fromisoformat(value) for value in SEASON_TIMES]
+
+    start = time.perf_counter()
+    showtimes, seat_rows = provision_schedule(connection, start_date, args.days, screens, times)
+    load_seconds = time.perf_counter() - start
+
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT showtime_id FROM showtimes WHERE show_date >= %s", (start_date,))
+        showtime_ids = [row[0] for row in cursor.fetchall()]
+        latencies = []
+        for showtime_id in random.choices(showtime_ids, k=args.queries):
+            query_start = time.perf_counter()
+            cursor.execute(SEAT_MAP_SQL, (showtime_id,))
+            cursor.fetchall()
+            latencies.append((time.perf_counter() - query_start) * 1000)
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + SEAT_MAP_SQL, (random.choice(showtime_ids),))
+        plan = '\n'.join(row[0] for row in cursor.fetchall())
+        cursor.execute("SELECT count(*) FROM showtime_seats")
+        total_rows = cursor.fetchone()[0]
+    connection.close()
+
+    print(f'{seat_count} seats per showtime, {showtimes} showtimes, {seat_rows} seat rows added '
+          f'({total_rows} in table)')
+    print(f'load: {load_seconds:.2f}s ({seat_rows / load_seconds if load_seconds else 0:,.0f} rows/s)')
+    print(f'seat map query over {args.queries} showtimes: p50={percentile(latencies, 50):.2f}ms '
+          f'p99={percentile(latencies, 99):.2f}ms')
+    print('plan:')
+    print(plan)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Stress benchmark for the seat reservation engine.
+
+N concurrent clients hammer a single showtime with random bookings. At the
+end the script checks that no seat was sold twice and prints p50/p99 claim
+latency. It then has every client hold seats for one shared session at the
+same moment and checks that the session never ends up over its seat limit.
+
+WARNING: every seat of the chosen showtime is reset to 'Available' before
+the run, so point it at a scratch database or a showtime you can throw away.
+
+    python benchmarks/bench_reservations.py --showtime-id 1 --clients 32
+"""
+import argparse, os, random, statistics, sys, threading, time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from common import percentile, reset_seats
+from db import DEFAULT_DSN
+from reservations import SeatReservationEngine, MAX_SEATS_PER_BOOKING, new_session_id
+from schema import apply_migrations
+
+
+def run_client(dsn, showtime_id, seat_ids, attempts, max_seats, engine, results, lock):
+    connection = psycopg2.connect(dsn)
+    connection.autocommit = True
+    latencies, claimed, conflicts = [], [], 0
+    try:
+        for _ in range(attempts):
+            wanted = random.sample(seat_ids, random.randint(1, min(max_seats, len(seat_ids))))
+            start = time.perf_counter()
+            result = engine.claim(connection, showtime_id, wanted)
+            latencies.append(time.perf_counter() - start)
+            if result.ok:
+                claimed.extend(result.claimed)
+            else:
+                conflicts += 1
+    finally:
+        connection.close()
+    with lock:
+        results['latencies'].extend(latencies)
+        results['claimed'].extend(claimed)
+        results['conflicts'] += conflicts
+
+
+def hold_for_session(dsn, showtime_id, seat_ids, session_id, engine, start):
+    connection = psycopg2.connect(dsn)
+    connection.autocommit = True
+    try:
+        start.wait()
+        engine.hold(connection, showtime_id, seat_ids, session_id)
+    except ValueError:
+        pass  # over the session's limit
+    finally:
+        connection.close()
+
+
+def check_session_holds(dsn, showtime_id, seat_ids, clients, engine):
+    """Every client holds different seats for the same session at once. Returns how many ended up held."""
+    session_id = new_session_id()
+    start = threading.Barrier(clients)
+    threads = [
+        threading.Thread(target=hold_for_session, args=(dsn, showtime_id, seat_ids[i::clients][:1],
+                                                        session_id, engine, start))
+        for i in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    connection = psycopg2.connect(dsn)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM showtime_seats WHERE showtime_id = %s AND held_by = %s",
+                           (showtime_id, session_id))
+            return cursor.fetchone()[0]
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=DEFAULT_DSN)
+    parser.add_argument('--showtime-id', type=int, required=True)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--attempts', type=int, default=50, help='bookings attempted per client')
+    parser.add_argument('--max-seats', type=int, default=MAX_SEATS_PER_BOOKING)
+    args = parser.parse_args()
+
+    setup = psycopg2.connect(args.dsn)
+    setup.autocommit = True
+    apply_migrations(setup)
+    with setup.cursor() as cursor:
+        cursor.execute("UPDATE showtime_seats SET status = 'Available', held_by = NULL, hold_expires_at = NULL "
+                       "WHERE showtime_id = %s", (args.showtime_id,))
+        cursor.execute("SELECT seat_id FROM showtime_seats WHERE showtime_id = %s", (args.showtime_id,))
+        seat_ids = [row[0] for row in cursor.fetchall()]
+    if not seat_ids:
+        sys.exit(f'Showtime {args.showtime_id} has no seats')
+
+    engine = SeatReservationEngine(max_seats=args.max_seats)
+    results = {'latencies': [], 'claimed': [], 'conflicts': 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_client, args=(args.dsn, args.showtime_id, seat_ids, args.attempts,
+                                                  args.max_seats, engine, results, lock))
+        for _ in range(args.clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with setup.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM showtime_seats WHERE showtime_id = %s AND status = 'Sold'", (args.showtime_id,))
+        sold_in_db = cursor.fetchone()[0]
+    setup.close()
+
+    claimed = results['claimed']
+    double_sold = len(claimed) - len(set(claimed))
+    latencies_ms = [latency * 1000 for latency in results['latencies']]
+
+    print(f"clients={args.clients} attempts={len(latencies_ms)} seats={len(seat_ids)} elapsed={elapsed:.2f}s")
+    print(f"successful bookings seats={len(claimed)} rejected bookings={results['conflicts']}")
+    print(f"claim latency p50={percentile(latencies_ms, 50):.2f}ms p99={percentile(latencies_ms, 99):.2f}ms "
+          f"mean={statistics.fmean(latencies_ms) if latencies_ms else 0:.2f}ms")
+    print(f"throughput={len(latencies_ms) / elapsed:.1f} claims/s")
+    if double_sold or sold_in_db != len(claimed):
+        print(f"FAIL: {double_sold} seats double-sold, {sold_in_db} sold in DB vs {len(claimed)} claimed")
+        sys.exit(1)
+    print('OK: no seat was sold twice')
+
+    reset_seats(args.dsn, [args.showtime_id])
+    clients = min(args.clients, len(seat_ids))
+    held = check_session_holds(args.dsn, args.showtime_id, seat_ids, clients, engine)
+    print(f"session holds: {clients} concurrent holds, {held} seats held (limit {args.max_seats})")
+    if held > args.max_seats:
+        print(f"FAIL: one session holds {held} seats, over its limit of {args.max_seats}")
+        sys.exit(1)
+    print('OK: concurrent holds stayed within the session limit')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark for search-as-you-type over a large synthetic catalog.
+
+Builds the in-memory index for 100,000 generated movies, then types a set
+of queries one character at a time and reports the latency of each
+keystroke's search (the top 50 results, as the Search tab requests).
+
+    python benchmarks/bench_search.py --movies 100000
+"""
+import argparse, itertools, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from common import percentile
+from search import MovieSearchIndex
+
+SYLLABLES = ['ka', 'ri', 'mo', 'sen', 'tal', 'vor', 'lin', 'dra', 'pe', 'shu', 'ne', 'zor', 'ga', 'bel',
+             'tri', 'os', 'um', 'fa', 'dex', 'lo', 'ran', 'qui', 'sta', 'mer']
+FAMOUS = ['sinners', 'matrix', 'inception', 'interstellar', 'night', 'dark', 'river', 'star', 'war',
+          'horror', 'golden', 'empire', 'midnight', 'ocean', 'lost', 'secret', 'fire', 'queen', 'storm', 'the', 'of']
+GENRES = ['Action', 'Comedy', 'Drama', 'Horror', 'Sci-Fi', 'Thriller', 'Romance', 'Animation', 'Documentary']
+QUERIES = ['sinners', 'the dark river', 'star war 1999', 'horror night', 'golden empire', 'midnight ocean drama',
+           'lost', 'secret fire', 'interstellar', 'queen of the storm']
+
+
+def synthetic_vocabulary(rng, size=30_000):
+    words = set(FAMOUS)
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))))
+    return sorted(sorted(words), key=lambda word: (word not in FAMOUS, rng.random()))
+
+
+def synthetic_movies(count, seed=7):
+    rng = random.Random(seed)
+    vocabulary = synthetic_vocabulary(rng)
+    # Word frequencies follow a Zipf-like curve, like real titles and synopses
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+    def words(n):
+        return rng.choices(vocabulary, cum_weights=cum_weights, k=n)
+
+    movies = []
+    for movie_id in range(1, count + 1):
+        title = ' '.join(word.capitalize() for word in words(rng.randint(1, 4)))
+        synopsis = ' '.join(words(rng.randint(12, 30)))
+        movies.append({
+            'movie_id': movie_id,
+            'title': f'{title} {movie_id}' if rng.random() < 0.3 else title,
+            'genre': rng.choice(GENRES),
+            'synopsis': synopsis,
+            'release_year': rng.randint(1950, 2026),
+        })
+    return movies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=100_000)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    movies = synthetic_movies(args.movies)
+    start = time.perf_counter()
+    index = MovieSearchIndex(movies)
+    build = time.perf_counter() - start
+
+    latencies = []
+    for query in QUERIES:
+        for length in range(1, len(query) + 1):
+            start = time.perf_counter()
+            index.search(query[:length], limit=args.limit)
+            latencies.append((time.perf_counter() - start) * 1000)
+        # The customer clears the box before the next search
+        index.search('')
+
+    print(f'movies={len(index)} index build={build:.2f}s')
+    print(f'{len(latencies)} keystrokes: p50={percentile(latencies, 50):.2f}ms '
+          f'p99={percentile(latencies, 99):.2f}ms max={max(latencies):.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark for the canvas seat map.
+
+Builds a synthetic hall (5,000 seats by default), then times the initial
+build, a burst of status updates and a full scroll through the hall.
+Needs a display; on a headless machine run it under `xvfb-run`.
+
+    python benchmarks/bench_seatmap.py --rows 50 --columns 100
+"""
+import argparse, os, random, sys, time
+import tkinter as tk
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from seatmap import SeatMapCanvas
+
+
+def row_label(index):
+    # 0 -> 'A', 25 -> 'Z', 26 -> 'AA', ...
+    label = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        label = chr(ord('A') + remainder) + label
+    return label
+
+
+def solid_icon(color, size=48):
+    icon = tk.PhotoImage(width=size, height=size)
+    icon.put(color, to=(0, 0, size, size))
+    return icon
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50)
+    parser.add_argument('--columns', type=int, default=100)
+    parser.add_argument('--updates', type=int, default=1000)
+    args = parser.parse_args()
+
+    root = tk.Tk()
+    root.geometry('1200x800')
+    icons = {'Available': solid_icon('#2e7d32'), 'Selected': solid_icon('#f9a825'), 'Sold': solid_icon('#616161')}
+    seats = [(row * args.columns + column, random.choice(['Available', 'Available', 'Sold']), row_label(row), column)
+             for row in range(args.rows) for column in range(1, args.columns + 1)]
+    seat_ids = [seat[0] for seat in seats]
+
+    seat_map = SeatMapCanvas(root, icons, on_click=lambda seat_id: None)
+    seat_map.pack(fill='both', expand=True)
+    root.update()
+
+    start = time.perf_counter()
+    seat_map.load(seats)
+    root.update()
+    build = time.perf_counter() - start
+    drawn_after_build = seat_map.item_count()
+
+    start = time.perf_counter()
+    for seat_id in random.sample(seat_ids, min(args.updates, len(seat_ids))):
+        seat_map.set_status(seat_id, random.choice(['Available', 'Selected', 'Sold']))
+    root.update()
+    updates = time.perf_counter() - start
+
+    start = time.perf_counter()
+    steps = 20
+    for step in range(steps + 1):
+        seat_map._yview('moveto', step / steps)
+        seat_map._xview('moveto', step / steps)
+        root.update()
+    scroll = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hits = sum(seat_map.seat_at(random.uniform(0, 3000), random.uniform(0, 3000)) is not None for _ in range(10000))
+    hit_test = time.perf_counter() - start
+
+    print(f'seats={len(seats)} rows={args.rows} columns={args.columns}')
+    print(f'build: {build * 1000:.1f}ms ({drawn_after_build} items drawn initially)')
+    print(f'{min(args.updates, len(seat_ids))} status updates: {updates * 1000:.1f}ms')
+    print(f'scroll through hall ({steps + 1} steps): {scroll * 1000:.1f}ms ({seat_map.item_count()} items drawn)')
+    print(f'10000 hit tests: {hit_test * 1000:.1f}ms ({hits} hits)')
+    root.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Helpers shared by the benchmark scripts.
+
+The scripts run as `python benchmarks/<script>.py`, so this module is
+importable as `common`. psycopg2 is imported only by the helpers that
+need it, so the benchmarks that never touch the database do not need it.
+"""
+
+
+def percentile(samples, pct):
+    """The pct-th percentile of samples by nearest rank; 0.0 when there are none."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def seed_movies(cursor, movies):
+    """Insert synthetic movies until there are at least `movies`. Returns how many were added."""
+    cursor.execute("SELECT count(*) FROM movies")
+    missing = movies - cursor.fetchone()[0]
+    if missing <= 0:
+        return 0
+    cursor.execute("""
+        INSERT INTO movies (title, synopsis, content_rating, average_user_rating, release_year, runtime_minutes, genre)
+        SELECT 'Benchmark Movie ' || n, 'Synthetic movie for benchmarks', 'PG-13', 7.0, 2025, 120, 'Drama'
+        FROM generate_series(1, %s) n
+    """, (missing,))
+    return missing
+
+
+def reset_seats(dsn, showtime_ids):
+    """Make every seat of the showtimes Available again so runs are comparable."""
+    import psycopg2
+
+    connection = psycopg2.connect(dsn)
+    with connection, connection.cursor() as cursor:
+        cursor.execute("""
+            UPDATE showtime_seats SET status = 'Available', held_by = NULL, hold_expires_at = NULL
+            WHERE showtime_id = ANY(%s) AND status <> 'Available'
+        """, (showtime_ids,))
+    connection.close()
@@ -0,0 +1,127 @@
+"""Soak test for the tab manager.
+
+Opens and closes tabs 10,000 times the way a kiosk left running all day
+does: mostly new views that are closed again, some views reopened while
+still open (which must reuse the tab), and some left open so the LRU cap
+has to evict them. Each tab holds a few labels, its own PhotoImage and a
+bound callback with a closure, like the real views.
+
+Every 1,000 cycles it samples Python heap (tracemalloc), RSS, and the
+live widget and Tk image counts. It fails if memory keeps growing after
+warm-up, or if any widget or image outlives its tab.
+
+    python benchmarks/soak_tabs.py --cycles 10000
+    xvfb-run python benchmarks/soak_tabs.py     # on a machine without a display
+"""
+import argparse, gc, os, random, sys, time, tracemalloc
+import tkinter as tk
+from tkinter import ttk
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from tabs import TabManager, image_count, widget_count
+
+
+def rss_bytes():
+    # Current (not peak) resident set size, where /proc is available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return None
+
+
+def build_view(frame, n):
+    image = tk.PhotoImage(width=64, height=64)
+    image.put('#336699', to=(0, 0, 64, 64))
+    label = tk.Label(frame, image=image)
+    label.image = image
+    label.pack()
+    for line in range(5):
+        ttk.Label(frame, text=f'View {n} line {line}').pack()
+    payload = list(range(200))
+    ttk.Button(frame, text='Close', command=lambda: payload).pack()
+    frame.bind('<Configure>', lambda event: len(payload), add='+')
+
+
+def sample(root, tabs):
+    gc.collect()
+    root.update()
+    return {
+        'heap': tracemalloc.get_traced_memory()[0],
+        'rss': rss_bytes(),
+        'widgets': widget_count(root),
+        'images': image_count(root),
+        'open': len(tabs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cycles', type=int, default=10_000)
+    parser.add_argument('--max-tabs', type=int, default=8)
+    parser.add_argument('--every', type=int, default=1_000, help='sample every N cycles')
+    parser.add_argument('--tolerance-kib', type=int, default=512, help='allowed heap growth after warm-up')
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        sys.exit(f'No display for Tk ({e}); run under xvfb-run')
+    root.withdraw()
+    notebook = ttk.Notebook(root)
+    notebook.pack(fill='both', expand=True)
+    home = ttk.Frame(notebook)
+    notebook.add(home, text='Home')
+    tabs = TabManager(notebook, max_tabs=args.max_tabs)
+    baseline_widgets, baseline_images = widget_count(root), image_count(root)
+
+    rng = random.Random(13)
+    tracemalloc.start()
+    samples = []
+    start = time.perf_counter()
+    for cycle in range(1, args.cycles + 1):
+        view = rng.choice(['movie', 'showtime', 'seats', 'tickets'])
+        key = rng.randrange(50)
+        frame, created = tabs.open(view, key, text=f'{view} {key}')
+        if created:
+            build_view(frame, cycle)
+        roll = rng.random()
+        if roll < 0.7:
+            tabs.close(frame)
+        # otherwise leave it open: later cycles reuse it or the LRU cap evicts it
+        root.update_idletasks()
+        if cycle % args.every == 0:
+            samples.append((cycle, sample(root, tabs)))
+    elapsed = time.perf_counter() - start
+
+    for frame in list(notebook.tabs()):
+        if frame != str(home):
+            tabs.close(root.nametowidget(frame))
+    final = sample(root, tabs)
+    tracemalloc.stop()
+
+    print(f'{args.cycles} cycles in {elapsed:.1f}s: opened={tabs.opened} reused={tabs.reused} closed={tabs.closed}')
+    for cycle, stats in samples:
+        rss = f"{stats['rss'] / 2 ** 20:.1f}MiB" if stats['rss'] else 'n/a'
+        print(f"  {cycle:>6}: heap={stats['heap'] / 1024:,.0f}KiB rss={rss} "
+              f"widgets={stats['widgets']} images={stats['images']} open={stats['open']}")
+    print(f"  closed all: widgets={final['widgets']} (baseline {baseline_widgets}) "
+          f"images={final['images']} (baseline {baseline_images})")
+
+    failures = []
+    if final['widgets'] != baseline_widgets or final['images'] != baseline_images:
+        failures.append('widgets or images outlived their tabs')
+    if len(samples) >= 2:
+        growth = samples[-1][1]['heap'] - samples[0][1]['heap']
+        if growth > args.tolerance_kib * 1024:
+            failures.append(f'heap grew {growth / 1024:,.0f}KiB after warm-up')
+    if any(stats['open'] > args.max_tabs for _, stats in samples):
+        failures.append('more tabs open than the cap')
+    root.destroy()
+    if failures:
+        sys.exit('FAIL: ' + '; '.join(failures))
+    print('OK: memory, widgets and images stay flat')
+
+
+if __name__ == '__main__':
+    main()
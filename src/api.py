@@ -0,0 +1,251 @@
+"""Asyncio HTTP API over the booking service, for web and mobile clients.
+
+Serves the same booking flow as the kiosk (src/booking.py) with JSON in
+and out, on one event loop backed by an async psycopg connection pool, so
+thousands of open client connections share a handful of database
+connections. Requires `pip install "psycopg[binary,pool]"`.
+
+    python src/api.py --port 8080
+
+    GET    /health
+    GET    /movies
+    GET    /movies/<movie_id>/showtimes[?after=<date>,<time>,<showtime_id>&limit=<1-100>]
+    GET    /showtimes/<showtime_id>/seats
+    POST   /showtimes/<showtime_id>/holds                      {"seat_ids": [...], "session_id": "..."}
+    POST   /showtimes/<showtime_id>/holds/<session_id>/confirm
+    DELETE /showtimes/<showtime_id>/holds/<session_id>
+    GET    /metrics                                            (Prometheus text)
+
+A hold without a session_id starts a new session, returned in the
+response. Holds expire after reservations.HOLD_TTL_SECONDS unless
+confirmed, exactly as at a kiosk.
+
+Request parsing and routing live in src/protocol.py.
+"""
+import argparse, asyncio, sys, time
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+
+from booking import BookingService, SEAT_COLUMNS
+from catalog import ShowtimeCatalog, MOVIES_CHANNEL, SHOWTIMES_CHANNEL
+from db import DEFAULT_DSN
+from metrics import Metrics, QueryTimer
+from protocol import ROUTES, HTTPError, encode_response, parse_body, parse_showtimes_query, read_request, route
+from reservations import new_session_id, run_steps_async
+
+# Seconds an idle keep-alive client may hold its connection open
+IDLE_TIMEOUT = 60
+
+
+def timed_async_cursor(timer):
+    """`db.timed_cursor` for psycopg's async connections."""
+    class TimedAsyncCursor(psycopg.AsyncCursor):
+        async def execute(self, query, params=None, **kwargs):
+            start = time.perf_counter()
+            try:
+                await super().execute(query, params, **kwargs)
+            except Exception:
+                timer.record(query, params, time.perf_counter() - start, failed=True)
+                raise
+            timer.record(query, params, time.perf_counter() - start)
+            return self
+
+    return TimedAsyncCursor
+
+
+class BookingAPI:
+    def __init__(self, dsn=DEFAULT_DSN, pool_size=20):
+        self.dsn = dsn
+        self.catalog = ShowtimeCatalog()
+        self.booking = BookingService(self.catalog)
+        self.metrics = Metrics()
+        # Every statement on the pool is timed, and the slow ones logged
+        cursor_factory = timed_async_cursor(QueryTimer(self.metrics))
+        self.pool = AsyncConnectionPool(dsn, min_size=min(4, pool_size), max_size=pool_size,
+                                        kwargs={'autocommit': True, 'cursor_factory': cursor_factory}, open=False)
+        self._refreshing = asyncio.Lock()
+        self._listener = None
+        self.routes = [(method, pattern, getattr(self, name)) for method, pattern, name in ROUTES]
+
+    async def start(self):
+        await self.pool.open(wait=True)
+        await self.run(self.catalog.refresh_steps())
+        self._listener = asyncio.create_task(self.listen_catalog())
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        await self.pool.close()
+
+    async def run(self, steps):
+        async with self.pool.connection() as connection:
+            return await run_steps_async(connection, steps)
+
+    async def listen_catalog(self):
+        """Keep the catalog current from the NOTIFY feed, like the kiosk's listener thread."""
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.dsn, autocommit=True) as connection:
+                    await connection.execute(f'LISTEN {SHOWTIMES_CHANNEL}')
+                    await connection.execute(f'LISTEN {MOVIES_CHANNEL}')
+                    # Pick up whatever changed while we were not listening
+                    await self.run(self.catalog.refresh_steps())
+                    self.catalog.live = True
+                    async for notify in connection.notifies():
+                        # Applied one at a time, so the changes land in the order they were sent
+                        await self.run(self.catalog.notification_steps(notify.channel, notify.payload))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print('Error in catalog listener, retrying: \n', e)
+            self.catalog.live = False
+            await asyncio.sleep(5)
+
+    async def ensure_catalog(self):
+        # Only matters while the listener is down; then the catalog falls back to its TTL
+        if self.catalog.is_stale():
+            async with self._refreshing:
+                if self.catalog.is_stale():
+                    await self.run(self.catalog.refresh_steps())
+
+    # -- handlers ------------------------------------------------------------
+
+    async def health(self, query, body):
+        return 200, {'status': 'ok', 'catalog': self.catalog.stats(), 'pool': self.pool.get_stats()}
+
+    async def metrics_page(self, query, body):
+        stats = self.pool.get_stats()
+        self.metrics.set('db_pool_size', stats.get('pool_size', 0))
+        self.metrics.set('db_pool_available', stats.get('pool_available', 0))
+        self.metrics.set('db_pool_waiting', stats.get('requests_waiting', 0))
+        return 200, self.metrics.render()
+
+    async def movies(self, query, body):
+        await self.ensure_catalog()
+        return 200, self.booking.movies()
+
+    async def showtimes(self, query, body, movie_id):
+        await self.ensure_catalog()
+        if self.catalog.movie(int(movie_id)) is None:
+            raise HTTPError(404, 'No such movie')
+        after, limit = parse_showtimes_query(query)
+        rows = await self.run(self.booking.upcoming_showtimes(int(movie_id), after, limit))
+        return 200, [dict(zip(['showtime_id', 'show_date', 'show_time', 'screen', 'free_seats'], row)) for row in rows]
+
+    async def seats(self, query, body, showtime_id):
+        rows = await self.run(self.booking.seat_map(int(showtime_id)))
+        if not rows:
+            raise HTTPError(404, 'No such showtime')
+        return 200, [dict(zip(SEAT_COLUMNS, row)) for row in rows]
+
+    async def hold(self, query, body, showtime_id):
+        seat_ids = body.get('seat_ids')
+        if not isinstance(seat_ids, list) or not seat_ids or not all(isinstance(seat_id, int) for seat_id in seat_ids):
+            raise HTTPError(400, 'seat_ids must be a non-empty list of seat ids')
+        session_id = body.get('session_id') or new_session_id()
+        result = await self.run(self.booking.hold(int(showtime_id), seat_ids, str(session_id)))
+        payload = {'session_id': session_id, 'claimed': result.claimed,
+                   'conflicts': {str(seat_id): status for seat_id, status in result.conflicts.items()}}
+        # All or nothing: on a conflict nothing was held
+        return (200 if result.ok else 409), payload
+
+    async def confirm(self, query, body, showtime_id, session_id):
+        sold = await self.run(self.booking.confirm(int(showtime_id), session_id))
+        if not sold:
+            raise HTTPError(409, 'No unexpired holds for this session')
+        return 200, {'sold': sold}
+
+    async def release(self, query, body, showtime_id, session_id):
+        return 200, {'released': await self.run(self.booking.release(int(showtime_id), session_id))}
+
+    # -- HTTP ----------------------------------------------------------------
+
+    def route(self, method, target):
+        """(handler, query, path arguments) for a request; HTTPError if nothing matches."""
+        return route(self.routes, method, target)
+
+    async def dispatch(self, handler, query, args, body):
+        return await handler(query, parse_body(body), *args)
+
+    async def respond(self, method, target, body):
+        start = time.perf_counter()
+        endpoint = 'unmatched'
+        try:
+            handler, query, args = self.route(method, target)
+            endpoint = handler.__name__
+            status, payload = await self.dispatch(handler, query, args, body)
+        except HTTPError as e:
+            status, payload = e.status, {'error': str(e)}
+        except ValueError as e:
+            # Booking rules, e.g. the seat limit
+            status, payload = 400, {'error': str(e)}
+        except (psycopg.OperationalError, psycopg.InterfaceError) as e:
+            print('Error reaching the database: \n', e)
+            status, payload = 503, {'error': 'Database unavailable'}
+        except Exception as e:
+            print(f'Error handling {method} {target}: \n', e)
+            status, payload = 500, {'error': 'Internal error'}
+        self.metrics.observe('http_request_seconds', time.perf_counter() - start, endpoint=endpoint)
+        self.metrics.inc('http_requests_total', endpoint=endpoint, status=status)
+        return status, payload
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), IDLE_TIMEOUT)
+                except HTTPError as e:
+                    writer.write(encode_response(e.status, {'error': str(e)}, keep_alive=False))
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                status, payload = await self.respond(method, target, body)
+                writer.write(encode_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            # Idle, disconnected, or not speaking HTTP: drop the connection
+            pass
+        finally:
+            writer.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=DEFAULT_DSN)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--pool-size', type=int, default=20, help='database connections shared by all clients')
+    parser.add_argument('--backlog', type=int, default=4096, help='pending TCP connections to queue')
+    return parser.parse_args(argv)
+
+
+async def serve(args):
+    api = BookingAPI(args.dsn, args.pool_size)
+    await api.start()
+    server = await asyncio.start_server(api.handle_connection, args.host, args.port, backlog=args.backlog)
+    print(f'Serving the booking API on http://{args.host}:{args.port}', flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await api.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if sys.platform == 'win32':
+        # psycopg's async connections need a selector event loop
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageTk
+
+# Roughly 64 MB of decoded RGBA pixels
+DEFAULT_BUDGET_BYTES = 64 * 1024 * 1024
+
+
+def image_bytes(image):
+    width, height = image.size
+    return width * height * 4
+
+
+class AssetManager:
+    """Shared cache of decoded images and their Tk PhotoImages.
+
+    PNGs are decoded (and resized, for sized variants) on a background
+    thread by `preload`; `get` turns them into PhotoImages on the Tk thread
+    and keeps them in an LRU bounded by `budget_bytes`. Decoded images
+    waiting for `get` count against the same budget, and a preload that
+    does not fit is dropped rather than evicting what is on screen. Each (path, size)
+    pair is cached separately, so pre-scaled variants such as the 48x48
+    seat icons never need to be resized again. `request` is `get` without
+    the wait: the decode stays on the background thread and the PhotoImage
+    is handed over on the Tk thread through `root.after`.
+    """
+
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES, workers=2, on_decode=None, root=None, poll_interval=20):
+        self.budget_bytes = budget_bytes
+        self.root = root
+        self.poll_interval = poll_interval
+        # Optional on_decode(path, size, start, seconds) hook for timing decodes
+        self.on_decode = on_decode
+        self.used_bytes = 0
+        self.decoded_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._photos = OrderedDict()
+        self._decoded = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='assets')
+
+    def decode(self, path, size=None):
+        start = time.perf_counter()
+        image = Image.open(path)
+        if size is not None:
+            image = image.resize(size)
+        image.load()
+        if self.on_decode is not None:
+            self.on_decode(path, size, start, time.perf_counter() - start)
+        return image
+
+    def _decode_into_cache(self, key):
+        image = self.decode(*key)
+        with self._lock:
+            self._pending.pop(key, None)
+            if self.used_bytes + self.decoded_bytes + image_bytes(image) <= self.budget_bytes:
+                self._decoded[key] = image
+                self.decoded_bytes += image_bytes(image)
+        return image
+
+    def _take_decoded(self, key):
+        # Called with the lock held
+        image = self._decoded.pop(key, None)
+        if image is not None:
+            self.decoded_bytes -= image_bytes(image)
+        return image
+
+    def preload(self, paths, size=None):
+        """Decode `paths` (optionally resized to `size`) in the background."""
+        for path in paths:
+            key = (path, size)
+            with self._lock:
+                if key in self._photos or key in self._decoded or key in self._pending:
+                    continue
+                self._pending[key] = self._executor.submit(self._decode_into_cache, key)
+
+    def get(self, path, size=None):
+        """Return a PhotoImage for `path` at `size`. Must be called on the Tk thread."""
+        key = (path, size)
+        photo = self._photos.get(key)
+        if photo is not None:
+            self._photos.move_to_end(key)
+            self.hits += 1
+            return photo
+
+        self.misses += 1
+        with self._lock:
+            image = self._take_decoded(key)
+            pending = self._pending.get(key)
+        if image is None:
+            # Wait for an in-flight decode rather than decoding the file twice
+            image = pending.result() if pending is not None else self.decode(path, size)
+            with self._lock:
+                self._take_decoded(key)
+        return self._add_photo(key, image)
+
+    def _add_photo(self, key, image):
+        photo = ImageTk.PhotoImage(image)
+        self._photos[key] = photo
+        self.used_bytes += image_bytes(image)
+        self._evict()
+        return photo
+
+    def request(self, path, on_ready, size=None):
+        """Call on_ready(photo) on the Tk thread once `path` is decoded. Must be called on the Tk thread.
+
+        Cached and already decoded images are handed over at once; anything
+        else is decoded in the background, never on the Tk thread.
+        """
+        key = (path, size)
+        with self._lock:
+            ready = key in self._photos or key in self._decoded
+        if ready:
+            on_ready(self.get(path, size))
+            return
+        self.preload([path], size)
+        with self._lock:
+            future = self._pending.get(key)
+        if future is None:
+            # Decoded between the two checks
+            on_ready(self.get(path, size))
+            return
+        self.misses += 1
+
+        def deliver():
+            if not future.done():
+                self.root.after(self.poll_interval, deliver)
+                return
+            try:
+                photo = self._photos.get(key)
+                if photo is None:
+                    with self._lock:
+                        self._take_decoded(key)
+                    photo = self._add_photo(key, future.result())
+                on_ready(photo)
+            except Exception as e:
+                print(f'Error loading image {path}: \n', e)
+        deliver()
+
+    def _evict(self):
+        # Evicted PhotoImages stay alive for as long as a widget still shows them
+        while self.used_bytes > self.budget_bytes and len(self._photos) > 1:
+            _, photo = self._photos.popitem(last=False)
+            self.used_bytes -= photo.width() * photo.height() * 4
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'cached': len(self._photos),
+            'used_bytes': self.used_bytes,
+            'decoded_bytes': self.decoded_bytes,
+            'budget_bytes': self.budget_bytes,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,86 @@
+from reservations import SEAT_MAP_SQL, SEAT_STATES_SQL, SeatReservationEngine
+from catalog import upcoming_showtimes_steps
+
+SEAT_COLUMNS = ['seat_id', 'status', 'seat_number', 'row', 'column']
+
+# Showtimes missing from the catalog (e.g. added since the last refresh)
+FIND_SHOWTIME_SQL = """
+    SELECT showtime_id FROM showtimes
+    WHERE movie_id = (SELECT movie_id FROM movies WHERE title = %s)
+      AND show_date = %s AND show_time = %s
+"""
+
+
+class BookingService:
+    """The booking flow with no UI attached: movies, showtimes, seat maps, holds and sales.
+
+    Reads come from the in-memory catalog where possible. Everything that
+    needs the database is returned as SQL steps (see reservations.run_steps)
+    rather than run here, so the Tk app runs them with `run_steps` on its
+    worker threads and the HTTP API runs the same steps with
+    `run_steps_async`. Seat limits and status transitions are enforced by
+    the SeatReservationEngine either way.
+    """
+
+    def __init__(self, catalog, engine=None):
+        self.catalog = catalog
+        self.engine = engine or SeatReservationEngine()
+
+    @property
+    def max_seats(self):
+        return self.engine.max_seats
+
+    def movies(self):
+        return self.catalog.movies()
+
+    def showtimes(self, movie_id):
+        return self.catalog.showtimes_for(movie_id)
+
+    def upcoming_showtimes(self, movie_id, after=None, limit=4):
+        """Steps: the next showtimes of a movie with their free seat counts."""
+        return upcoming_showtimes_steps(movie_id, after, limit)
+
+    def find_showtime(self, title, show_date, show_time):
+        """Steps: the showtime_id for a movie title, date and time, or None."""
+        showtime_id = self.catalog.showtime_id(self.catalog.movie_id_for_title(title), show_date, show_time)
+        if showtime_id is None:
+            rows = yield FIND_SHOWTIME_SQL, (title, show_date, show_time)
+            showtime_id = rows[0][0] if rows else None
+        return showtime_id
+
+    def seat_map(self, showtime_id):
+        """Steps: (seat_id, status, seat_number, row, column) rows in display order.
+
+        Lapsed holds read as Available without waiting for the reaper.
+        """
+        rows = yield SEAT_MAP_SQL, (showtime_id,)
+        return rows
+
+    def seat_states(self, showtime_id):
+        """Steps: {seat_id: (status, held_by)}, in the form of the seat change feed."""
+        rows = yield SEAT_STATES_SQL, (showtime_id,)
+        return {seat_id: (status, held_by) for seat_id, status, held_by in rows}
+
+    def load_seat_map(self, title, show_date, show_time):
+        """Steps: (showtime_id, seat map) for a title, date and time; (None, []) if there is no such showtime."""
+        showtime_id = yield from self.find_showtime(title, show_date, show_time)
+        if showtime_id is None:
+            return None, []
+        seats = yield from self.seat_map(showtime_id)
+        return showtime_id, seats
+
+    def hold(self, showtime_id, seat_ids, session_id):
+        """Steps: hold all of `seat_ids` for `session_id`, or none of them. Returns a ReservationResult."""
+        return self.engine.hold_steps(showtime_id, seat_ids, session_id)
+
+    def checkout(self, selection, session_id):
+        """Steps: hold a local SeatSelection, dropping lost seats from it. Returns a ReservationResult."""
+        return self.engine.checkout_steps(selection, session_id)
+
+    def confirm(self, showtime_id, session_id):
+        """Steps: sell the session's unexpired holds. Returns the sold seat ids."""
+        return self.engine.confirm_steps(showtime_id, session_id)
+
+    def release(self, showtime_id, session_id):
+        """Steps: give back the session's holds. Returns the released seat ids."""
+        return self.engine.release_steps(showtime_id, session_id)
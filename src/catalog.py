@@ -0,0 +1,263 @@
+import datetime, json, threading, time
+
+from reservations import SEAT_IS_FREE_SQL, run_steps
+
+MOVIE_COLUMNS = ['movie_id', 'title', 'synopsis', 'content_rating', 'average_user_rating', 'release_year', 'runtime_minutes', 'genre']
+SHOWTIME_COLUMNS = ['showtime_id', 'movie_id', 'show_date', 'show_time', 'screen']
+
+# Channels the catalog triggers in schema.py notify on
+SHOWTIMES_CHANNEL = 'showtimes_changed'
+MOVIES_CHANNEL = 'movies_changed'
+
+# One changed row, read back after its NOTIFY
+MOVIE_SQL = f"SELECT {', '.join(MOVIE_COLUMNS)} FROM movies WHERE movie_id = %s"
+SHOWTIME_SQL = f"SELECT {', '.join(SHOWTIME_COLUMNS)} FROM showtimes WHERE showtime_id = %s"
+
+
+# Next showtimes of one movie with their free seat counts, one keyset page at a
+# time. Walks showtimes_movie_schedule_idx from the cursor position, and each
+# count reads one showtime's seats through the showtime_seats primary key, so
+# the cost depends on the page size rather than on how many showtimes the movie has.
+UPCOMING_SHOWTIMES_SQL = f"""
+    SELECT st.showtime_id, st.show_date, st.show_time, st.screen, free.seats
+    FROM showtimes st
+    CROSS JOIN LATERAL (
+        SELECT count(*) AS seats
+        FROM showtime_seats
+        WHERE showtime_id = st.showtime_id AND {SEAT_IS_FREE_SQL}
+    ) free
+    WHERE st.movie_id = %(movie_id)s
+      AND (st.show_date, st.show_time, st.showtime_id) > (%(after_date)s, %(after_time)s, %(after_id)s)
+    ORDER BY st.show_date, st.show_time, st.showtime_id
+    LIMIT %(limit)s
+"""
+
+
+def upcoming_showtimes(connection, movie_id, after=None, limit=4):
+    """Next `limit` showtimes for a movie, as (showtime_id, date, time, screen, free_seats) rows.
+
+    `after` is the (show_date, show_time, showtime_id) of the last row of the
+    previous page; by default the list starts from now.
+    """
+    return run_steps(connection, upcoming_showtimes_steps(movie_id, after, limit))
+
+
+def upcoming_showtimes_steps(movie_id, after=None, limit=4):
+    if after is None:
+        now = datetime.datetime.now()
+        after = (now.date(), now.time(), 0)
+    rows = yield UPCOMING_SHOWTIMES_SQL, {
+        'movie_id': movie_id, 'after_date': after[0], 'after_time': after[1],
+        'after_id': after[2], 'limit': limit,
+    }
+    return rows
+
+
+def normalize_title(title):
+    # 'The  Matrix ' and 'the matrix' are the same movie
+    return ' '.join(str(title).casefold().split())
+
+
+def date_key(value):
+    # date objects and the ISO strings in NOTIFY payloads both become 'YYYY-MM-DD'
+    return str(value)[:10]
+
+
+def time_key(value):
+    # time objects and 'HH:MM:SS' strings both become 'HH:MM', matching the dropdowns
+    return str(value)[:5]
+
+
+class ShowtimeCatalog:
+    """In-memory copy of the movies and showtimes tables.
+
+    Showtimes are indexed both by (movie_id, date, time) and as a nested
+    movie -> date -> time schedule, so the ticket dropdowns and showtime
+    resolution never need a query. The cache is kept current by NOTIFY
+    events when a listener is attached, and otherwise refreshed after `ttl`
+    seconds.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.live = False  # True while NOTIFY events are keeping the cache current
+        self.loaded_at = None
+        self.hits = 0
+        self.misses = 0
+        self.version = 0  # Bumped whenever the movies change, so derived indexes know to rebuild
+        self._lock = threading.RLock()
+        self._movies = {}
+        self._movie_ids_by_title = {}
+        self._movie_ids_by_normalized_title = {}
+        self._showtimes = {}
+        self._by_key = {}
+        self._schedule = {}
+
+    # -- loading -----------------------------------------------------------
+
+    def refresh(self, connection):
+        """Reload everything from the database. Runs on a DB worker thread."""
+        return run_steps(connection, self.refresh_steps())
+
+    def refresh_steps(self):
+        movies = yield f"SELECT {', '.join(MOVIE_COLUMNS)} FROM movies ORDER BY movie_id", None
+        showtimes = yield f"SELECT {', '.join(SHOWTIME_COLUMNS)} FROM showtimes", None
+        self.load([dict(zip(MOVIE_COLUMNS, row)) for row in movies],
+                  [dict(zip(SHOWTIME_COLUMNS, row)) for row in showtimes])
+        return self
+
+    def load(self, movies, showtimes):
+        with self._lock:
+            self._movies = {}
+            self._movie_ids_by_title = {}
+            self._movie_ids_by_normalized_title = {}
+            self._showtimes = {}
+            self._by_key = {}
+            self._schedule = {}
+            for movie in movies:
+                self._put_movie(movie)
+            for showtime in showtimes:
+                self._put_showtime(showtime)
+            self.loaded_at = time.monotonic()
+            self.version += 1
+
+    def is_stale(self):
+        if self.loaded_at is None:
+            return True
+        return not self.live and time.monotonic() - self.loaded_at > self.ttl
+
+    # -- incremental updates -------------------------------------------------
+
+    def _put_movie(self, movie):
+        old = self._movies.get(movie['movie_id'])
+        if old is not None:
+            self._movie_ids_by_title.pop(old['title'], None)
+            self._movie_ids_by_normalized_title.pop(normalize_title(old['title']), None)
+        self._movies[movie['movie_id']] = movie
+        self._movie_ids_by_title[movie['title']] = movie['movie_id']
+        self._movie_ids_by_normalized_title[normalize_title(movie['title'])] = movie['movie_id']
+
+    def _remove_movie(self, movie_id):
+        old = self._movies.pop(movie_id, None)
+        if old is not None:
+            self._movie_ids_by_title.pop(old['title'], None)
+            self._movie_ids_by_normalized_title.pop(normalize_title(old['title']), None)
+
+    def _put_showtime(self, showtime):
+        self._remove_showtime(showtime['showtime_id'])
+        movie_id, show_date, show_time = showtime['movie_id'], date_key(showtime['show_date']), time_key(showtime['show_time'])
+        self._showtimes[showtime['showtime_id']] = showtime
+        self._by_key[(movie_id, show_date, show_time)] = showtime['showtime_id']
+        self._schedule.setdefault(movie_id, {}).setdefault(show_date, {})[show_time] = showtime['showtime_id']
+
+    def _remove_showtime(self, showtime_id):
+        old = self._showtimes.pop(showtime_id, None)
+        if old is None:
+            return
+        movie_id, show_date, show_time = old['movie_id'], date_key(old['show_date']), time_key(old['show_time'])
+        self._by_key.pop((movie_id, show_date, show_time), None)
+        dates = self._schedule.get(movie_id, {})
+        times = dates.get(show_date, {})
+        times.pop(show_time, None)
+        if not times:
+            dates.pop(show_date, None)
+        if not dates:
+            self._schedule.pop(movie_id, None)
+
+    def apply_notification(self, connection, channel, payload):
+        """Apply one NOTIFY event from the catalog triggers. Runs on a DB worker thread."""
+        return run_steps(connection, self.notification_steps(channel, payload))
+
+    def notification_steps(self, channel, payload):
+        """Apply one NOTIFY event: {"op": "INSERT"|"UPDATE"|"DELETE", "id": <movie_id or showtime_id>}.
+
+        Whole rows can outgrow NOTIFY's 8000 byte payload limit, so the
+        trigger sends only the key and the row is read back here. A row that
+        is gone by the time it is read is removed, whatever the op said.
+        """
+        change = json.loads(payload)
+        if channel == SHOWTIMES_CHANNEL:
+            columns, sql, put, remove = SHOWTIME_COLUMNS, SHOWTIME_SQL, self._put_showtime, self._remove_showtime
+        elif channel == MOVIES_CHANNEL:
+            columns, sql, put, remove = MOVIE_COLUMNS, MOVIE_SQL, self._put_movie, self._remove_movie
+        else:
+            return
+        rows = [] if change['op'] == 'DELETE' else (yield sql, (change['id'],))
+        with self._lock:
+            if rows:
+                put(dict(zip(columns, rows[0])))
+            else:
+                remove(change['id'])
+            if channel == MOVIES_CHANNEL:
+                self.version += 1
+
+    # -- lookups -------------------------------------------------------------
+
+    def _count(self, found):
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    def movies(self):
+        with self._lock:
+            return list(self._movies.values())
+
+    def showtimes(self):
+        with self._lock:
+            return list(self._showtimes.values())
+
+    def showtimes_for(self, movie_id):
+        """A movie's showtimes in date and time order."""
+        with self._lock:
+            dates = self._schedule.get(movie_id, {})
+            self._count(dates)
+            return [self._showtimes[dates[show_date][show_time]]
+                    for show_date in sorted(dates) for show_time in sorted(dates[show_date])]
+
+    def movies_with_version(self):
+        """A consistent (movies, version) pair for building a search index."""
+        with self._lock:
+            return list(self._movies.values()), self.version
+
+    def movie(self, movie_id):
+        with self._lock:
+            return self._count(self._movies.get(movie_id))
+
+    def movie_id_for_title(self, title):
+        with self._lock:
+            return self._count(self._movie_ids_by_title.get(title))
+
+    def movie_by_title(self, title):
+        """Look a movie up by title, ignoring case and extra whitespace."""
+        with self._lock:
+            movie_id = self._movie_ids_by_normalized_title.get(normalize_title(title))
+            return self._count(self._movies.get(movie_id))
+
+    def dates_for(self, movie_id):
+        with self._lock:
+            dates = self._schedule.get(movie_id)
+            self._count(dates)
+            return sorted(dates) if dates else []
+
+    def times_for(self, movie_id, show_date):
+        with self._lock:
+            times = self._schedule.get(movie_id, {}).get(date_key(show_date))
+            self._count(times)
+            return sorted(times) if times else []
+
+    def showtime_id(self, movie_id, show_date, show_time):
+        with self._lock:
+            return self._count(self._by_key.get((movie_id, date_key(show_date), time_key(show_time))))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'movies': len(self._movies),
+                'showtimes': len(self._showtimes),
+                'live': self.live,
+                'version': self.version,
+            }
@@ -0,0 +1,367 @@
+import queue, select, socket, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+DB_NAME = 'movie_pilot'
+DB_USER = 'postgres'
+DB_PASSWORD = 'cos101'
+DEFAULT_DSN = f'dbname={DB_NAME} user={DB_USER} password={DB_PASSWORD}'
+
+# Errors that mean the connection itself is gone rather than the query being bad
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+def fetchall(connection, sql, params=None):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def fetchone(connection, sql, params=None):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+def timed_cursor(timer):
+    """Cursor class that reports each execute's duration to `timer` (a metrics.QueryTimer).
+
+    Passed as a connection's cursor_factory, it times every statement run
+    through that connection, whichever module issues it.
+    """
+    class TimedCursor(extensions.cursor):
+        def execute(self, query, vars=None):
+            start = time.perf_counter()
+            try:
+                super().execute(query, vars)
+            except Exception:
+                timer.record(query, vars, time.perf_counter() - start, failed=True)
+                raise
+            timer.record(query, vars, time.perf_counter() - start)
+
+        def executemany(self, query, vars_list):
+            start = time.perf_counter()
+            try:
+                super().executemany(query, vars_list)
+            except Exception:
+                timer.record(query, None, time.perf_counter() - start, failed=True)
+                raise
+            timer.record(query, None, time.perf_counter() - start)
+
+    return TimedCursor
+
+
+class Database:
+    """Connection pool plus worker threads, so queries never run on Tk's event thread.
+
+    UI code calls `submit` with a function taking a connection; the function
+    runs on a worker with a pooled connection and its result (or exception)
+    is handed back on the Tk thread through a `root.after` pump. With a
+    `query_timer`, every statement on the pool's connections is timed.
+    """
+
+    def __init__(self, dsn=DEFAULT_DSN, root=None, min_connections=1, max_connections=4,
+                 poll_interval=20, query_timer=None):
+        self.dsn = dsn
+        self.query_timer = query_timer
+        self.root = root
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.poll_interval = poll_interval
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # ThreadedConnectionPool raises when it is empty; callers queue here instead
+        self._free_connections = threading.BoundedSemaphore(max_connections)
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix='db')
+        self._results = queue.Queue()
+        self._pumping = False
+
+    def _get_pool(self):
+        # The pool is created lazily on a worker so constructing Database never blocks
+        with self._pool_lock:
+            if self._pool is None:
+                options = {'cursor_factory': timed_cursor(self.query_timer)} if self.query_timer else {}
+                self._pool = pool.ThreadedConnectionPool(self.min_connections, self.max_connections, self.dsn, **options)
+            return self._pool
+
+    def run(self, fn, *args, retry=True, **kwargs):
+        """Call fn(connection, *args, **kwargs) with a pooled autocommit connection.
+
+        Blocks the calling thread, so only call it off the Tk thread; it
+        waits for a free connection when they are all in use. A dropped
+        connection is discarded and the call retried once on a fresh one,
+        so `fn` must be safe to call twice; pass retry=False when it is not
+        (e.g. a sale whose commit may already have landed).
+        """
+        for attempt in range(2 if retry else 1):
+            with self._free_connections:
+                connection_pool = self._get_pool()
+                connection = connection_pool.getconn()
+                broken = False
+                try:
+                    if not connection.autocommit:
+                        connection.autocommit = True
+                    return fn(connection, *args, **kwargs)
+                except CONNECTION_ERRORS:
+                    broken = True
+                    if attempt or not retry:
+                        raise
+                finally:
+                    connection_pool.putconn(connection, close=broken or bool(connection.closed))
+
+    def fetchall(self, sql, params=None):
+        return self.run(fetchall, sql, params)
+
+    def connect(self):
+        """Open the pool's initial connections. Blocks, like `run`."""
+        self._get_pool()
+
+    def submit(self, fn, *args, on_success=None, on_error=None, **kwargs):
+        """Run fn(connection, ...) on a worker and deliver the outcome on the Tk thread."""
+        return self.background(self.run, fn, *args, on_success=on_success, on_error=on_error, **kwargs)
+
+    def background(self, fn, *args, on_success=None, on_error=None, **kwargs):
+        """Run fn(...) on a worker and deliver the outcome on the Tk thread."""
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda f: self._results.put((f, on_success, on_error)))
+        self._ensure_pump()
+        return future
+
+    def _ensure_pump(self):
+        if self.root is not None and not self._pumping:
+            self._pumping = True
+            self.root.after(self.poll_interval, self._pump)
+
+    def _pump(self):
+        try:
+            while True:
+                try:
+                    future, on_success, on_error = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                self._deliver(future, on_success, on_error)
+        finally:
+            # Always rescheduled, or no result would ever be delivered again
+            self.root.after(self.poll_interval, self._pump)
+
+    @staticmethod
+    def _deliver(future, on_success, on_error):
+        error = future.exception()
+        try:
+            if error is None:
+                if on_success is not None:
+                    on_success(future.result())
+            elif on_error is not None:
+                on_error(error)
+            else:
+                print('Error during database query: \n', error)
+        except Exception as e:
+            # e.g. a TclError from a widget destroyed while the query ran
+            print('Error handling database result: \n', e)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+
+class NotificationListener(threading.Thread):
+    """Single idle connection that LISTENs on channels and dispatches NOTIFY payloads.
+
+    Callbacks run on the listener thread as callback(channel, payload).
+    After the connection is (re)established every `on_connect` callback is
+    called, so caches can reload whatever they missed while disconnected.
+    Queued LISTEN/UNLISTEN commands wake the thread instead of waiting for
+    its poll timeout.
+    """
+
+    def __init__(self, dsn=DEFAULT_DSN, poll_timeout=0.5, retry_interval=5):
+        super().__init__(name='db-listener', daemon=True)
+        self.dsn = dsn
+        self.poll_timeout = poll_timeout
+        self.retry_interval = retry_interval
+        self.connected = False
+        self._callbacks = {}
+        self._on_connect = []
+        self._on_disconnect = []
+        self._commands = queue.Queue()
+        # Written to by listen/unlisten/stop so select() returns at once
+        self._wake_receive, self._wake_send = socket.socketpair()
+        self._wake_receive.setblocking(False)
+        self._wake_send.setblocking(False)
+        self._stop_event = threading.Event()
+
+    def listen(self, channel, callback):
+        """Call `callback` for each NOTIFY on `channel`.
+
+        Returns an Event that is set once the LISTEN has run, after which no
+        notification on the channel can be missed; read state only after
+        it is set to be sure every later change is delivered.
+        """
+        listening = threading.Event()
+        self._callbacks.setdefault(channel, []).append(callback)
+        self._commands.put(('LISTEN', channel, listening))
+        self._wake()
+        return listening
+
+    def unlisten(self, channel, callback):
+        callbacks = self._callbacks.get(channel, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            self._callbacks.pop(channel, None)
+            self._commands.put(('UNLISTEN', channel, None))
+            self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_send.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # already awake (buffer full) or shutting down
+
+    def on_connect(self, callback):
+        self._on_connect.append(callback)
+
+    def on_disconnect(self, callback):
+        self._on_disconnect.append(callback)
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake()
+
+    def _run_commands(self, connection):
+        with connection.cursor() as cursor:
+            while True:
+                try:
+                    command, channel, done = self._commands.get_nowait()
+                except queue.Empty:
+                    break
+                # Channel names are identifiers, so quote them rather than pass them as parameters
+                cursor.execute(f'{command} "{channel}"')
+                if done is not None:
+                    done.set()
+
+    def _dispatch(self, connection):
+        connection.poll()
+        while connection.notifies:
+            notify = connection.notifies.pop(0)
+            for callback in list(self._callbacks.get(notify.channel, [])):
+                try:
+                    callback(notify.channel, notify.payload)
+                except Exception as e:
+                    print(f'Error handling notification on {notify.channel}: \n', e)
+
+    def run(self):
+        connection = None
+        while not self._stop_event.is_set():
+            try:
+                if connection is None:
+                    connection = psycopg2.connect(self.dsn)
+                    connection.autocommit = True
+                    # Re-subscribe everything on a fresh connection
+                    with connection.cursor() as cursor:
+                        for channel in list(self._callbacks):
+                            cursor.execute(f'LISTEN "{channel}"')
+                    self.connected = True
+                    for callback in self._on_connect:
+                        callback()
+                self._run_commands(connection)
+                readable = select.select([connection, self._wake_receive], [], [], self.poll_timeout)[0]
+                if self._wake_receive in readable:
+                    try:
+                        while self._wake_receive.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                if connection in readable:
+                    self._dispatch(connection)
+            except Exception as e:
+                print('Error in database listener: \n', e)
+                if self.connected:
+                    self.connected = False
+                    for callback in self._on_disconnect:
+                        callback()
+                if connection is not None:
+                    connection.close()
+                connection = None
+                self._stop_event.wait(self.retry_interval)
+        if connection is not None:
+            connection.close()
+
+
+class BatchedSubscription:
+    """Collects NOTIFY payloads from one channel and applies them in batches on the Tk thread.
+
+    `parse(payload)` turns each payload into a (key, value) pair; within a
+    batch only the latest value per key is kept, and every `interval` ms
+    the batch is handed to `apply_batch(changes)` as a dict.
+
+    Without `apply_batch` the subscription only buffers: subscribe, wait
+    for `listening` before reading the current state, then call `start`
+    with the callback so the changes made meanwhile are applied on top.
+    State re-read later (e.g. after the listener reconnects) goes in with
+    `merge`, which never overwrites a newer notification.
+    """
+
+    def __init__(self, listener, root, channel, parse, apply_batch=None, interval=100):
+        self.listener = listener
+        self.root = root
+        self.channel = channel
+        self.parse = parse
+        self.apply_batch = None
+        self.interval = interval
+        self._pending = {}
+        self._sequence = 0
+        self._received_at = {}  # key -> sequence number of its latest notification
+        self._lock = threading.Lock()
+        self._closed = False
+        self.listening = listener.listen(channel, self._received)
+        if apply_batch is not None:
+            self.start(apply_batch)
+
+    def start(self, apply_batch):
+        """Apply the changes buffered so far, then keep applying them every `interval` ms."""
+        self.apply_batch = apply_batch
+        self._flush()
+
+    def _received(self, channel, payload):
+        # Runs on the listener thread
+        key, value = self.parse(payload)
+        with self._lock:
+            self._sequence += 1
+            self._pending[key] = value
+            self._received_at[key] = self._sequence
+
+    def mark(self):
+        """Position in the feed; take it before reading state to `merge` later."""
+        with self._lock:
+            return self._sequence
+
+    def merge(self, changes, since):
+        """Queue `changes` read after `mark()` returned `since`, except where a notification has come in since."""
+        with self._lock:
+            for key, value in changes.items():
+                if self._received_at.get(key, 0) <= since:
+                    self._pending[key] = value
+
+    def _flush(self):
+        if self._closed:
+            return
+        try:
+            with self._lock:
+                changes, self._pending = self._pending, {}
+            if changes:
+                self.apply_batch(changes)
+        except Exception as e:
+            print(f'Error applying changes from {self.channel}: \n', e)
+        finally:
+            self.root.after(self.interval, self._flush)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.listener.unlisten(self.channel, self._received)
@@ -0,0 +1,532 @@
+"""Offline bookings: a crash-safe local journal, seat map snapshots, and replay.
+
+While the database is unreachable the kiosk keeps selling from its last
+seat map snapshot and appends each sale to the journal. When the database
+comes back the replayer sells the journaled seats in bulk and reports any
+seat that another kiosk sold in the meantime.
+
+    python src/journal.py                 # list bookings waiting to be synced
+    python src/journal.py --replay        # sync them now
+    python src/journal.py --import bookings.json   # once, when migrating a kiosk
+"""
+import argparse, datetime, hashlib, json, os, threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from reservations import SEAT_IS_FREE_SQL, new_session_id
+
+JOURNAL_PATH = './bookings.journal'
+CATALOG_SNAPSHOT_PATH = './offline-catalog.json'
+SEATS_SNAPSHOT_DIR = './offline-seats'
+LEGACY_BOOKINGS_PATH = './bookings.json'
+
+# Bookings synced per statement by the replayer
+REPLAY_BATCH_SIZE = 500
+
+# Legacy bookings.json entries have a title and a time but no date, so they
+# are booked on the next showing of that movie at that time.
+RESOLVE_LEGACY_SQL = """
+    SELECT DISTINCT ON (w.booking_id) w.booking_id, st.showtime_id
+    FROM unnest(%(booking_ids)s::text[], %(titles)s::text[], %(times)s::time[]) w(booking_id, title, show_time)
+    JOIN movies m ON lower(m.title) = lower(w.title)
+    JOIN showtimes st ON st.movie_id = m.movie_id AND st.show_time = w.show_time AND st.show_date >= current_date
+    ORDER BY w.booking_id, st.show_date
+"""
+
+SEAT_IDS_SQL = "SELECT seat_number, seat_id FROM seats WHERE seat_number = ANY(%s)"
+
+# Sells every journaled seat that is still free in one statement. Rows are
+# locked in (showtime_id, seat_id) order like the checkout claims, so a
+# replay never deadlocks with a kiosk. Each seat is marked with its booking
+# id in held_by, which makes a replay that is interrupted before the journal
+# records it safe to run again: the seat already belongs to that booking.
+# A seat still held by the kiosk session that journaled the sale is claimable
+# too: a checkout whose hold committed just before the connection dropped
+# must not be reported as sold to someone else.
+SYNC_BOOKINGS_SQL = f"""
+    WITH wanted AS (
+        SELECT DISTINCT ON (showtime_id, seat_id) booking_id, session_id, showtime_id, seat_id
+        FROM unnest(%(booking_ids)s::text[], %(session_ids)s::text[], %(showtime_ids)s::int[], %(seat_ids)s::int[])
+            w(booking_id, session_id, showtime_id, seat_id)
+        ORDER BY showtime_id, seat_id, booking_id
+    ),
+    locked AS (
+        SELECT w.booking_id, ts.showtime_id, ts.seat_id, ts.status, ts.held_by,
+               {SEAT_IS_FREE_SQL} OR (ts.status = 'Selected' AND ts.held_by = w.session_id) AS claimable
+        FROM wanted w
+        JOIN showtime_seats ts ON ts.showtime_id = w.showtime_id AND ts.seat_id = w.seat_id
+        ORDER BY ts.showtime_id, ts.seat_id
+        FOR UPDATE OF ts
+    ),
+    sold AS (
+        UPDATE showtime_seats ts
+        SET status = 'Sold', held_by = l.booking_id, hold_expires_at = NULL
+        FROM locked l
+        WHERE l.claimable AND ts.showtime_id = l.showtime_id AND ts.seat_id = l.seat_id
+        RETURNING ts.showtime_id, ts.seat_id
+    )
+    SELECT l.booking_id, l.seat_id, l.status,
+           s.seat_id IS NOT NULL OR (l.status = 'Sold' AND l.held_by = l.booking_id)
+    FROM locked l
+    LEFT JOIN sold s ON s.showtime_id = l.showtime_id AND s.seat_id = l.seat_id
+"""
+
+
+def _encode(record):
+    return json.dumps(record, separators=(',', ':'), default=str).encode() + b'\n'
+
+
+def _fsync_directory(path):
+    # Makes a rename durable; not possible (or needed) on Windows
+    if os.name != 'nt':
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _write_atomically(path, data):
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    _fsync_directory(path)
+
+
+class BookingJournal:
+    """Append-only JSON-lines log of bookings taken while the database was unreachable.
+
+    `append` only queues the record; one writer thread writes whatever has
+    queued up and fsyncs once per batch, so concurrent sales share a disk
+    flush and a click never waits on the disk. The Future `append` returns
+    resolves once the record is durable. A torn last line from a crash is
+    dropped on open. Once the file holds `compact_after` records for
+    bookings that have been synced, it is rewritten with only the pending
+    ones.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, compact_after=1000):
+        self.path = path
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        self._queued = threading.Condition(self._lock)
+        self._buffer = []     # (encoded record, Future) waiting for the writer
+        self._pending = {}    # booking id -> booking record not yet synced
+        self._settled = 0     # records in the file that compaction would drop
+        self._closed = False
+        self._load()
+        self._file = open(path, 'ab')
+        self._writer = threading.Thread(target=self._write_loop, name='journal', daemon=True)
+        self._writer.start()
+
+    def _load(self):
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            good_until = 0
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    if line.endswith(b'\n'):
+                        print(f'Error in booking journal {self.path}, skipping record: \n', line[:80])
+                        good_until += len(line)
+                        continue
+                    break  # torn write at the end of the file
+                self._apply(record)
+                good_until += len(line)
+        if good_until < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_until)
+
+    def _apply(self, record):
+        if record['op'] == 'book':
+            self._pending[record['id']] = record
+        elif record['op'] == 'synced' and self._pending.pop(record['id'], None) is not None:
+            self._settled += 2
+
+    def append(self, record):
+        """Queue a record for the journal. Returns a Future that resolves once it is on disk."""
+        line = _encode(record)
+        written = Future()
+        with self._lock:
+            if self._closed:
+                raise ValueError('The booking journal is closed')
+            self._apply(record)
+            self._buffer.append((line, written))
+            self._queued.notify()
+        return written
+
+    def book(self, showtime_id, seat_ids, seat_numbers, session_id=None):
+        """Journal an offline sale. Returns (booking id, Future).
+
+        session_id is the seat map session that tried to check out online;
+        the replay may take over seats that session still holds.
+        """
+        booking_id = new_session_id()
+        return booking_id, self.append({
+            'op': 'book', 'id': booking_id, 'session_id': session_id, 'showtime_id': showtime_id,
+            'seat_ids': list(seat_ids), 'seat_numbers': list(seat_numbers),
+            'at': datetime.datetime.now().isoformat(timespec='seconds'),
+        })
+
+    def mark_synced(self, booking_id, sold, conflicts):
+        with self._lock:
+            if booking_id not in self._pending:
+                return None
+        return self.append({'op': 'synced', 'id': booking_id, 'sold': sold, 'conflicts': conflicts})
+
+    def pending(self):
+        with self._lock:
+            return list(self._pending.values())
+
+    def sold_seats(self, showtime_id):
+        """Seats sold offline for a showtime that are not synced yet."""
+        with self._lock:
+            return {seat_id for booking in self._pending.values()
+                    if booking.get('showtime_id') == showtime_id for seat_id in booking.get('seat_ids') or ()}
+
+    def _write_loop(self):
+        while True:
+            with self._lock:
+                while not self._buffer and not self._closed:
+                    self._queued.wait()
+                if not self._buffer:
+                    return
+                batch, self._buffer = self._buffer, []
+                compact = self._settled >= self.compact_after
+            try:
+                if compact:
+                    self._compact(batch)
+                else:
+                    self._file.write(b''.join(line for line, _ in batch))
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+            except Exception as e:
+                print('Error writing booking journal: \n', e)
+                for _, written in batch:
+                    written.set_exception(e)
+            else:
+                for _, written in batch:
+                    written.set_result(None)
+
+    def _compact(self, batch):
+        # Runs on the writer thread, so nothing else is touching the file.
+        # `batch` is already reflected in _pending, so it is not written again.
+        with self._lock:
+            records = list(self._pending.values())
+            self._settled = 0
+        _write_atomically(self.path, b''.join(map(_encode, records)))
+        self._file.close()
+        self._file = open(self.path, 'ab')
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._queued.notify()
+        self._writer.join()
+        self._file.close()
+
+
+class OfflineSnapshot:
+    """The last catalog and seat maps seen online, kept on disk for selling offline.
+
+    Seat maps are the rows of reservations.SEAT_MAP_SQL, as book_seats loads
+    them. The catalog has its own file and each showtime's seat map is a
+    file in `seats_dir`, read when first asked for, so saving one seat map
+    costs the same however many showtimes have been seen. Seat maps of past
+    showtimes are dropped when the catalog is updated. Call `save` off the
+    Tk thread.
+    """
+
+    def __init__(self, catalog_path=CATALOG_SNAPSHOT_PATH, seats_dir=SEATS_SNAPSHOT_DIR):
+        self.catalog_path = catalog_path
+        self.seats_dir = seats_dir
+        self._lock = threading.Lock()
+        self._catalog_dirty = False
+        self._dirty = set()    # showtime ids whose seat map changed since the last save
+        self._past = set()     # showtime ids already over at the last catalog update
+        self.movies = []
+        self.showtimes = []
+        self._seat_maps = {}   # showtime_id -> {seat_id: [seat_id, status, seat_number, row, column]}
+        catalog = self._read(catalog_path)
+        if catalog:
+            self.movies, self.showtimes = catalog['movies'], catalog['showtimes']
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            print(f'Error reading offline snapshot {path}: \n', e)
+            return None
+
+    def _seat_path(self, showtime_id):
+        return os.path.join(self.seats_dir, f'{showtime_id}.json')
+
+    def _seats(self, showtime_id):
+        # Called with the lock held
+        if showtime_id not in self._seat_maps:
+            seats = self._read(self._seat_path(showtime_id))
+            if seats is None:
+                return None
+            self._seat_maps[showtime_id] = {seat[0]: seat for seat in seats}
+        return self._seat_maps[showtime_id]
+
+    def update_catalog(self, movies, showtimes):
+        with self._lock:
+            self.movies, self.showtimes = list(movies), list(showtimes)
+            self._catalog_dirty = True
+            # Past showtimes can no longer be sold, so their seat maps go at the next save
+            today = datetime.date.today().isoformat()
+            self._past = {showtime['showtime_id'] for showtime in self.showtimes if str(showtime['show_date'])[:10] < today}
+            for showtime_id in self._past:
+                self._seat_maps.pop(showtime_id, None)
+                self._dirty.discard(showtime_id)
+
+    def update_seat_map(self, showtime_id, seats):
+        with self._lock:
+            self._seat_maps[showtime_id] = {seat[0]: list(seat) for seat in seats}
+            self._dirty.add(showtime_id)
+
+    def set_status(self, showtime_id, seat_ids, status):
+        with self._lock:
+            seats = self._seats(showtime_id) or {}
+            for seat_id in seat_ids:
+                if seat_id in seats:
+                    seats[seat_id][1] = status
+                    self._dirty.add(showtime_id)
+
+    def seat_map(self, showtime_id):
+        with self._lock:
+            seats = self._seats(showtime_id)
+            return None if seats is None else [tuple(seat) for seat in seats.values()]
+
+    def save(self):
+        """Write whatever changed since the last save."""
+        with self._lock:
+            files = {self._seat_path(showtime_id): list(self._seat_maps[showtime_id].values())
+                     for showtime_id in self._dirty}
+            self._dirty = set()
+            past = set()
+            if self._catalog_dirty:
+                self._catalog_dirty = False
+                files[self.catalog_path] = {'movies': self.movies, 'showtimes': self.showtimes}
+                past = {os.path.basename(self._seat_path(showtime_id)) for showtime_id in self._past}
+            files = {path: json.dumps(data, default=str).encode() for path, data in files.items()}
+        os.makedirs(self.seats_dir, exist_ok=True)
+        for path, data in files.items():
+            _write_atomically(path, data)
+        for name in past.intersection(os.listdir(self.seats_dir)):
+            os.remove(os.path.join(self.seats_dir, name))
+
+
+def parse_legacy_time(value):
+    # '10:00 AM' -> '10:00'
+    return datetime.datetime.strptime(value.strip(), '%I:%M %p').strftime('%H:%M')
+
+
+def import_legacy_bookings(journal, path=LEGACY_BOOKINGS_PATH):
+    """Queue the seats in an old bookings.json ({"Title_10:00 AM": ["B5", ...]}) for replay.
+
+    Run by hand (`journal.py --import`), never by the kiosk: the entries
+    have no date, so each is sold on the next showing at that time. The
+    file's contents are recorded in <journal>.imports and the same file is
+    not imported twice. The file itself is left alone. Returns how many
+    bookings were queued, or None if it had been imported before.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    imports_path = journal.path + '.imports'
+    try:
+        with open(imports_path) as f:
+            if digest in f.read().split():
+                return None
+    except FileNotFoundError:
+        pass
+    bookings = json.loads(data)
+    already = {booking['id'] for booking in journal.pending()}
+    written = []
+    for key, seat_numbers in bookings.items():
+        title, _, show_time = key.rpartition('_')
+        # A fixed id per entry, so an import interrupted before the rename is not queued twice
+        booking_id = f'legacy:{key}'
+        if booking_id in already or not seat_numbers:
+            continue
+        try:
+            show_time = parse_legacy_time(show_time)
+        except ValueError:
+            print(f'Error importing booking {key!r} from {path}: unrecognised time')
+            continue
+        written.append(journal.append({
+            'op': 'book', 'id': booking_id, 'title': title, 'show_time': show_time,
+            'seat_numbers': list(seat_numbers), 'source': os.path.basename(path),
+        }))
+    for future in written:
+        future.result()
+    with open(imports_path, 'a') as f:
+        f.write(f'{digest} {os.path.abspath(path)}\n')
+    return len(written)
+
+
+@dataclass
+class SyncReport:
+    synced: int = 0
+    seats_sold: int = 0
+    # (booking record, {seat label: status it had online ('Missing' if it could not be found)})
+    conflicts: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return not self.conflicts
+
+
+class BookingReplayer:
+    """Syncs the journal's pending bookings to PostgreSQL in bulk."""
+
+    def __init__(self, journal, batch_size=REPLAY_BATCH_SIZE):
+        self.journal = journal
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+
+    def _resolve(self, cursor, bookings):
+        """Fill in showtime_id and seat_ids for bookings that only have titles and seat numbers."""
+        legacy = [booking for booking in bookings if booking.get('showtime_id') is None]
+        showtime_ids = {}
+        if legacy:
+            cursor.execute(RESOLVE_LEGACY_SQL, {
+                'booking_ids': [booking['id'] for booking in legacy],
+                'titles': [booking['title'] for booking in legacy],
+                'times': [booking['show_time'] for booking in legacy],
+            })
+            showtime_ids = dict(cursor.fetchall())
+        unnumbered = {number for booking in bookings if booking.get('seat_ids') is None
+                      for number in booking['seat_numbers']}
+        seat_ids = {}
+        if unnumbered:
+            cursor.execute(SEAT_IDS_SQL, (sorted(unnumbered),))
+            seat_ids = dict(cursor.fetchall())
+        resolved = []
+        for booking in bookings:
+            showtime_id = booking.get('showtime_id')
+            if showtime_id is None:
+                showtime_id = showtime_ids.get(booking['id'])
+            ids = booking.get('seat_ids')
+            if ids is None:
+                ids = [seat_ids.get(number) for number in booking['seat_numbers']]
+            resolved.append((booking, showtime_id, ids))
+        return resolved
+
+    def replay(self, connection):
+        """Sync every pending booking. Returns a SyncReport; runs on a DB worker thread."""
+        report = SyncReport()
+        # A reconnect and a manual replay can race; the second one has nothing to do
+        if not self._lock.acquire(blocking=False):
+            return report
+        try:
+            bookings = self.journal.pending()
+            for start in range(0, len(bookings), self.batch_size):
+                self._replay_batch(connection, bookings[start:start + self.batch_size], report)
+        finally:
+            self._lock.release()
+        return report
+
+    def _replay_batch(self, connection, bookings, report):
+        with connection.cursor() as cursor:
+            resolved = self._resolve(cursor, bookings)
+            rows = {'booking_ids': [], 'session_ids': [], 'showtime_ids': [], 'seat_ids': []}
+            for booking, showtime_id, seat_ids in resolved:
+                if showtime_id is None:
+                    continue
+                for seat_id in seat_ids:
+                    if seat_id is not None:
+                        rows['booking_ids'].append(booking['id'])
+                        rows['session_ids'].append(booking.get('session_id'))
+                        rows['showtime_ids'].append(showtime_id)
+                        rows['seat_ids'].append(seat_id)
+            outcome = {}
+            if rows['seat_ids']:
+                cursor.execute(SYNC_BOOKINGS_SQL, rows)
+                for booking_id, seat_id, status, sold in cursor.fetchall():
+                    outcome[booking_id, seat_id] = None if sold else status
+        if not connection.autocommit:
+            connection.commit()
+
+        written = []
+        for booking, showtime_id, seat_ids in resolved:
+            labels = booking.get('seat_numbers') or [str(seat_id) for seat_id in seat_ids]
+            sold, conflicts = [], {}
+            for label, seat_id in zip(labels, seat_ids):
+                # None when the seat is now this booking's; otherwise who has it
+                status = outcome.get((booking['id'], seat_id), 'Missing')
+                if status is None:
+                    sold.append(label)
+                else:
+                    conflicts[label] = status
+            future = self.journal.mark_synced(booking['id'], sold, conflicts)
+            if future is not None:
+                written.append(future)
+                report.synced += 1
+                report.seats_sold += len(sold)
+                if conflicts:
+                    report.conflicts.append((booking, conflicts))
+        for future in written:
+            future.result()
+
+
+def describe(booking):
+    where = f"showtime {booking['showtime_id']}" if booking.get('showtime_id') is not None \
+        else f"{booking['title']} at {booking['show_time']}"
+    return f"{where}: seats {', '.join(booking['seat_numbers'])}"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=None, help='database to replay into (default: the app database)')
+    parser.add_argument('--journal', default=JOURNAL_PATH)
+    parser.add_argument('--import', dest='legacy', metavar='BOOKINGS_JSON', help='queue an old bookings.json, once; each entry is sold on the next showing at its time')
+    parser.add_argument('--replay', action='store_true', help='sync pending bookings to the database')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    journal = BookingJournal(args.journal)
+    try:
+        if args.legacy:
+            queued = import_legacy_bookings(journal, args.legacy)
+            if queued is None:
+                print(f'{args.legacy} has already been imported')
+            else:
+                print(f'Queued {queued} bookings from {args.legacy}')
+        if args.replay:
+            import psycopg2
+            from db import DEFAULT_DSN
+
+            connection = psycopg2.connect(args.dsn or DEFAULT_DSN)
+            connection.autocommit = True
+            try:
+                report = BookingReplayer(journal).replay(connection)
+            finally:
+                connection.close()
+            print(f'Synced {report.synced} bookings ({report.seats_sold} seats)')
+            for booking, conflicts in report.conflicts:
+                print(f'Conflict in {describe(booking)}: ' +
+                      ', '.join(f'{label} was {status}' for label, status in conflicts.items()))
+        for booking in journal.pending():
+            print(f"Pending {booking['id']} {describe(booking)}")
+    finally:
+        journal.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,59 @@
+import time
+_import_started = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk
-import pyglet, os, psycopg2, subprocess, sys
-from PIL import Image, ImageTk
+import argparse, collections, pyglet, json, os, subprocess, sys, threading
 import tkinter.messagebox
+from reservations import SeatReservationEngine, SeatSelection, HoldReaper, new_session_id, run_steps, MAX_SEATS_PER_BOOKING
+from schema import missing_schema
+from db import Database, NotificationListener, BatchedSubscription, DEFAULT_DSN, CONNECTION_ERRORS
+from catalog import ShowtimeCatalog, SHOWTIMES_CHANNEL, MOVIES_CHANNEL, normalize_title, time_key, upcoming_showtimes
+from assets import AssetManager
+from profiler import StartupProfiler
+from metrics import Metrics, MetricsExporter, QueryTimer, StallDetector, METRICS_PATH, EXPORT_INTERVAL_SECONDS
+from seatmap import SeatMapCanvas
+from search import MovieSearchIndex
+from journal import BookingJournal, BookingReplayer, OfflineSnapshot, describe
+from tabs import TabManager
+from booking import BookingService
+
+_import_finished = time.perf_counter()
+
+SEAT_ICON_PATHS = {
+    'Available': './icons/seat-available.png',
+    'Sold': './icons/seat-sold.png',
+    'Selected': './icons/seat-selected.png',
+}
+SEAT_ICON_SIZE = (48, 48)
+# Images on the Home screen, decoded in the background at startup
+HOME_IMAGE_PATHS = [
+    './images/logo.png',
+    './images/sinners.png',
+    './images/sinners-watch-trailer.png',
+    './images/view-sinners-description.png',
+    './images/movie-slides.png',
+    './images/get-movie-tickets.png',
+]
+# Wait this long after the last keystroke before searching
+SEARCH_DEBOUNCE_MS = 150
+# Search results are added to the list this many at a time, as it is scrolled
+SEARCH_PAGE_SIZE = 50
+# How long a seat map load waits for its LISTEN before reading anyway; a seat map
+# loaded without it is brought up to date when the listener (re)connects
+SEAT_LISTEN_TIMEOUT_SECONDS = 1.0
 
 class MoviePilot:
     def set_default_styles(self):
-        self.font_path = './fonts/Poppins-Regular.ttf'
-
+        # load_fonts has registered the font file by now (see __init__)
         if os.path.exists(self.font_path):
-            pyglet.font.add_file(self.font_path)
             self.tab_font = ("Poppins", 14, "bold")
             self.header_font = ('Poppins', 40)
             self.content_font = ("Poppins", 34)
         else:
             print(f"Warning: Font file not found at {self.font_path}. Using default system font.")
             self.tab_font = ("Arial", 12, "bold")
+            self.header_font = ("Arial", 28)
             self.content_font = ("Arial", 18)
         
         self.root.configure(background='black')
@@ -68,48 +106,271 @@ class MoviePilot:
         self.__style.configure('Close.TButton', background='#222', foreground='white', font=('Poppins', 16, 'bold'))
         self.__style.map('Close.TButton', foreground=[('active', 'black')])
         
+    def load_fonts(self):
+        with self.profiler.phase('fonts'):
+            if os.path.exists(self.font_path):
+                pyglet.font.add_file(self.font_path)
+
     def initialise_database(self):
-        db_name = 'movie_pilot'
-        db_user = 'postgres'
-        db_password = 'cos101'
-        
-        try:
-            self.connection = psycopg2.connect(f'dbname = {db_name} user={db_user} password = {db_password}')
-            self.cursor = self.connection.cursor()
-            print('Database connected successfully')
-            
-            self.cursor.execute('SELECT * FROM movies;')
-            columns = ['movie_id', 'title', 'synopsis', 'content_rating', 'average_user_rating', 'release_year', 'runtime_minutes', 'genre']
-            self.movies = [dict(zip(columns, row)) for row in self.cursor.fetchall()]
-            print(self.movies)
-        except Exception as e:
-            print('Error during database connection: \n', e)        
+        # Queries run on pooled connections in worker threads, never on the Tk thread
+        # Every statement on the pool is timed, and the slow ones logged (see metrics.QueryTimer)
+        self.db = Database(DEFAULT_DSN, self.root, query_timer=QueryTimer(self.metrics))
+        self.catalog = ShowtimeCatalog()
+        # Booking rules shared with the HTTP API (src/api.py); its steps run on self.db's workers
+        self.booking = BookingService(self.catalog, self.reservations)
+        self.movies = []
+        # Built on first search and rebuilt when the catalog changes (see with_search_index)
+        self.search_index = None
+        self.search_index_building = False
+        self.search_index_waiting = []
+        # One idle connection per kiosk carries every change feed (catalog and open seat maps).
+        # Keep the catalog current from NOTIFY events; while the listener is
+        # down the catalog falls back to refreshing on its TTL
+        self.listener = NotificationListener(DEFAULT_DSN)
+        # Catalog refreshes and NOTIFY changes, applied in arrival order by one DB worker at a time
+        self.catalog_updates = collections.deque()
+        self.catalog_updates_lock = threading.Lock()
+        self.catalog_updating = False
+        self.listener.listen(SHOWTIMES_CHANNEL, self.catalog_changed)
+        self.listener.listen(MOVIES_CHANNEL, self.catalog_changed)
+        self.listener.on_connect(self.catalog_listener_connected)
+        self.listener.on_connect(self.sync_offline_bookings)
+        self.listener.on_connect(self.seat_maps_reconnected)
+        # Seat change subscriptions of the open seat maps -> their showtime_id
+        self.open_seat_maps = {}
+        self.listener.on_disconnect(self.catalog_listener_disconnected)
+        # While the database is unreachable, sales are journaled locally against the last
+        # seat maps seen online, and synced once the listener can connect again
+        self.journal = BookingJournal()
+        self.replayer = BookingReplayer(self.journal)
+        self.offline_snapshot = OfflineSnapshot()
+        # Connecting and loading the catalog happen on a worker so the window shows immediately
+        self.db.background(self.load_database, on_success=self.database_loaded, on_error=self.database_failed)
+
+    def load_database(self):
+        with self.profiler.phase('database'):
+            with self.profiler.phase('db connect'):
+                self.db.connect()
+            with self.profiler.phase('db schema check'):
+                # Schema changes lock the seat tables, so they are applied by provision.py, not here
+                missing = self.db.run(missing_schema)
+                if missing:
+                    print(f"Database schema is out of date (missing {', '.join(missing)}); "
+                          "run python src/provision.py to update it")
+            with self.profiler.phase('catalog'):
+                self.db.run(self.catalog.refresh)
+        self.offline_snapshot.update_catalog(self.catalog.movies(), self.catalog.showtimes())
+        self.offline_snapshot.save()
 
-    def __init__(self):
-        self.root = tk.Tk()
-        self.root.title("Movie Pilot")
-        self.root.geometry('1200x800')
-        self.tab_counter = 0
+    def database_loaded(self, result=None):
+        print('Database connected successfully')
+        self.movies = self.catalog.movies()
+        self.start_database_threads()
+        self.sync_offline_bookings()
+
+    def database_failed(self, error):
+        print('Error during database connection: \n', error)
+        if not self.catalog.movies() and self.offline_snapshot.movies:
+            # Offline: offer the showtimes from the last time we were online
+            print('Using the offline catalog; bookings will be synced when the database is back')
+            self.catalog.load(self.offline_snapshot.movies, self.offline_snapshot.showtimes)
+            self.movies = self.catalog.movies()
+        # Both threads keep retrying, so they pick the database up once it is reachable
+        self.start_database_threads()
+
+    def start_database_threads(self):
+        # Sweeps holds left behind by kiosks that closed or crashed mid-booking
+        self.hold_reaper = HoldReaper(self.db.dsn)
+        self.hold_reaper.start()
+        self.listener.start()
+
+    def catalog_listener_connected(self):
+        # Runs on the listener thread; reload whatever changed while we were not listening
+        self.queue_catalog_update(self.refresh_live_catalog)
+
+    def catalog_changed(self, channel, payload):
+        # Runs on the listener thread
+        self.queue_catalog_update(lambda connection: self.catalog.apply_notification(connection, channel, payload))
+
+    def refresh_live_catalog(self, connection):
+        self.catalog.refresh(connection)
+        # From here on NOTIFY keeps it current, unless the listener dropped meanwhile
+        self.catalog.live = self.listener.connected
+
+    def queue_catalog_update(self, fn):
+        # The updates run on the DB workers rather than the listener thread, but one at a
+        # time and in order, so a refresh never overwrites a change that came after it
+        with self.catalog_updates_lock:
+            self.catalog_updates.append(fn)
+            if self.catalog_updating:
+                return
+            self.catalog_updating = True
+        self.db.background(self.apply_catalog_updates)
+
+    def apply_catalog_updates(self):
+        while True:
+            with self.catalog_updates_lock:
+                if not self.catalog_updates:
+                    self.catalog_updating = False
+                    return
+                fn = self.catalog_updates.popleft()
+            try:
+                self.db.run(fn)
+            except Exception as e:
+                print('Error updating showtime catalog: \n', e)
+                # A change may have been lost: fall back to the TTL until a refresh succeeds
+                self.catalog.live = False
+                if fn != self.refresh_live_catalog:
+                    with self.catalog_updates_lock:
+                        self.catalog_updates.append(self.refresh_live_catalog)
 
-        self.set_default_styles()
+    def catalog_listener_disconnected(self):
+        self.catalog.live = False
+
+    def sync_offline_bookings(self):
+        # Called on the Tk thread after startup and on the listener thread on each reconnect
+        if self.journal.pending():
+            self.db.submit(self.replayer.replay, on_success=self.offline_bookings_synced,
+                           on_error=lambda e: print('Error syncing offline bookings: \n', e))
+
+    def offline_bookings_synced(self, report):
+        if not report.synced:
+            return
+        print(f'Synced {report.synced} offline bookings ({report.seats_sold} seats)')
+        if report.conflicts:
+            lines = [f"{describe(booking)} - " + ', '.join(f'{label} was {status}' for label, status in conflicts.items())
+                     for booking, conflicts in report.conflicts]
+            for line in lines:
+                print('Offline booking conflict:', line)
+            tkinter.messagebox.showwarning("Offline booking conflicts",
+                                           "Some seats sold while offline were also sold elsewhere:\n" + '\n'.join(lines))
+
+    def __init__(self, profiler=None, metrics_path=METRICS_PATH, metrics_port=None):
+        self.profiler = profiler or StartupProfiler()
+        self.profiler.record('import', _import_started, _import_finished - _import_started)
+        self.metrics = Metrics()
+        # The font file registers while the window, metrics and image decodes start up,
+        # but must be in place before the styles are built: Tk resolves a font family when
+        # a style or widget first uses it and does not look again once the file is added
+        self.font_path = './fonts/Poppins-Regular.ttf'
+        fonts = threading.Thread(target=self.load_fonts, name='fonts', daemon=True)
+        fonts.start()
+        with self.profiler.phase('window'):
+            self.root = tk.Tk()
+            self.root.title("Movie Pilot")
+            self.root.geometry('1200x800')
+        # Records how late a heartbeat on the Tk loop runs, i.e. how long the UI froze
+        self.stall_detector = StallDetector(self.root, self.metrics)
+        self.stall_detector.start()
+        self.start_metrics_export(metrics_path, metrics_port)
+        self.reservations = SeatReservationEngine()
+
+        # Decode the Home screen and seat map images on a background thread while styles
+        # and the DB load; the rest are decoded when a tab first shows them
+        self.assets = AssetManager(on_decode=self.record_image_decode, root=self.root)
+        self.assets.preload(HOME_IMAGE_PATHS)
+        self.assets.preload(SEAT_ICON_PATHS.values(), SEAT_ICON_SIZE)
+
+        fonts.join()
+        with self.profiler.phase('styles'):
+            self.set_default_styles()
+        # The database and image decodes load in parallel
         self.initialise_database()
 
         self.root.state('zoomed')
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill='both', expand=True, padx=0, pady=0)
+        # Every closable tab goes through here, so closed tabs are destroyed and reopened ones reused
+        self.tabs = TabManager(self.notebook, on_build=self.record_tab_build)
 
-        self.display_home()
-        self.display_search()
+        # Tabs are only built the first time they are selected; until then they hold a placeholder
+        self.lazy_tabs = {}
+        self.add_lazy_tab('Home', self.display_home)
+        self.add_lazy_tab('Search', self.display_search)
         self.notebook.select(0)
-        
+        self.notebook.bind('<<NotebookTabChanged>>', self.build_selected_tab, add='+')
+        # Build Home once the window is on screen, so the placeholder shows first
+        self.root.bind('<Map>', self.window_mapped)
+
+        self.profiler.report_when_done(self.root, ['fonts', 'database', 'tab: Home'])
+        self.root.after(EXPORT_INTERVAL_SECONDS * 1000, self.update_metric_gauges)
+
+    def start_metrics_export(self, path, port):
+        try:
+            self.metrics_exporter = MetricsExporter(self.metrics, path, port)
+        except OSError as e:
+            print(f'Error serving metrics on port {port}: \n', e)
+            self.metrics_exporter = MetricsExporter(self.metrics, path)
+        self.metrics_exporter.start()
+
+    def update_metric_gauges(self):
+        # Tk and cache state can only be read on the Tk thread, so gauges are pushed from here
+        for name, value in self.assets.stats().items():
+            self.metrics.set(f'image_cache_{name}', value)
+        tabs = self.tabs.stats()
+        self.metrics.set('ui_open_tabs', tabs['open'])
+        self.metrics.set('ui_widgets', tabs['widgets'])
+        self.metrics.set('ui_tk_images', tabs['images'])
+        catalog = self.catalog.stats()
+        self.metrics.set('catalog_movies', catalog['movies'])
+        self.metrics.set('catalog_showtimes', catalog['showtimes'])
+        self.metrics.set('catalog_live', int(catalog['live']))
+        self.metrics.set('journal_pending_bookings', len(self.journal.pending()))
+        self.metrics.set('ui_worst_stall_seconds', self.stall_detector.worst)
+        self.root.after(EXPORT_INTERVAL_SECONDS * 1000, self.update_metric_gauges)
+
+    def window_mapped(self, event):
+        if event.widget is self.root:
+            self.root.unbind('<Map>')
+            self.root.after_idle(self.build_selected_tab)
+
+    def add_lazy_tab(self, text, builder):
+        frame = ttk.Frame(self.notebook)
+        self.notebook.add(frame, text=text)
+        placeholder = self.show_loading(frame)
+        self.lazy_tabs[str(frame)] = (text, builder, frame, placeholder)
+
+    def build_selected_tab(self, event=None):
+        lazy_tab = self.lazy_tabs.pop(self.notebook.select(), None)
+        if lazy_tab is None:
+            return
+        text, builder, frame, placeholder = lazy_tab
+        with self.profiler.phase(f'tab: {text}'), self.metrics.time('tab_build_seconds', view=text.lower()):
+            placeholder.destroy()
+            builder(frame)
+
+    def record_image_decode(self, path, size, start, seconds):
+        name = f'image: {path}' if size is None else f'image: {path} @{size[0]}x{size[1]}'
+        self.profiler.record(name, start, seconds)
+        self.metrics.observe('image_decode_seconds', seconds, image=os.path.basename(path))
+
+    def record_tab_build(self, view, seconds):
+        self.metrics.observe('tab_build_seconds', seconds, view=view)
+
+    def timed(self, step, callback):
+        """Wrap a db.submit callback so it records how long the customer waited for `step`."""
+        start = time.perf_counter()
+
+        def done(result):
+            self.metrics.observe('booking_step_seconds', time.perf_counter() - start, step=step)
+            return callback(result)
+        return done
+
     def display_image(self, path, frame, relx, rely, hasBorder=False):
-        image_pil = Image.open(path)
-        image_tk = ImageTk.PhotoImage(image_pil)
+        # Decoded once, on a background thread, and shared by every tab that shows this image;
+        # the label stays empty until the image is ready
         if hasBorder:
-            image_img = tk.Label(frame, image=image_tk)
+            image_img = tk.Label(frame)
         else:
-            image_img = tk.Label(frame, image=image_tk, borderwidth=0)
-        image_img.image = image_tk
+            image_img = tk.Label(frame, borderwidth=0)
+        start = time.perf_counter()
+
+        def image_ready(image_tk):
+            self.metrics.observe('image_load_seconds', time.perf_counter() - start)
+            if image_img.winfo_exists():
+                image_img.config(image=image_tk)
+                image_img.image = image_tk
+        self.assets.request(path, image_ready)
         # Use relx/rely for positioning
         place_args = {}
         place_args['relx'] = relx
@@ -117,11 +378,18 @@ class MoviePilot:
         image_img.place(**place_args)
         
         return image_img
+
+    def show_loading(self, frame, text="Loading...", **place_args):
+        # Placeholder shown while a query for this frame is in flight
+        loading_label = ttk.Label(frame, text=text, font=self.content_font, foreground="#b0b0b0", background=self.__style.lookup("TFrame", "background"))
+        loading_label.place(**(place_args or {'relx': 0.5, 'rely': 0.5, 'anchor': 'center'}))
+        return loading_label
+
+    def show_query_error(self, loading_label, error):
+        if loading_label.winfo_exists():
+            loading_label.config(text=f"Could not load data: {error}", foreground="red")
         
-    def display_home(self):
-        home_frame = ttk.Frame(self.notebook)
-        self.notebook.add(home_frame, text='Home')
-        self.tab_counter += 1
+    def display_home(self, home_frame):
         sinners_file_path = './images/sinners.png'
         sinners_watch_trailer_button_file_path = './images/sinners-watch-trailer.png'
         get_movie_tickets_file_path = './images/get-movie-tickets.png'
@@ -153,23 +421,144 @@ class MoviePilot:
         get_movie_tickets_button.bind("<Button-1>", self.get_movie_tickets)
         view_sinners_description.bind("<Button-1>", self.view_sinners_description)
         
-    def display_search(self):
-        search_frame = ttk.Frame(self.notebook)
-        self.notebook.add(search_frame, text='Search')
-        self.tab_counter += 1
+    def with_search_index(self, on_ready):
+        """Call on_ready(index) with a search index of the current catalog.
+
+        The index is rebuilt on a worker whenever the catalog has changed
+        since it was built; until then searches keep using the previous one.
+        on_ready is called exactly once: with the current index if there is
+        one, stale or not, otherwise with the first one built.
+        """
+        index = self.search_index
+        if index is None or index.version != self.catalog.version:
+            if not self.search_index_building:
+                self.search_index_building = True
+                self.db.background(lambda: MovieSearchIndex(*self.catalog.movies_with_version()),
+                                   on_success=self.search_index_built, on_error=self.search_index_failed)
+            if index is None:
+                self.search_index_waiting.append(on_ready)
+                return
+        on_ready(index)
+
+    def search_index_built(self, index):
+        self.search_index = index
+        self.search_index_building = False
+        waiting, self.search_index_waiting = self.search_index_waiting, []
+        for on_ready in waiting:
+            on_ready(index)
 
+    def search_index_failed(self, error):
+        print('Error building search index: \n', error)
+        self.search_index_building = False
+        self.search_index_waiting = []
+
+    def display_search(self, search_frame):
+        background = self.__style.lookup("TFrame", "background")
         ttk.Label(search_frame, text="Search for movies...", font=self.content_font,
-                  foreground="white", background=self.__style.lookup("TFrame", "background")).pack(pady=50)
+                  foreground="white", background=background).pack(pady=(50, 20))
+
+        query_var = tk.StringVar()
+        entry = ttk.Entry(search_frame, textvariable=query_var, font=self.content_font)
+        entry.pack(fill='x', padx=80)
+        entry.focus_set()
+        status_label = ttk.Label(search_frame, text="Search by title, genre, year or story", font=("Poppins", 18),
+                                 foreground="#b0b0b0", background=background)
+        status_label.pack(pady=10)
+
+        list_frame = ttk.Frame(search_frame, style='TFrame')
+        list_frame.pack(fill='both', expand=True, padx=80, pady=(0, 40))
+        scrollbar = ttk.Scrollbar(list_frame, orient='vertical')
+        results_list = tk.Listbox(list_frame, font=("Poppins", 24), bg='#222222', fg='white',
+                                  selectbackground='#444444', selectforeground='white', activestyle='none',
+                                  borderwidth=0, highlightthickness=0)
+        scrollbar.pack(side='right', fill='y')
+        results_list.pack(side='left', fill='both', expand=True)
+
+        # Movie ids of the rows in the list; rows are only added as they are scrolled into view
+        shown = []
+        has_more = False
+        pending = None
+        # Bumped per search so late answers to an older query are ignored
+        generation = 0
+
+        def fetch(query, offset, on_page):
+            current = generation
+
+            def search_index(index):
+                if current == generation:
+                    on_page(index.search(query, limit=offset + SEARCH_PAGE_SIZE + 1)[offset:], index.count(query))
+            if self.search_index is None:
+                status_label.config(text="Preparing search...")
+            self.with_search_index(search_index)
+
+        def show_page(rows, total):
+            nonlocal has_more
+            if not search_frame.winfo_exists():
+                return
+            # One extra row is fetched only to tell whether there is a next page
+            page, has_more = rows[:SEARCH_PAGE_SIZE], len(rows) > SEARCH_PAGE_SIZE
+            for movie in page:
+                results_list.insert('end', f"{movie['title']}  ({movie['release_year']}, {movie['genre']})")
+                shown.append(movie['movie_id'])
+            status_label.config(text=f"{total} movies found" if total else "No movies found")
+
+        def run_search():
+            nonlocal pending, generation, has_more
+            pending = None
+            generation += 1
+            results_list.delete(0, 'end')
+            shown.clear()
+            has_more = False
+            query = query_var.get().strip()
+            if not query:
+                status_label.config(text="Search by title, genre, year or story")
+                return
+            fetch(query, 0, show_page)
+
+        def query_changed(*args):
+            nonlocal pending
+            if pending is not None:
+                self.root.after_cancel(pending)
+            pending = self.root.after(SEARCH_DEBOUNCE_MS, run_search)
+
+        def scrolled(first, last):
+            scrollbar.set(first, last)
+            # Near the bottom of what has been rendered: add the next page
+            if has_more and float(last) > 0.9:
+                load_more()
+
+        def load_more():
+            nonlocal has_more
+            has_more = False  # until this page arrives
+            fetch(query_var.get().strip(), len(shown), show_page)
+
+        def result_chosen(event=None):
+            selected = results_list.curselection()
+            if selected:
+                self.view_movie_description(shown[selected[0]])
+
+        results_list.config(yscrollcommand=scrolled)
+        scrollbar.config(command=results_list.yview)
+        results_list.bind('<<ListboxSelect>>', result_chosen)
+        query_var.trace_add('write', query_changed)
 
     def start(self):
         self.root.mainloop()
+        self.stall_detector.stop()
+        self.metrics_exporter.close()
+        self.db.close()
+        self.assets.close()
+        self.journal.close()
+        try:
+            self.offline_snapshot.save()
+        except OSError as e:
+            print('Error saving offline snapshot: \n', e)
         
     def watch_sinners_trailer(self, event=None):
-        trailer_frame = ttk.Frame(self.notebook)
-        self.notebook.add(trailer_frame, text='Sinners Trailer')
-        self.tab_counter += 1
-        self.notebook.select(self.notebook.tabs()[-1])
-        close_button = ttk.Button(trailer_frame, text='Close', style='Close.TButton', command=lambda: self.notebook.forget(trailer_frame))
+        trailer_frame, created = self.tabs.open('trailer', 'Sinners', text='Sinners Trailer')
+        if not created:
+            return
+        close_button = ttk.Button(trailer_frame, text='Close', style='Close.TButton', command=lambda: self.tabs.close(trailer_frame))
         close_button.pack(side=tk.TOP, anchor='ne', padx=10, pady=10)
 
         ttk.Label(trailer_frame, text="Playing Sinners Trailer...", font=self.header_font,
@@ -193,133 +582,258 @@ class MoviePilot:
         get_movie_tickets_button.bind("<Button-1>", self.get_movie_tickets)
         
     def get_movie_tickets(self, event=None):
-        tickets_frame = ttk.Frame(self.notebook)
-        self.notebook.add(tickets_frame, text='Select Showtime')
-        self.tab_counter += 1
-        self.notebook.select(self.notebook.tabs()[-1])
-        close_button = ttk.Button(tickets_frame, text='Close', style='Close.TButton', command=lambda: self.notebook.forget(tickets_frame))
+        tickets_frame, created = self.tabs.open('tickets', None, text='Select Showtime')
+        if not created:
+            return
+        close_button = ttk.Button(tickets_frame, text='Close', style='Close.TButton', command=lambda: self.tabs.close(tickets_frame))
         close_button.pack(side=tk.TOP, anchor='ne', padx=10, pady=10)
 
         # Dropdowns for movie, show date, and show time
         ttk.Label(tickets_frame, text="Select Showtime", font=(self.header_font[0], int(self.header_font[1]*1.5)), foreground="white", background=self.__style.lookup("TFrame", "background")).place(relx=0.05, rely=0.05)
 
         # Movie dropdown
-        movie_names = [m['title'] for m in self.movies]
-        movie_var = tk.StringVar(value=movie_names[0] if movie_names else "")
+        movie_var = tk.StringVar()
         ttk.Label(tickets_frame, text="Movie", font=("Poppins", int(18*1.5), "bold"), foreground="white", background=self.__style.lookup("TFrame", "background")).place(relx=0.05, rely=0.15)
-        movie_dropdown = ttk.Combobox(tickets_frame, textvariable=movie_var, values=movie_names, font=("Poppins", int(16*1.5)), state="readonly")
+        movie_dropdown = ttk.Combobox(tickets_frame, textvariable=movie_var, values=[], font=("Poppins", int(16*1.5)), state="disabled")
         movie_dropdown.place(relx=0.05, rely=0.20, relwidth=0.4)
 
         # Show date dropdown
-        self.cursor.execute("SELECT DISTINCT show_date FROM showtimes ORDER BY show_date")
-        show_dates = [row[0] for row in self.cursor.fetchall()]
-        show_date_var = tk.StringVar(value=show_dates[0] if show_dates else "")
+        show_date_var = tk.StringVar()
         ttk.Label(tickets_frame, text="Date", font=("Poppins", int(18*1.5), "bold"), foreground="white", background=self.__style.lookup("TFrame", "background")).place(relx=0.05, rely=0.28)
-        show_date_dropdown = ttk.Combobox(tickets_frame, textvariable=show_date_var, values=show_dates, font=("Poppins", int(16*1.5)), state="readonly")
+        show_date_dropdown = ttk.Combobox(tickets_frame, textvariable=show_date_var, values=[], font=("Poppins", int(16*1.5)), state="disabled")
         show_date_dropdown.place(relx=0.05, rely=0.33, relwidth=0.4)
 
         # Show time dropdown
-        self.cursor.execute("SELECT DISTINCT show_time FROM showtimes ORDER BY show_time")
-        show_times = [row[0].strftime("%H:%M") for row in self.cursor.fetchall()]
-        show_time_var = tk.StringVar(value=show_times[0] if show_times else "")
+        show_time_var = tk.StringVar()
         ttk.Label(tickets_frame, text="Time", font=("Poppins", int(18*1.5), "bold"), foreground="white", background=self.__style.lookup("TFrame", "background")).place(relx=0.05, rely=0.41)
-        show_time_dropdown = ttk.Combobox(tickets_frame, textvariable=show_time_var, values=show_times, font=("Poppins", int(16*1.5)), state="readonly")
-        show_time_dropdown.place(relx=0.05, rely=0.46, relwidth=0.4)# Continue and Back buttons
+        show_time_dropdown = ttk.Combobox(tickets_frame, textvariable=show_time_var, values=[], font=("Poppins", int(16*1.5)), state="disabled")
+        show_time_dropdown.place(relx=0.05, rely=0.46, relwidth=0.4)
+
+        # Each dropdown only offers what exists for the choice above it;
+        # all lookups come from the in-memory catalog
+        def set_options(dropdown, var, values):
+            dropdown.config(values=values, state="readonly" if values else "disabled")
+            if var.get() not in values:
+                var.set(values[0] if values else "")
+
+        def movie_changed(event=None):
+            movie_id = self.catalog.movie_id_for_title(movie_var.get())
+            set_options(show_date_dropdown, show_date_var, self.catalog.dates_for(movie_id))
+            date_changed()
+
+        def date_changed(event=None):
+            movie_id = self.catalog.movie_id_for_title(movie_var.get())
+            set_options(show_time_dropdown, show_time_var, self.catalog.times_for(movie_id, show_date_var.get()))
+
+        def fill_movies():
+            if not tickets_frame.winfo_exists():
+                return
+            set_options(movie_dropdown, movie_var, [m['title'] for m in self.catalog.movies()])
+            movie_changed()
+
+        movie_dropdown.bind("<<ComboboxSelected>>", movie_changed)
+        show_date_dropdown.bind("<<ComboboxSelected>>", date_changed)
+
+        if self.catalog.is_stale():
+            loading_label = self.show_loading(tickets_frame, "Loading showtimes...", relx=0.05, rely=0.55)
+
+            def catalog_loaded(catalog):
+                if tickets_frame.winfo_exists():
+                    loading_label.destroy()
+                    fill_movies()
+
+            def catalog_failed(error):
+                # Offline: the catalog we already have is better than nothing
+                if self.catalog.movies():
+                    catalog_loaded(self.catalog)
+                else:
+                    self.show_query_error(loading_label, error)
+
+            self.db.submit(self.catalog.refresh, on_success=catalog_loaded, on_error=catalog_failed)
+        else:
+            fill_movies()
+
+        # Continue and Back buttons
         continue_btn = ttk.Button(tickets_frame, text="Continue", style='Close.TButton',
             command=lambda: self.book_seats(movie_var.get(), show_date_var.get(), show_time_var.get()))
         continue_btn.place(relx=0.75, rely=0.85, relwidth=0.18, relheight=0.09)
-        back_btn = ttk.Button(tickets_frame, text="Back", style='Close.TButton', command=lambda: self.notebook.forget(tickets_frame))
+        back_btn = ttk.Button(tickets_frame, text="Back", style='Close.TButton', command=lambda: self.tabs.close(tickets_frame))
         back_btn.place(relx=0.07, rely=0.85, relwidth=0.18, relheight=0.09)
         
     def view_sinners_description(self, event=None):
+        sinners_movie = self.catalog.movie_by_title('Sinners')
+        if not sinners_movie:
+            tkinter.messagebox.showerror("Error", "Movie not found.")
+            return
+        self.view_movie_description(sinners_movie['movie_id'])
+
+    def view_movie_description(self, movie_id, event=None):
+        movie = self.catalog.movie(movie_id)
+        if not movie:
+            tkinter.messagebox.showerror("Error", "Movie not found.")
+            return
+        # Artwork follows the images/<title>-front-cover.png naming used for Sinners
+        slug = normalize_title(movie['title']).replace(' ', '-')
+
         # Create a new tab for the description
-        desc_frame = ttk.Frame(self.notebook)
-        self.notebook.add(desc_frame, text='Sinners Description')
-        self.tab_counter += 1
-        self.notebook.select(self.notebook.tabs()[-1])
-        close_button = ttk.Button(desc_frame, text='Close', style='Close.TButton', command=lambda: self.notebook.forget(desc_frame))
+        desc_frame, created = self.tabs.open('movie', movie_id, text=f"{movie['title']} Description")
+        if not created:
+            return
+        close_button = ttk.Button(desc_frame, text='Close', style='Close.TButton', command=lambda: self.tabs.close(desc_frame))
         close_button.pack(side=tk.TOP, anchor='ne', padx=10, pady=10)
 
-        # Left: Sinners front cover image
-        sinners_front_cover_path = './images/sinners-front-cover.png'
-        left_img = self.display_image(sinners_front_cover_path, desc_frame, relx=0, rely=0)
+        # Left: front cover image
+        front_cover_path = f'./images/{slug}-front-cover.png'
+        if os.path.exists(front_cover_path):
+            self.display_image(front_cover_path, desc_frame, relx=0, rely=0)
 
         # Right: Content frame
         right_frame = ttk.Frame(desc_frame, style='TFrame')
         right_frame.place(relx=0.38, rely=0, relwidth=0.62, relheight=1)
 
         # Nav hero image at the top right
-        nav_hero_path = './images/view-sinners-description-nav-hero.png'
-        self.display_image(nav_hero_path, right_frame, relx=0, rely=0.0)
-
-        # Get Sinners movie details
-        sinners_movie = next((m for m in self.movies if m['title'].lower() == 'sinners'), None)
-        if not sinners_movie:
-            ttk.Label(right_frame, text="Movie not found.", font=(self.header_font[0], int(self.header_font[1]*1.3)), foreground="white", background=self.__style.lookup("TFrame", "background")).pack(pady=30)
-            return
+        nav_hero_path = f'./images/view-{slug}-description-nav-hero.png'
+        if os.path.exists(nav_hero_path):
+            self.display_image(nav_hero_path, right_frame, relx=0, rely=0.0)
 
         # Title
-        ttk.Label(right_frame, text=sinners_movie['title'], font=(self.header_font[0], int(self.header_font[1]*1.3)), foreground="white", background=self.__style.lookup("TFrame", "background")).place(relx=0.5, rely=0.08, anchor='n')
+        ttk.Label(right_frame, text=movie['title'], font=(self.header_font[0], int(self.header_font[1]*1.3)), foreground="white", background=self.__style.lookup("TFrame", "background")).place(relx=0.5, rely=0.08, anchor='n')
         # Release year | Genre | Runtime
-        meta = f"{sinners_movie['release_year']} | {sinners_movie['genre']} | {sinners_movie['runtime_minutes']} min"
+        meta = f"{movie['release_year']} | {movie['genre']} | {movie['runtime_minutes']} min"
         ttk.Label(right_frame, text=meta, font=(self.content_font[0], int(self.content_font[1]*1.3)), foreground="#b0b0b0", background=self.__style.lookup("TFrame", "background")).place(relx=0.5, rely=0.17, anchor='n')
         # Synopsis (much bigger and further down)
-        ttk.Label(right_frame, text=sinners_movie['synopsis'], font=("Poppins", int(32*1.3)), wraplength=650, justify="left", foreground="white", background=self.__style.lookup("TFrame", "background")).place(relx=0.5, rely=0.32, anchor='n')
+        ttk.Label(right_frame, text=movie['synopsis'], font=("Poppins", int(32*1.3)), wraplength=650, justify="left", foreground="white", background=self.__style.lookup("TFrame", "background")).place(relx=0.5, rely=0.32, anchor='n')
         # Select Showtime header
         ttk.Label(right_frame, text="Select Showtime", font=(self.header_font[0], int(self.header_font[1]*1.3)), foreground="white", background=self.__style.lookup("TFrame", "background")).place(relx=0.5, rely=0.55, anchor='n')
 
-        # Get 4 random showtimes for Sinners (movie_id=1)
-        self.cursor.execute("SELECT showtime_id, show_date, show_time, screen FROM showtimes WHERE movie_id=1 ORDER BY RANDOM() LIMIT 4;")
-        showtimes = self.cursor.fetchall()
-        for idx, showtime in enumerate(showtimes):
-            showtime_id, show_date, show_time, screen = showtime
-            btn_text = f"{show_date} | {show_time[:-3]} | {screen}"
-            btn = ttk.Button(right_frame, text=btn_text, style='Close.TButton', command=lambda s=showtime_id: self.open_showtime_tab(s))
-            btn.place(relx=0.5, rely=0.62+idx*0.08, anchor='n')
+        # Next upcoming showtimes with remaining seats, one keyset page at a time
+        page_size = 4
+        showtime_btns = []
+        loading_label = self.show_loading(right_frame, "Loading showtimes...", relx=0.5, rely=0.62, anchor='n')
+        more_btn = ttk.Button(right_frame, text="More showtimes", style='Close.TButton')
+
+        def load_page(after=None):
+            more_btn.place_forget()
+            loading_label.config(text="Loading showtimes...", foreground="#b0b0b0")
+            loading_label.place(relx=0.5, rely=0.62, anchor='n')
+            self.db.submit(upcoming_showtimes, movie_id, after, page_size + 1,
+                           on_success=show_showtimes, on_error=lambda e: self.show_query_error(loading_label, e))
+
+        def show_showtimes(showtimes):
+            if not right_frame.winfo_exists():
+                return
+            loading_label.place_forget()
+            for btn in showtime_btns:
+                btn.destroy()
+            showtime_btns.clear()
+            if not showtimes:
+                loading_label.config(text="No upcoming showtimes.")
+                loading_label.place(relx=0.5, rely=0.62, anchor='n')
+                return
+            # One extra row is fetched only to tell whether there is a next page
+            page, has_more = showtimes[:page_size], len(showtimes) > page_size
+            for idx, (showtime_id, show_date, show_time, screen, free_seats) in enumerate(page):
+                btn_text = f"{show_date} | {time_key(show_time)} | {screen} | {free_seats} seats left"
+                btn = ttk.Button(right_frame, text=btn_text, style='Close.TButton', command=lambda s=showtime_id: self.open_showtime_tab(s))
+                btn.place(relx=0.5, rely=0.62+idx*0.08, anchor='n')
+                showtime_btns.append(btn)
+            if has_more:
+                last_id, last_date, last_time = page[-1][:3]
+                more_btn.config(command=lambda: load_page((last_date, last_time, last_id)))
+                more_btn.place(relx=0.5, rely=0.62+page_size*0.08, anchor='n')
+
+        load_page()
 
     def open_showtime_tab(self, showtime_id):
-        showtime_frame = ttk.Frame(self.notebook)
-        self.notebook.add(showtime_frame, text='Showtime')
-        self.tab_counter += 1
-        self.notebook.select(self.notebook.tabs()[-1])
-        close_button = ttk.Button(showtime_frame, text='Close', style='Close.TButton', command=lambda: self.notebook.forget(showtime_frame))
+        showtime_frame, created = self.tabs.open('showtime', showtime_id, text='Showtime')
+        if not created:
+            return
+        close_button = ttk.Button(showtime_frame, text='Close', style='Close.TButton', command=lambda: self.tabs.close(showtime_frame))
         close_button.pack(side=tk.TOP, anchor='ne', padx=10, pady=10)
         ttk.Label(showtime_frame, text=f"Showtime ID: {showtime_id}", font=self.header_font, foreground="white", background=self.__style.lookup("TFrame", "background")).pack(pady=30)
         
     def book_seats(self, movie, show_date, show_time):
         # Find the showtime_id for the selected movie, date, and time
-        self.cursor.execute("""
-            SELECT showtime_id FROM showtimes
-            WHERE movie_id = (SELECT movie_id FROM movies WHERE title = %s)
-              AND show_date = %s AND show_time = %s
-        """, (movie, show_date, show_time))
-        result = self.cursor.fetchone()
-        if not result:
-            tk.messagebox.showerror("Error", "Showtime not found.")
+        showtime_id = self.catalog.showtime_id(self.catalog.movie_id_for_title(movie), show_date, show_time)
+
+        # One seat map per showtime: choosing it again goes back to the open one
+        key = showtime_id if showtime_id is not None else (movie, show_date, show_time)
+        seat_frame, created = self.tabs.open('seats', key, text='Select Seats')
+        if not created:
             return
-        showtime_id = result[0]
-
-        # Get seat status for this showtime (reload from DB for persistence)
-        self.cursor.execute("""
-            SELECT ts.seat_id, ts.status, s.seat_number, s.row, s.column_number
-            FROM showtime_seats ts
-            JOIN seats s ON ts.seat_id = s.seat_id
-            WHERE ts.showtime_id = %s
-            ORDER BY s.row, s.column_number
-        """, (showtime_id,))
-        seats = self.cursor.fetchall()
-
-        icon_paths = {
-            'Available': './icons/seat-available.png',
-            'Sold': './icons/seat-sold.png',
-            'Selected': './icons/seat-selected.png',
-        }
-        icons = {k: ImageTk.PhotoImage(Image.open(v).resize((48, 48))) for k, v in icon_paths.items()}
-
-        seat_frame = ttk.Frame(self.notebook)
-        self.notebook.add(seat_frame, text='Select Seats')
-        self.tab_counter += 1
-        self.notebook.select(self.notebook.tabs()[-1])
+        loading_label = self.show_loading(seat_frame, "Loading seats...")
+
+        # Subscribe before reading the seats so no change made during the load is lost;
+        # the changes are buffered until build_seat_map applies them on top of the load
+        seat_changes = self.subscribe_seat_changes(seat_frame, showtime_id) if showtime_id is not None else None
+
+        def load_seat_map():
+            # Wait for the LISTEN before taking a connection, so none is held idle meanwhile
+            if seat_changes is not None:
+                seat_changes.listening.wait(SEAT_LISTEN_TIMEOUT_SECONDS)
+            # Get seat status for this showtime (reload from DB for persistence)
+            loaded_id, seats = self.db.run(lambda connection: run_steps(
+                connection, self.booking.load_seat_map(movie, show_date, show_time)))
+            if loaded_id is not None:
+                # Kept for selling this showtime if the database goes away
+                self.offline_snapshot.update_seat_map(loaded_id, seats)
+                self.offline_snapshot.save()
+            return loaded_id, seats
+
+        def show_seat_map(loaded):
+            if not seat_frame.winfo_exists():
+                return
+            showtime_id, seats = loaded
+            if showtime_id is None:
+                self.tabs.close(seat_frame)
+                tk.messagebox.showerror("Error", "Showtime not found.")
+                return
+            loading_label.destroy()
+            self.build_seat_map(seat_frame, showtime_id, seats, seat_changes=seat_changes)
+
+        def seat_map_failed(error):
+            seats = self.offline_snapshot.seat_map(showtime_id) if showtime_id is not None else None
+            if not isinstance(error, CONNECTION_ERRORS) or seats is None or not seat_frame.winfo_exists():
+                if seat_changes is not None:
+                    self.unsubscribe_seat_changes(seat_changes)
+                self.show_query_error(loading_label, error)
+                return
+            # Database unreachable: sell from the last seat map seen online, minus our unsynced sales
+            sold_offline = self.journal.sold_seats(showtime_id)
+            loading_label.destroy()
+            self.build_seat_map(seat_frame, showtime_id, [
+                (seat_id, 'Sold' if seat_id in sold_offline else status, *rest)
+                for seat_id, status, *rest in seats
+            ], offline=True, seat_changes=seat_changes)
+
+        self.db.background(load_seat_map, on_success=self.timed('seat_map', show_seat_map), on_error=seat_map_failed)
+
+    def subscribe_seat_changes(self, seat_frame, showtime_id):
+        # Other kiosks' sales and holds arrive over NOTIFY instead of being polled
+        def parse_seat_change(payload):
+            change = json.loads(payload)
+            return change['seat_id'], (change['status'], change['held_by'])
+
+        seat_changes = BatchedSubscription(self.listener, self.root, f'showtime_seats_{showtime_id}', parse_seat_change)
+        self.open_seat_maps[seat_changes] = showtime_id
+        seat_frame.bind('<Destroy>', lambda event: self.unsubscribe_seat_changes(seat_changes) if event.widget is seat_frame else None, add='+')
+        return seat_changes
+
+    def unsubscribe_seat_changes(self, seat_changes):
+        self.open_seat_maps.pop(seat_changes, None)
+        seat_changes.close()
+
+    def seat_maps_reconnected(self):
+        # Runs on the listener thread. Changes made while it was down were never sent,
+        # so read every open seat map's seats again now that the LISTENs are back
+        for seat_changes, showtime_id in list(self.open_seat_maps.items()):
+            since = seat_changes.mark()
+            self.db.submit(lambda connection, showtime_id=showtime_id: run_steps(connection, self.booking.seat_states(showtime_id)),
+                           on_success=lambda states, seat_changes=seat_changes, since=since: seat_changes.merge(states, since),
+                           on_error=lambda e: print('Error reloading seat map: \n', e))
+
+    def build_seat_map(self, seat_frame, showtime_id, seats, offline=False, seat_changes=None):
+        icons = {k: self.assets.get(v, SEAT_ICON_SIZE) for k, v in SEAT_ICON_PATHS.items()}
 
         # Counter label
         counter_var = tk.StringVar()
@@ -327,47 +841,230 @@ class MoviePilot:
         counter_label.pack(pady=10)
 
         # Instructions
-        ttk.Label(seat_frame, text="Select up to 5 seats", font=("Poppins", 18, "bold"), foreground="white", background=self.__style.lookup("TFrame", "background")).pack(pady=5)
+        ttk.Label(seat_frame, text=f"Select up to {MAX_SEATS_PER_BOOKING} seats", font=("Poppins", 18, "bold"), foreground="white", background=self.__style.lookup("TFrame", "background")).pack(pady=5)
+        offline_label = ttk.Label(seat_frame, text="Offline: bookings will be synced when the connection returns",
+                                  font=("Poppins", 16), foreground="#ffb000", background=self.__style.lookup("TFrame", "background"))
+        if offline:
+            offline_label.pack(pady=5)
 
-        seat_btns = {}
-        selected_seats = set(seat_id for seat_id, status, *_ in seats if status == 'Selected')
-        max_select = 5
-        grid = ttk.Frame(seat_frame, style='TFrame')
-        grid.pack(pady=20)
-        row_map = {'A': 0, 'B': 1, 'C': 2, 'D': 3}
+        seat_labels = {seat_id: seat_number for seat_id, status, seat_number, *_ in seats}
+        # Selections stay local until checkout, so clicking seats never touches the DB
+        selection = SeatSelection(showtime_id)
+        session_id = new_session_id()
+        # True while a checkout is talking to the database
+        busy = False
+        # True while this session may hold seats: from checkout until they are sold or released
+        holding = False
+        # One canvas for the whole hall instead of a widget per seat
+        seat_map = SeatMapCanvas(seat_frame, icons, on_click=lambda seat_id: seat_callback(seat_id))
+        seat_map.pack(pady=20, fill='both', expand=True)
 
         def update_counter():
-            counter_var.set(f"{len(selected_seats)}/5 seats selected")
+            counter_var.set(f"{len(selection)}/{selection.max_seats} seats selected")
         update_counter()
 
-        def seat_callback(seat_id, btn, current_status):
-            self.cursor.execute("SELECT status FROM showtime_seats WHERE showtime_id=%s AND seat_id=%s", (showtime_id, seat_id))
-            db_status = self.cursor.fetchone()[0]
-            if db_status == 'Sold':
+        def mark_sold(seat_id):
+            seat_map.set_status(seat_id, 'Sold')
+            self.offline_snapshot.set_status(showtime_id, [seat_id], 'Sold')
+
+        def seat_callback(seat_id):
+            if busy or seat_map.status(seat_id) == 'Sold':
                 return
-            if seat_id in selected_seats:
-                # Deselect
-                self.cursor.execute("UPDATE showtime_seats SET status='Available' WHERE showtime_id=%s AND seat_id=%s", (showtime_id, seat_id))
-                self.connection.commit()
-                selected_seats.remove(seat_id)
-                btn.config(image=icons['Available'])
-            else:
-                if len(selected_seats) >= max_select:
-                    tkinter.messagebox.showinfo("Limit reached", "You can select up to 5 seats only.")
-                    return
-                self.cursor.execute("UPDATE showtime_seats SET status='Selected' WHERE showtime_id=%s AND seat_id=%s", (showtime_id, seat_id))
-                self.connection.commit()
-                selected_seats.add(seat_id)
-                btn.config(image=icons['Selected'])
+            try:
+                selected = selection.toggle(seat_id)
+            except ValueError as e:
+                tkinter.messagebox.showinfo("Limit reached", str(e))
+                return
+            seat_map.set_status(seat_id, 'Selected' if selected else 'Available')
             update_counter()
 
-        for seat_id, status, seat_number, row, col in seats:
-            icon = icons['Selected'] if status == 'Selected' else icons['Sold' if status == 'Sold' else 'Available']
-            btn = tk.Button(grid, image=icon, bd=0, bg='black', activebackground='black')
-            btn.grid(row=row_map[row], column=col-1, padx=8, pady=8)
-            if status != 'Sold':
-                btn.config(command=lambda sid=seat_id, b=btn, s=status: seat_callback(sid, b, s))
-            seat_btns[seat_id] = btn
+        def set_busy(value):
+            nonlocal busy
+            busy = value
+            if seat_frame.winfo_exists():
+                checkout_btn.state(['disabled'] if busy else ['!disabled'])
+                if busy:
+                    counter_var.set("Booking...")
+                else:
+                    update_counter()
+
+        def booking_failed(error):
+            if not seat_frame.winfo_exists():
+                seat_map_gone()
+                return
+            set_busy(False)
+            tkinter.messagebox.showerror("Error", f"Could not complete booking: {error}")
+
+        def checkout():
+            nonlocal holding, offline
+            if busy:
+                return
+            if not len(selection):
+                tkinter.messagebox.showinfo("No seats selected", "Please select at least one seat.")
+                return
+            if offline:
+                if not self.listener.connected:
+                    offline_checkout()
+                    return
+                # The database is back: sell online again, falling back if it drops once more
+                offline = False
+                offline_label.pack_forget()
+            holding = True
+            set_busy(True)
+            # A fresh generator per attempt, so a retry on a new connection starts over;
+            # re-holding our own seats is harmless
+            self.db.submit(lambda connection: run_steps(connection, self.booking.checkout(selection, session_id)),
+                           on_success=self.timed('hold', seats_held), on_error=checkout_failed)
+
+        def checkout_failed(error):
+            nonlocal offline
+            if not seat_frame.winfo_exists():
+                seat_map_gone()
+                return
+            # The hold is retried, so it may have committed before the connection dropped.
+            # The journal records this session, and the replay takes over seats it still holds
+            if isinstance(error, CONNECTION_ERRORS) and self.offline_snapshot.seat_map(showtime_id) is not None:
+                offline = True
+                offline_label.pack(pady=5, after=counter_label)
+                set_busy(False)
+                offline_checkout()
+            else:
+                booking_failed(error)
+
+        def offline_checkout():
+            seat_ids = sorted(selection.seat_ids)
+            held = ', '.join(seat_labels[seat_id] for seat_id in seat_ids)
+            if not tkinter.messagebox.askyesno("Confirm booking", f"Book seats {held}?"):
+                return
+            set_busy(True)
+            booking_id, written = self.journal.book(showtime_id, seat_ids, [seat_labels[seat_id] for seat_id in seat_ids],
+                                                    session_id)
+            # Wait for the journal's fsync on a worker, then confirm on the Tk thread
+            self.db.background(written.result, on_success=lambda _: seats_booked_offline(seat_ids, held),
+                               on_error=booking_failed)
+
+        def seats_booked_offline(seat_ids, held):
+            nonlocal holding
+            # Any hold left from the failed online checkout now belongs to the journaled
+            # sale; closing the tab must not give those seats back before the replay
+            holding = False
+            if not seat_frame.winfo_exists():
+                return
+            selection.clear()
+            for seat_id in seat_ids:
+                mark_sold(seat_id)
+            set_busy(False)
+            tkinter.messagebox.showinfo("Booking confirmed", f"Booked seats: {held}\n(The kiosk is offline; the booking will be synced automatically.)")
+
+        def release_holds():
+            self.db.submit(lambda connection: run_steps(connection, self.booking.release(showtime_id, session_id)),
+                           on_error=lambda e: print('Error releasing seat holds: \n', e))
+
+        def seat_map_closed(event):
+            # Closed or evicted mid-booking: give the seats back now rather than when the hold
+            # expires. A request still in flight calls seat_map_gone when it lands instead
+            if event.widget is seat_frame and holding and not busy:
+                release_holds()
+
+        def seat_map_gone():
+            if holding:
+                release_holds()
+
+        def seats_held(result):
+            nonlocal holding
+            holding = result.ok
+            if not seat_frame.winfo_exists():
+                seat_map_gone()
+                return
+            if not result.ok:
+                # Nothing was held; the conflicting seats were taken by another kiosk
+                for seat_id in result.conflicts:
+                    mark_sold(seat_id)
+                set_busy(False)
+                taken = ', '.join(seat_labels.get(seat_id, str(seat_id)) for seat_id in result.conflicts)
+                tkinter.messagebox.showerror("Seats unavailable", f"These seats were just taken: {taken}. Please choose again.")
+                return
+
+            # The seats are held for this session; if the kiosk is abandoned here
+            # the hold simply expires and the reaper returns them to sale.
+            held = ', '.join(seat_labels[seat_id] for seat_id in result.claimed)
+            if tkinter.messagebox.askyesno("Confirm booking", f"Book seats {held}?"):
+                # Not retried: if the sale committed before the connection dropped, a retry
+                # would find nothing left to sell and report the hold as expired
+                self.db.submit(lambda connection: run_steps(connection, self.booking.confirm(showtime_id, session_id)),
+                               retry=False,
+                               on_success=self.timed('confirm', lambda sold: seats_confirmed(result.claimed, held, sold)),
+                               on_error=confirm_failed)
+            else:
+                self.db.submit(lambda connection: run_steps(connection, self.booking.release(showtime_id, session_id)),
+                               on_success=self.timed('release', lambda released: seats_released(result.claimed)),
+                               on_error=booking_failed)
+
+        def confirm_failed(error):
+            if not seat_frame.winfo_exists():
+                seat_map_gone()  # releasing seats that did sell is a no-op
+                return
+            if not isinstance(error, CONNECTION_ERRORS):
+                booking_failed(error)
+                return
+            set_busy(False)
+            tkinter.messagebox.showerror(
+                "Connection lost",
+                "The connection dropped while confirming, so the booking may or may not have gone through. "
+                "Please reopen the seat map to check before trying again.")
+
+        def seats_confirmed(claimed, held, sold):
+            nonlocal holding
+            holding = False
+            if not seat_frame.winfo_exists():
+                return
+            for seat_id in sold:
+                mark_sold(seat_id)
+            set_busy(False)
+            if len(sold) == len(claimed):
+                tkinter.messagebox.showinfo("Booking confirmed", f"Booked seats: {held}")
+            else:
+                for seat_id in set(claimed) - set(sold):
+                    seat_map.set_status(seat_id, 'Available')
+                tkinter.messagebox.showerror("Hold expired", "Your seat hold expired before the booking was confirmed. Please choose again.")
+
+        def seats_released(claimed):
+            nonlocal holding
+            holding = False
+            if not seat_frame.winfo_exists():
+                return
+            for seat_id in claimed:
+                seat_map.set_status(seat_id, 'Available')
+            set_busy(False)
+
+        def apply_seat_changes(changes):
+            # Live updates from other kiosks, batched by BatchedSubscription
+            if not seat_frame.winfo_exists():
+                self.unsubscribe_seat_changes(seat_changes)
+                return
+            for seat_id, (status, held_by) in changes.items():
+                self.offline_snapshot.set_status(showtime_id, [seat_id], 'Available' if status == 'Available' else 'Sold')
+                if held_by == session_id:
+                    continue  # our own hold/confirm; the checkout callbacks handle it
+                if status == 'Available':
+                    if seat_id not in selection:
+                        seat_map.set_status(seat_id, 'Available')
+                else:
+                    if seat_id in selection and not busy:
+                        selection.discard([seat_id])
+                    mark_sold(seat_id)
+            if not busy:
+                update_counter()
+
+        if seat_changes is None:
+            seat_changes = self.subscribe_seat_changes(seat_frame, showtime_id)
+        seat_frame.bind('<Destroy>', seat_map_closed, add='+')
+
+        # Seats another kiosk is holding are not available to this one
+        seat_map.load((seat_id, 'Available' if status == 'Available' else 'Sold', row, col)
+                      for seat_id, status, seat_number, row, col in seats)
+        # Changes that arrived while the seats were loading go on top of them
+        seat_changes.start(apply_seat_changes)
 
         legend = ttk.Frame(seat_frame, style='TFrame')
         legend.pack(pady=10)
@@ -379,5 +1076,21 @@ class MoviePilot:
             tk.Label(legend, image=icon, bg='black').grid(row=0, column=2*i, padx=5)
             ttk.Label(legend, text=label, font=("Poppins", 14), foreground='white', background='black').grid(row=0, column=2*i+1, padx=10)
 
-movie_pilot = MoviePilot()
-movie_pilot.start()
\ No newline at end of file
+        checkout_btn = ttk.Button(seat_frame, text="Checkout", style='Close.TButton', command=checkout)
+        checkout_btn.pack(pady=10)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Movie Pilot ticket kiosk')
+    parser.add_argument('--profile-startup', action='store_true', help='print how long each startup phase took')
+    parser.add_argument('--metrics-file', default=METRICS_PATH,
+                        help=f'write Prometheus metrics here every {EXPORT_INTERVAL_SECONDS}s ("" to disable)')
+    parser.add_argument('--metrics-port', type=int, help='also serve them on http://127.0.0.1:PORT/metrics')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    movie_pilot = MoviePilot(StartupProfiler(enabled=args.profile_startup, origin=_import_started),
+                             metrics_path=args.metrics_file, metrics_port=args.metrics_port)
+    movie_pilot.start()
\ No newline at end of file
@@ -0,0 +1,365 @@
+import bisect, datetime, os, threading, time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds, from an index lookup to a frozen kiosk
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_PATH = './metrics.prom'
+EXPORT_INTERVAL_SECONDS = 15
+SLOW_QUERY_LOG_PATH = './slow-queries.log'
+SLOW_QUERY_SECONDS = 0.25
+# Slow query lines waiting for the log writer; the oldest are dropped past this
+SLOW_QUERY_BUFFER = 1000
+# Statement labels are the SQL's first characters, so similar statements stay apart
+STATEMENT_LABEL_LENGTH = 60
+
+# name -> (type, help); every series is exported as moviepilot_<name>
+METRICS = {
+    'db_query_seconds': ('histogram', 'Time to execute a SQL statement and fetch its rows'),
+    'db_query_errors_total': ('counter', 'SQL statements that raised'),
+    'db_slow_queries_total': ('counter', 'SQL statements slower than the slow query threshold'),
+    'image_decode_seconds': ('histogram', 'Time to decode (and resize) an image file'),
+    'image_load_seconds': ('histogram', 'Time from asking for an image until it is shown, background decode included on a cache miss'),
+    'tab_build_seconds': ('histogram', 'Time from opening a tab until the Tk loop is free again'),
+    'booking_step_seconds': ('histogram', 'Time a kiosk customer waits for a booking step, as seen on the Tk thread'),
+    'ui_heartbeat_lag_seconds': ('histogram', 'How late the Tk heartbeat ran'),
+    'ui_stalls_total': ('counter', 'Heartbeats late by more than the stall threshold'),
+    'ui_worst_stall_seconds': ('gauge', 'Longest Tk loop stall since the kiosk started'),
+    'ui_open_tabs': ('gauge', 'Closable tabs currently open'),
+    'ui_widgets': ('gauge', 'Live Tk widgets; should stay flat as tabs open and close'),
+    'ui_tk_images': ('gauge', 'Live Tk images'),
+    'image_cache_hits': ('gauge', 'PhotoImage cache hits since start'),
+    'image_cache_misses': ('gauge', 'PhotoImage cache misses since start'),
+    'image_cache_cached': ('gauge', 'PhotoImages in the cache'),
+    'image_cache_used_bytes': ('gauge', 'Decoded pixel bytes held by the image cache'),
+    'image_cache_decoded_bytes': ('gauge', 'Preloaded pixel bytes not yet turned into PhotoImages'),
+    'image_cache_budget_bytes': ('gauge', 'Image cache budget'),
+    'catalog_movies': ('gauge', 'Movies in the in-memory catalog'),
+    'catalog_showtimes': ('gauge', 'Showtimes in the in-memory catalog'),
+    'catalog_live': ('gauge', '1 while the catalog is kept current by NOTIFY'),
+    'journal_pending_bookings': ('gauge', 'Offline bookings waiting to be synced'),
+    'http_request_seconds': ('histogram', 'Time to handle an API request'),
+    'http_requests_total': ('counter', 'API requests by endpoint and status'),
+    'db_pool_size': ('gauge', 'Connections in the API pool'),
+    'db_pool_available': ('gauge', 'Idle connections in the API pool'),
+    'db_pool_waiting': ('gauge', 'Requests waiting for a pooled connection'),
+}
+PREFIX = 'moviepilot_'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Prometheus-style histogram: counts per bucket plus count, sum and max."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (max for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """Thread-safe counters, gauges and latency histograms, exported as Prometheus text.
+
+    Any thread may record; labels are keyword arguments. Series are
+    described in METRICS above; undescribed names are exported untyped.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}   # name -> {labels tuple: value or Histogram}
+
+    def _labels(self, labels):
+        return tuple(sorted(labels.items()))
+
+    def observe(self, name, seconds, **labels):
+        key = self._labels(labels)
+        with self._lock:
+            series = self._series.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        key = self._labels(labels)
+        with self._lock:
+            series = self._series.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._series.setdefault(name, {})[self._labels(labels)] = value
+
+    @contextmanager
+    def time(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def histograms(self, name):
+        """{labels dict as a tuple: (count, sum, p50, p95, p99, max)} for one histogram, for reports."""
+        with self._lock:
+            series = dict(self._series.get(name, {}))
+            return {key: (h.count, h.sum, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99), h.max)
+                    for key, h in series.items()}
+
+    def value(self, name, **labels):
+        with self._lock:
+            return self._series.get(name, {}).get(self._labels(labels), 0)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name in sorted(self._series):
+                kind, help_text = METRICS.get(name, ('untyped', None))
+                full_name = PREFIX + name
+                if help_text:
+                    lines.append(f'# HELP {full_name} {help_text}')
+                lines.append(f'# TYPE {full_name} {kind}')
+                for key, value in sorted(self._series[name].items()):
+                    if isinstance(value, Histogram):
+                        cumulative = 0
+                        for bound, count in zip(value.buckets + (float('inf'),), value.counts):
+                            cumulative += count
+                            le = '+Inf' if bound == float('inf') else repr(bound)
+                            lines.append(f'{full_name}_bucket{_format_labels(key + (("le", le),))} {cumulative}')
+                        lines.append(f'{full_name}_sum{_format_labels(key)} {_format_value(value.sum)}')
+                        lines.append(f'{full_name}_count{_format_labels(key)} {value.count}')
+                    else:
+                        lines.append(f'{full_name}{_format_labels(key)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def statement_label(sql):
+    """Short, stable label for a SQL statement: its first characters with whitespace collapsed."""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    text = ' '.join(str(sql).split())
+    return text if len(text) <= STATEMENT_LABEL_LENGTH else text[:STATEMENT_LABEL_LENGTH - 3] + '...'
+
+
+class QueryTimer:
+    """Records each statement's duration in `metrics` and logs the slow ones.
+
+    Installed on connections as a cursor factory (db.timed_cursor), so every
+    `cursor.execute` in the app is timed without touching its call site.
+    Slow statements are appended to `log_path` with their parameters by a
+    background thread, so a slow disk never adds to the query's own time.
+    """
+
+    def __init__(self, metrics, slow_seconds=SLOW_QUERY_SECONDS, log_path=SLOW_QUERY_LOG_PATH, max_labels=500):
+        self.metrics = metrics
+        self.slow_seconds = slow_seconds
+        self.log_path = log_path
+        self.max_labels = max_labels
+        self._labels = {}   # sql -> label; the app's SQL is a fixed set of constants
+        self._log_buffer = deque(maxlen=SLOW_QUERY_BUFFER)
+        self._log_queued = threading.Condition()
+        self._log_writing = False
+        self._log_writer = None
+
+    def label(self, sql):
+        try:
+            label = self._labels.get(sql)
+        except TypeError:   # unhashable composed SQL
+            return statement_label(sql)
+        if label is None:
+            label = statement_label(sql)
+            if len(self._labels) < self.max_labels:
+                self._labels[sql] = label
+        return label
+
+    def record(self, sql, params, seconds, failed=False):
+        label = self.label(sql)
+        self.metrics.observe('db_query_seconds', seconds, statement=label)
+        if failed:
+            self.metrics.inc('db_query_errors_total', statement=label)
+        if seconds >= self.slow_seconds:
+            self.metrics.inc('db_slow_queries_total')
+            self.log_slow(sql, params, seconds)
+
+    def log_slow(self, sql, params, seconds):
+        if self.log_path is None:
+            return
+        if isinstance(sql, bytes):
+            sql = sql.decode('utf-8', 'replace')
+        params = repr(params)
+        if len(params) > 500:
+            params = params[:497] + '...'   # a batch sync can carry thousands of rows
+        line = (f"{datetime.datetime.now().isoformat(timespec='milliseconds')} {seconds * 1000:.1f}ms "
+                f"[{threading.current_thread().name}] {' '.join(str(sql).split())} -- params: {params}\n")
+        with self._log_queued:
+            self._log_buffer.append(line)
+            if self._log_writer is None:
+                self._log_writer = threading.Thread(target=self._write_log, name='slow-query-log', daemon=True)
+                self._log_writer.start()
+            self._log_queued.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until every logged line is written. Returns False on timeout."""
+        with self._log_queued:
+            return self._log_queued.wait_for(lambda: not self._log_buffer and not self._log_writing, timeout)
+
+    def _write_log(self):
+        while True:
+            with self._log_queued:
+                self._log_queued.wait_for(lambda: self._log_buffer)
+                lines = list(self._log_buffer)
+                self._log_buffer.clear()
+                self._log_writing = True
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.writelines(lines)
+            except OSError as e:
+                print('Error writing slow query log: \n', e)
+            finally:
+                with self._log_queued:
+                    self._log_writing = False
+                    self._log_queued.notify_all()
+
+
+class StallDetector:
+    """Heartbeat on the Tk event loop that records how late each beat runs.
+
+    A beat is scheduled every `interval_ms` with `root.after`; anything that
+    keeps the Tk thread busy (a slow callback, a big tab build, a blocking
+    call) makes the next beat late by the same amount. Beats later than
+    `stall_ms` count as stalls and are kept in `recent`.
+    """
+
+    def __init__(self, root, metrics, interval_ms=100, stall_ms=200, keep=50):
+        self.root = root
+        self.metrics = metrics
+        self.interval_ms = interval_ms
+        self.stall_ms = stall_ms
+        self.stalls = 0
+        self.worst = 0.0
+        self.recent = deque(maxlen=keep)   # (wall clock time, seconds late)
+        self._expected = None
+        self._stopped = False
+
+    def start(self):
+        self._expected = time.perf_counter() + self.interval_ms / 1000
+        self.root.after(self.interval_ms, self._beat)
+
+    def stop(self):
+        self._stopped = True
+
+    def _beat(self):
+        if self._stopped:
+            return
+        now = time.perf_counter()
+        lag = max(now - self._expected, 0.0)
+        self.metrics.observe('ui_heartbeat_lag_seconds', lag)
+        if lag * 1000 >= self.stall_ms:
+            self.stalls += 1
+            self.worst = max(self.worst, lag)
+            self.recent.append((time.time(), lag))
+            self.metrics.inc('ui_stalls_total')
+        self._expected = now + self.interval_ms / 1000
+        self.root.after(self.interval_ms, self._beat)
+
+
+class MetricsExporter:
+    """Writes `metrics` to a Prometheus text file every `interval` seconds, and optionally serves it.
+
+    The file (for node_exporter's textfile collector, or just to read) is
+    replaced atomically. With `port`, http://<host>:<port>/metrics serves
+    the same text on a background thread.
+    """
+
+    def __init__(self, metrics, path=METRICS_PATH, port=None, host='127.0.0.1', interval=EXPORT_INTERVAL_SECONDS):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.server = None
+        self._stop_event = threading.Event()
+        self._serving = False
+        if port is not None:
+            self.server = ThreadingHTTPServer((host, port), self._handler())
+            self.server.daemon_threads = True
+
+    def _handler(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass   # scraped every few seconds; keep the console quiet
+
+        return Handler
+
+    def start(self):
+        if self.server is not None:
+            threading.Thread(target=self.server.serve_forever, name='metrics-http', daemon=True).start()
+            self._serving = True
+        if self.path:
+            threading.Thread(target=self._run, name='metrics-file', daemon=True).start()
+
+    def write(self):
+        temporary = self.path + '.tmp'
+        try:
+            with open(temporary, 'w', encoding='utf-8') as f:
+                f.write(self.metrics.render())
+            os.replace(temporary, self.path)
+        except OSError as e:
+            print('Error writing metrics: \n', e)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.write()
+
+    def close(self):
+        self._stop_event.set()
+        if self.path:
+            self.write()
+        if self.server is not None:
+            if self._serving:
+                self.server.shutdown()
+            self.server.server_close()
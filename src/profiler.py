@@ -0,0 +1,69 @@
+import threading, time
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """Records how long each startup phase takes, on whichever thread it runs.
+
+    Enabled with `python src/main.py --profile-startup`. When disabled every
+    method is a cheap no-op, so the phases can stay instrumented in
+    production.
+    """
+
+    def __init__(self, enabled=False, origin=None):
+        self.enabled = enabled
+        self.origin = time.perf_counter() if origin is None else origin
+        self.phases = []
+        self._lock = threading.Lock()
+        self._reported = False
+
+    def record(self, name, start, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.phases.append((name, start - self.origin, seconds, threading.current_thread().name))
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter() - start)
+
+    def names(self):
+        with self._lock:
+            return {name for name, *_ in self.phases}
+
+    def report(self):
+        with self._lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+        total = time.perf_counter() - self.origin
+        lines = ['Startup profile:',
+                 f"  {'phase':<48} {'start ms':>9} {'took ms':>9}  thread"]
+        for name, offset, seconds, thread in phases:
+            lines.append(f'  {name:<48} {offset * 1000:>9.1f} {seconds * 1000:>9.1f}  {thread}')
+        lines.append(f"  {'total until report':<48} {'':>9} {total * 1000:>9.1f}")
+        print('\n'.join(lines))
+
+    def report_when_done(self, root, expected, poll_interval=100, timeout=60):
+        """Print the report from the Tk loop once every phase in `expected` has run."""
+        if not self.enabled or self._reported:
+            return
+        expected = set(expected)
+        deadline = time.perf_counter() + timeout
+
+        def check():
+            if expected <= self.names() or time.perf_counter() > deadline:
+                self._reported = True
+                missing = expected - self.names()
+                self.report()
+                if missing:
+                    print(f"  (still running when reported: {', '.join(sorted(missing))})")
+            else:
+                root.after(poll_interval, check)
+
+        root.after(poll_interval, check)
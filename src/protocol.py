@@ -0,0 +1,116 @@
+"""HTTP/1.1 parsing and routing for the booking API (src/api.py).
+
+Kept apart from the handlers so it imports no database driver and can be
+tested on its own.
+"""
+import datetime, http, json, re
+from urllib.parse import parse_qs, unquote, urlsplit
+
+MAX_BODY_BYTES = 64 * 1024
+# Page size for /movies/<movie_id>/showtimes
+DEFAULT_SHOWTIMES_LIMIT = 20
+MAX_SHOWTIMES_LIMIT = 100
+
+# (method, path pattern, name of the BookingAPI handler)
+ROUTES = [
+    ('GET', re.compile(r'/health'), 'health'),
+    ('GET', re.compile(r'/metrics'), 'metrics_page'),
+    ('GET', re.compile(r'/movies'), 'movies'),
+    ('GET', re.compile(r'/movies/(\d+)/showtimes'), 'showtimes'),
+    ('GET', re.compile(r'/showtimes/(\d+)/seats'), 'seats'),
+    ('POST', re.compile(r'/showtimes/(\d+)/holds'), 'hold'),
+    ('POST', re.compile(r'/showtimes/(\d+)/holds/([^/]+)/confirm'), 'confirm'),
+    ('DELETE', re.compile(r'/showtimes/(\d+)/holds/([^/]+)'), 'release'),
+]
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)  # Decimal ratings
+
+
+def encode_response(status, payload, keep_alive):
+    # Text payloads (the metrics page) go out as is, everything else as JSON
+    if isinstance(payload, str):
+        body, content_type = payload.encode(), 'text/plain; version=0.0.4'
+    else:
+        body, content_type = json.dumps(payload, default=_json_default).encode(), 'application/json'
+    head = (f'HTTP/1.1 {status} {http.HTTPStatus(status).phrase}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+    return head.encode('latin-1') + body
+
+
+async def read_request(reader):
+    """One HTTP/1.1 request as (method, target, headers, body), or None at end of stream."""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise HTTPError(400, 'Malformed request line')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length') or 0)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, 'Request body too large')
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), target, headers, body
+
+
+def route(routes, method, target):
+    """(handler, query, path arguments) for a request; HTTPError if nothing matches."""
+    url = urlsplit(target)
+    path = url.path.rstrip('/') or '/'
+    allowed = False
+    for route_method, pattern, handler in routes:
+        match = pattern.fullmatch(path)
+        if match is None:
+            continue
+        allowed = True
+        if route_method == method:
+            return handler, parse_qs(url.query), [unquote(group) for group in match.groups()]
+    raise HTTPError(405 if allowed else 404, 'Method not allowed' if allowed else 'Not found')
+
+
+def parse_body(body):
+    """A request body as a dict; an empty body is an empty object."""
+    try:
+        payload = json.loads(body) if body else {}
+    except ValueError:
+        raise HTTPError(400, 'Body is not valid JSON')
+    if not isinstance(payload, dict):
+        raise HTTPError(400, 'Body must be a JSON object')
+    return payload
+
+
+def parse_showtimes_query(query):
+    """(after, limit) for a showtimes page: the keyset cursor, or None for the first page."""
+    try:
+        limit = int(query.get('limit', [DEFAULT_SHOWTIMES_LIMIT])[0])
+    except ValueError:
+        limit = None
+    if limit is None or not 1 <= limit <= MAX_SHOWTIMES_LIMIT:
+        raise HTTPError(400, f'limit must be a whole number from 1 to {MAX_SHOWTIMES_LIMIT}')
+    after = None
+    if 'after' in query:
+        try:
+            after_date, after_time, after_id = query['after'][0].split(',')
+            after = (datetime.date.fromisoformat(after_date), datetime.time.fromisoformat(after_time), int(after_id))
+        except ValueError:
+            raise HTTPError(400, 'after must be <date>,<time>,<showtime_id>')
+    return after, limit
@@ -0,0 +1,168 @@
+"""Provision the movie_pilot schema, seat layout and a showtime schedule.
+
+Builds a schedule of dates x times x screens, assigns the movies to the
+screen slots round-robin (so no screen shows two films at once, and no
+film is on two screens at once; with fewer movies than screens the extra
+screens stay empty), and
+bulk-loads `showtimes` and one `showtime_seats` row per seat per showtime
+in a single set-based INSERT ... SELECT.
+
+    python src/provision.py --start 2026-01-01 --days 90 \\
+        --screens "Screen 1,Screen 2,Screen 3" --times 10:00,13:00,16:00,19:00,22:00
+"""
+import argparse, datetime, string, sys, time
+
+import psycopg2
+
+from db import DEFAULT_DSN
+from schema import apply_migrations, schema_sql
+
+# Seat layout used when the seats table is empty: rows A.., columns 1..
+SEATS_SQL = """
+    INSERT INTO seats (seat_number, row, column_number)
+    SELECT r.label || c, r.label, c
+    FROM unnest(%(rows)s::text[]) r(label)
+    CROSS JOIN generate_series(1, %(columns)s) c
+    ORDER BY r.label, c
+"""
+
+# One statement: create every free screen slot's showtime, then fan each new
+# showtime out to every seat. Movie k of n gets slot (screen + time + day) % n.
+# Showtimes are keyed by (movie, date, time) in the catalog, so only the first
+# n screens are filled and a movie already showing in a slot is not added again.
+SCHEDULE_SQL = """
+    WITH movie_rotation AS (
+        SELECT movie_id,
+               row_number() OVER (ORDER BY movie_id) - 1 AS position,
+               count(*) OVER () AS movie_count
+        FROM movies
+        WHERE %(movie_ids)s::int[] IS NULL OR movie_id = ANY(%(movie_ids)s::int[])
+    ),
+    slots AS (
+        SELECT d::date AS show_date, t.show_time, s.screen, s.screen_position,
+               (d::date - %(start)s::date) + t.slot + s.screen_position AS turn
+        FROM generate_series(%(start)s::date, %(end)s::date, interval '1 day') d
+        CROSS JOIN unnest(%(times)s::time[]) WITH ORDINALITY t(show_time, slot)
+        CROSS JOIN unnest(%(screens)s::text[]) WITH ORDINALITY s(screen, screen_position)
+    ),
+    new_showtimes AS (
+        INSERT INTO showtimes (movie_id, show_date, show_time, screen)
+        SELECT m.movie_id, slots.show_date, slots.show_time, slots.screen
+        FROM slots
+        JOIN movie_rotation m ON m.position = slots.turn %% m.movie_count
+        WHERE slots.screen_position <= m.movie_count
+          AND NOT EXISTS (
+              SELECT 1 FROM showtimes existing
+              WHERE existing.screen = slots.screen
+                AND existing.show_date = slots.show_date
+                AND existing.show_time = slots.show_time
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM showtimes existing
+              WHERE existing.movie_id = m.movie_id
+                AND existing.show_date = slots.show_date
+                AND existing.show_time = slots.show_time
+          )
+        ORDER BY slots.show_date, slots.show_time, slots.screen
+        RETURNING showtime_id
+    )
+    INSERT INTO showtime_seats (showtime_id, seat_id, status)
+    SELECT st.showtime_id, s.seat_id, 'Available'
+    FROM new_showtimes st
+    CROSS JOIN seats s
+    ORDER BY st.showtime_id, s.seat_id
+"""
+
+
+def row_labels(count):
+    labels = []
+    for index in range(count):
+        label, index = '', index + 1
+        while index:
+            index, remainder = divmod(index - 1, 26)
+            label = string.ascii_uppercase[remainder] + label
+        labels.append(label)
+    return labels
+
+
+def provision_seats(cursor, rows, columns):
+    """Create a rows x columns seat layout if the seats table is empty. Returns the seat count."""
+    cursor.execute("SELECT count(*) FROM seats")
+    existing = cursor.fetchone()[0]
+    if existing:
+        return existing
+    cursor.execute(SEATS_SQL, {'rows': row_labels(rows), 'columns': columns})
+    return cursor.rowcount
+
+
+def provision_schedule(connection, start, days, screens, times, movie_ids=None):
+    """Bulk-load showtimes and their seats. Returns (showtimes added, seat rows added)."""
+    end = start + datetime.timedelta(days=days - 1)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM seats")
+        seat_count = cursor.fetchone()[0]
+        # Nothing else waits on this transaction's commit, so skip the WAL flush
+        cursor.execute("SET LOCAL synchronous_commit = off")
+        cursor.execute(SCHEDULE_SQL, {
+            'start': start, 'end': end, 'screens': list(screens), 'times': list(times),
+            'movie_ids': list(movie_ids) if movie_ids else None,
+        })
+        seat_rows = cursor.rowcount
+    connection.commit()
+    # Fresh statistics so the planner uses the covering indexes straight away
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE showtimes")
+        cursor.execute("ANALYZE showtime_seats")
+    connection.commit()
+    return (seat_rows // seat_count if seat_count else 0), seat_rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dsn', default=DEFAULT_DSN)
+    parser.add_argument('--start', type=datetime.date.fromisoformat, default=datetime.date.today())
+    parser.add_argument('--days', type=int, default=28)
+    parser.add_argument('--screens', default='Screen 1,Screen 2,Screen 3')
+    parser.add_argument('--times', default='10:00,13:00,16:00,19:00,22:00')
+    parser.add_argument('--movies', default='', help='comma-separated movie ids (default: all movies)')
+    parser.add_argument('--seat-rows', type=int, default=4, help='rows to create if the seats table is empty')
+    parser.add_argument('--seat-columns', type=int, default=8, help='seats per row to create if the seats table is empty')
+    parser.add_argument('--print-schema', action='store_true', help='print the schema SQL and exit')
+    parser.add_argument('--schema-only', action='store_true', help='create or update the schema, without adding showtimes')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.print_schema:
+        print(schema_sql())
+        return
+
+    screens = [screen.strip() for screen in args.screens.split(',') if screen.strip()]
+    times = [datetime.time.fromisoformat(value.strip()) for value in args.times.split(',') if value.strip()]
+    movie_ids = [int(value) for value in args.movies.split(',') if value.strip()]
+
+    connection = psycopg2.connect(args.dsn)
+    try:
+        apply_migrations(connection)
+        if args.schema_only:
+            print('Schema is up to date')
+            return
+        with connection.cursor() as cursor:
+            seat_count = provision_seats(cursor, args.seat_rows, args.seat_columns)
+        connection.commit()
+
+        start = time.perf_counter()
+        showtimes, seat_rows = provision_schedule(connection, args.start, args.days, screens, times, movie_ids)
+        elapsed = time.perf_counter() - start
+    finally:
+        connection.close()
+
+    print(f'{seat_count} seats per showtime')
+    print(f'Added {showtimes} showtimes and {seat_rows} showtime seats in {elapsed:.2f}s')
+    if not showtimes:
+        print('No new showtimes: every screen slot in that range is already scheduled, or there are no movies', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,383 @@
+import inspect, socket, threading, uuid
+from dataclasses import dataclass, field
+
+MAX_SEATS_PER_BOOKING = 5
+HOLD_TTL_SECONDS = 5 * 60
+
+# A seat is free if it is Available, or if its hold has lapsed. Holds left
+# behind by older versions of the app have no expiry and count as lapsed.
+SEAT_IS_FREE_SQL = """(status = 'Available'
+        OR (status = 'Selected' AND (hold_expires_at IS NULL OR hold_expires_at < now())))"""
+
+# Status as a customer should see it: lapsed holds read as Available even
+# before the reaper has swept them.
+EFFECTIVE_STATUS_SQL = """CASE WHEN ts.status = 'Selected'
+             AND (ts.hold_expires_at IS NULL OR ts.hold_expires_at < now())
+        THEN 'Available' ELSE ts.status END"""
+
+# Seat map for one showtime, as loaded by book_seats. Served from the
+# showtime_seats primary key and the seats_position_idx covering index.
+SEAT_MAP_SQL = f"""
+    SELECT ts.seat_id, {EFFECTIVE_STATUS_SQL}, s.seat_number, s.row, s.column_number
+    FROM showtime_seats ts
+    JOIN seats s ON ts.seat_id = s.seat_id
+    WHERE ts.showtime_id = %s
+    ORDER BY s.row, s.column_number
+"""
+
+# Every seat's status and holder, for bringing an open seat map up to date
+SEAT_STATES_SQL = f"""
+    SELECT ts.seat_id, {EFFECTIVE_STATUS_SQL}, ts.held_by
+    FROM showtime_seats ts
+    WHERE ts.showtime_id = %s
+"""
+
+# Claims every requested seat or none of them in a single statement.
+# The `wanted` CTE locks the rows in seat_id order (so two overlapping
+# bookings can never deadlock) and re-reads their latest committed state;
+# the UPDATE only fires when every requested seat exists and is claimable,
+# and when the seats the session already holds elsewhere ({held}) plus the
+# new ones stay within %(max_seats)s. That count is returned with each row.
+_CLAIM_TEMPLATE = """
+    WITH wanted AS (
+        SELECT seat_id, status, {claimable} AS claimable
+        FROM showtime_seats
+        WHERE showtime_id = %(showtime_id)s AND seat_id = ANY(%(seat_ids)s)
+        ORDER BY seat_id
+        FOR UPDATE
+    ),
+    claimed AS (
+        UPDATE showtime_seats ts
+        SET {assignments}
+        FROM wanted w
+        WHERE ts.showtime_id = %(showtime_id)s
+          AND ts.seat_id = w.seat_id
+          AND (SELECT count(*) FROM wanted WHERE claimable) = %(count)s
+          AND {held} + %(count)s <= %(max_seats)s
+        RETURNING ts.seat_id
+    )
+    SELECT w.seat_id, w.status, w.claimable, c.seat_id IS NOT NULL, {held}
+    FROM wanted w
+    LEFT JOIN claimed c ON c.seat_id = w.seat_id
+"""
+
+CLAIM_SEATS_SQL = _CLAIM_TEMPLATE.format(
+    claimable=SEAT_IS_FREE_SQL,
+    held='0',
+    assignments="status = 'Sold', held_by = NULL, hold_expires_at = NULL",
+)
+
+HOLD_SEATS_SQL = _CLAIM_TEMPLATE.format(
+    # A session may re-hold its own seats, which also extends the expiry
+    claimable=f"({SEAT_IS_FREE_SQL} OR (status = 'Selected' AND held_by = %(session_id)s))",
+    # Re-holding the session's own seats does not count twice; every other
+    # unexpired seat it holds does, so repeated holds cannot add up past the limit
+    held="""(SELECT count(*) FROM showtime_seats
+             WHERE showtime_id = %(showtime_id)s AND held_by = %(session_id)s
+               AND status = 'Selected' AND hold_expires_at >= now()
+               AND NOT seat_id = ANY(%(seat_ids)s))""",
+    assignments="status = 'Selected', held_by = %(session_id)s, "
+                "hold_expires_at = now() + make_interval(secs => %(ttl)s)",
+)
+
+# Holds by one session run one at a time. Each statement counts the session's
+# other holds from its own snapshot, so two holds at once would each miss the
+# other's seats and could add up past the limit. The lock is taken in its own
+# statement because a statement waiting inside a CTE would still count from the
+# snapshot it started with; the next statement sees every hold committed before
+# the lock was granted. It is released when the hold's transaction ends.
+SESSION_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext(%(session_id)s))"
+
+# libpq's PQTRANS_IDLE, the same value in psycopg2 and psycopg
+TRANSACTION_IDLE = 0
+
+CONFIRM_HOLDS_SQL = """
+    UPDATE showtime_seats
+    SET status = 'Sold', held_by = NULL, hold_expires_at = NULL
+    WHERE showtime_id = %(showtime_id)s AND held_by = %(session_id)s
+      AND status = 'Selected' AND hold_expires_at >= now()
+    RETURNING seat_id
+"""
+
+RELEASE_HOLDS_SQL = """
+    UPDATE showtime_seats
+    SET status = 'Available', held_by = NULL, hold_expires_at = NULL
+    WHERE showtime_id = %(showtime_id)s AND held_by = %(session_id)s AND status = 'Selected'
+    RETURNING seat_id
+"""
+
+# Releases at most %(batch_size)s lapsed holds. SKIP LOCKED keeps the sweep
+# from queueing behind a checkout that is touching the same rows.
+REAP_EXPIRED_HOLDS_SQL = """
+    WITH expired AS (
+        SELECT showtime_id, seat_id
+        FROM showtime_seats
+        WHERE status = 'Selected' AND (hold_expires_at IS NULL OR hold_expires_at < now())
+        LIMIT %(batch_size)s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE showtime_seats ts
+    SET status = 'Available', held_by = NULL, hold_expires_at = NULL
+    FROM expired e
+    WHERE ts.showtime_id = e.showtime_id AND ts.seat_id = e.seat_id
+"""
+
+
+def run_steps(connection, steps):
+    """Run a database operation written as a generator of (sql, params) steps.
+
+    Each step's rows (or its rowcount, for statements that return no rows)
+    are sent back into the generator, and its return value is the result.
+    The same generator runs on an async connection with `run_steps_async`,
+    so the Tk app and the HTTP API share every query and booking rule.
+    A generator can only run once: to retry, build a new one.
+    """
+    if inspect.getgeneratorstate(steps) != inspect.GEN_CREATED:
+        raise ValueError('These steps have already run; build a new generator to retry them')
+    rows = None
+    try:
+        while True:
+            sql, params = steps.send(rows)
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall() if cursor.description is not None else cursor.rowcount
+    except StopIteration as done:
+        if not connection.autocommit:
+            connection.commit()
+        return done.value
+    except Exception:
+        if not connection.autocommit:
+            connection.rollback()
+        elif connection.info.transaction_status != TRANSACTION_IDLE:
+            # Steps that open their own transaction (see hold_steps) must not leave it open
+            with connection.cursor() as cursor:
+                cursor.execute('ROLLBACK')
+        raise
+
+
+async def run_steps_async(connection, steps):
+    """`run_steps` for a psycopg (version 3) AsyncConnection."""
+    if inspect.getgeneratorstate(steps) != inspect.GEN_CREATED:
+        raise ValueError('These steps have already run; build a new generator to retry them')
+    rows = None
+    try:
+        while True:
+            sql, params = steps.send(rows)
+            async with connection.cursor() as cursor:
+                await cursor.execute(sql, params)
+                rows = await cursor.fetchall() if cursor.description is not None else cursor.rowcount
+    except StopIteration as done:
+        if not connection.autocommit:
+            await connection.commit()
+        return done.value
+    except Exception:
+        if not connection.autocommit or connection.info.transaction_status != TRANSACTION_IDLE:
+            await connection.rollback()
+        raise
+
+
+def new_session_id():
+    """Owner id for seat holds: the kiosk's host name plus a random suffix."""
+    return f"{socket.gethostname()}:{uuid.uuid4().hex[:12]}"
+
+
+@dataclass
+class ReservationResult:
+    showtime_id: int
+    claimed: list = field(default_factory=list)
+    # seat_id -> status the seat had when the claim was attempted
+    # ('Missing' when the seat does not exist for this showtime)
+    conflicts: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return not self.conflicts
+
+
+class SeatSelection:
+    """Seats a customer has picked on the seat map but not yet checked out.
+
+    Picking and un-picking seats is purely local; nothing reaches the
+    database until the selection is handed to SeatReservationEngine.checkout.
+    """
+
+    def __init__(self, showtime_id, max_seats=MAX_SEATS_PER_BOOKING):
+        self.showtime_id = showtime_id
+        self.max_seats = max_seats
+        self.seat_ids = set()
+
+    def __len__(self):
+        return len(self.seat_ids)
+
+    def __contains__(self, seat_id):
+        return seat_id in self.seat_ids
+
+    def is_full(self):
+        return len(self.seat_ids) >= self.max_seats
+
+    def toggle(self, seat_id):
+        """Select or deselect a seat. Returns True if the seat is now selected."""
+        if seat_id in self.seat_ids:
+            self.seat_ids.remove(seat_id)
+            return False
+        if self.is_full():
+            raise ValueError(f"You can select up to {self.max_seats} seats only.")
+        self.seat_ids.add(seat_id)
+        return True
+
+    def discard(self, seat_ids):
+        self.seat_ids.difference_update(seat_ids)
+
+    def clear(self):
+        self.seat_ids.clear()
+
+
+class SeatReservationEngine:
+    """Seat claims, holds and sales for one showtime at a time.
+
+    The work is written as SQL steps (see `run_steps`); `claim`, `hold`,
+    `confirm`, `release` and `checkout` run them on a psycopg2 connection,
+    and the matching `*_steps` methods return them for callers that bring
+    their own connection, such as the async HTTP API.
+    """
+
+    def __init__(self, max_seats=MAX_SEATS_PER_BOOKING, hold_ttl=HOLD_TTL_SECONDS):
+        self.max_seats = max_seats
+        self.hold_ttl = hold_ttl
+
+    def _claim(self, sql, showtime_id, seat_ids, **params):
+        seat_ids = sorted(set(seat_ids))
+        result = ReservationResult(showtime_id)
+        if not seat_ids:
+            return result
+        if len(seat_ids) > self.max_seats:
+            raise ValueError(f"You can book up to {self.max_seats} seats only.")
+
+        rows = yield sql, dict(params, showtime_id=showtime_id, seat_ids=seat_ids, count=len(seat_ids),
+                               max_seats=self.max_seats)
+        found = set()
+        for seat_id, status, claimable, was_claimed, already_held in rows:
+            if already_held + len(seat_ids) > self.max_seats:
+                raise ValueError(f"You can book up to {self.max_seats} seats only; "
+                                 f"this session already holds {already_held}.")
+            found.add(seat_id)
+            if was_claimed:
+                result.claimed.append(seat_id)
+            elif not claimable:
+                result.conflicts[seat_id] = status
+        for seat_id in seat_ids:
+            if seat_id not in found:
+                result.conflicts[seat_id] = 'Missing'
+        return result
+
+    def claim_steps(self, showtime_id, seat_ids):
+        return self._claim(CLAIM_SEATS_SQL, showtime_id, seat_ids)
+
+    def hold_steps(self, showtime_id, seat_ids, session_id, ttl=None):
+        # Explicit, since the connections are autocommit: the lock lasts until COMMIT
+        yield 'BEGIN', None
+        yield SESSION_LOCK_SQL, {'session_id': session_id}
+        result = yield from self._claim(HOLD_SEATS_SQL, showtime_id, seat_ids,
+                                        session_id=session_id, ttl=self.hold_ttl if ttl is None else ttl)
+        yield 'COMMIT', None
+        return result
+
+    def confirm_steps(self, showtime_id, session_id):
+        rows = yield CONFIRM_HOLDS_SQL, {'showtime_id': showtime_id, 'session_id': session_id}
+        return [row[0] for row in rows]
+
+    def release_steps(self, showtime_id, session_id):
+        rows = yield RELEASE_HOLDS_SQL, {'showtime_id': showtime_id, 'session_id': session_id}
+        return [row[0] for row in rows]
+
+    def checkout_steps(self, selection, session_id):
+        result = yield from self.hold_steps(selection.showtime_id, selection.seat_ids, session_id)
+        if result.ok:
+            selection.clear()
+        else:
+            selection.discard(result.conflicts)
+        return result
+
+    def claim(self, connection, showtime_id, seat_ids):
+        """Atomically sell all of `seat_ids` for a showtime, or none of them.
+
+        The claim is one statement in one transaction; on an autocommit
+        connection that is a single round trip to the server.
+        """
+        return run_steps(connection, self.claim_steps(showtime_id, seat_ids))
+
+    def hold(self, connection, showtime_id, seat_ids, session_id, ttl=None):
+        """Atomically hold all of `seat_ids` for `session_id`, or none of them.
+
+        Held seats show as Selected to other kiosks until the hold is
+        confirmed, released, or expires after `ttl` seconds. A session
+        holds at most `max_seats` at once, however many calls it makes,
+        even concurrently; going over raises ValueError and holds nothing.
+        """
+        return run_steps(connection, self.hold_steps(showtime_id, seat_ids, session_id, ttl))
+
+    def confirm(self, connection, showtime_id, session_id):
+        """Sell every unexpired seat held by `session_id`. Returns the sold seat ids."""
+        return run_steps(connection, self.confirm_steps(showtime_id, session_id))
+
+    def release(self, connection, showtime_id, session_id):
+        """Give back every seat held by `session_id`. Returns the released seat ids."""
+        return run_steps(connection, self.release_steps(showtime_id, session_id))
+
+    def checkout(self, connection, selection, session_id):
+        """Flush a local SeatSelection to the database as a hold for `session_id`.
+
+        Seats that were held or lost to another kiosk are removed from
+        the selection, so a failed checkout leaves only seats worth retrying.
+        """
+        return run_steps(connection, self.checkout_steps(selection, session_id))
+
+
+class HoldReaper(threading.Thread):
+    """Background thread that returns lapsed holds to the pool in batches.
+
+    It uses its own connection so a sweep never competes with the UI for
+    the app's connection.
+    """
+
+    def __init__(self, dsn, interval=30, batch_size=500):
+        super().__init__(name='hold-reaper', daemon=True)
+        self.dsn = dsn
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def reap(self, connection):
+        """Release lapsed holds until none are left. Returns how many were released."""
+        released = 0
+        with connection.cursor() as cursor:
+            while not self._stop_event.is_set():
+                cursor.execute(REAP_EXPIRED_HOLDS_SQL, {'batch_size': self.batch_size})
+                released += cursor.rowcount
+                if cursor.rowcount < self.batch_size:
+                    break
+        return released
+
+    def run(self):
+        import psycopg2
+
+        connection = None
+        while not self._stop_event.is_set():
+            try:
+                if connection is None or connection.closed:
+                    connection = psycopg2.connect(self.dsn)
+                    connection.autocommit = True
+                released = self.reap(connection)
+                if released:
+                    print(f'Released {released} expired seat holds')
+            except Exception as e:
+                print('Error while releasing expired seat holds: \n', e)
+                if connection is not None:
+                    connection.close()
+                connection = None
+            self._stop_event.wait(self.interval)
+        if connection is not None:
+            connection.close()
@@ -0,0 +1,163 @@
+import re
+
+# The movie_pilot schema. Every statement is idempotent, so the whole list
+# is safe to re-run. It is applied by `python src/provision.py` rather than
+# at kiosk startup: ALTER TABLE locks the seat tables, and a kiosk restart
+# should not wait behind (or block) live bookings. The kiosk only checks
+# that it is in place (`missing_schema`). `provision.py --print-schema`
+# prints it as plain SQL.
+TABLES = [
+    """CREATE TABLE IF NOT EXISTS movies (
+           movie_id SERIAL PRIMARY KEY,
+           title TEXT NOT NULL,
+           synopsis TEXT,
+           content_rating TEXT,
+           average_user_rating NUMERIC(3, 1),
+           release_year INTEGER,
+           runtime_minutes INTEGER,
+           genre TEXT
+       )""",
+    """CREATE TABLE IF NOT EXISTS showtimes (
+           showtime_id SERIAL PRIMARY KEY,
+           movie_id INTEGER NOT NULL REFERENCES movies (movie_id),
+           show_date DATE NOT NULL,
+           show_time TIME NOT NULL,
+           screen TEXT NOT NULL
+       )""",
+    """CREATE TABLE IF NOT EXISTS seats (
+           seat_id SERIAL PRIMARY KEY,
+           seat_number TEXT NOT NULL,
+           row TEXT NOT NULL,
+           column_number INTEGER NOT NULL
+       )""",
+    """CREATE TABLE IF NOT EXISTS showtime_seats (
+           showtime_id INTEGER NOT NULL REFERENCES showtimes (showtime_id),
+           seat_id INTEGER NOT NULL REFERENCES seats (seat_id),
+           status TEXT NOT NULL DEFAULT 'Available',
+           PRIMARY KEY (showtime_id, seat_id)
+       )""",
+]
+
+MIGRATIONS = [
+    # Seat holds: who holds a Selected seat and until when
+    "ALTER TABLE showtime_seats ADD COLUMN IF NOT EXISTS held_by TEXT",
+    "ALTER TABLE showtime_seats ADD COLUMN IF NOT EXISTS hold_expires_at TIMESTAMPTZ",
+    # Lets the hold reaper find lapsed holds without scanning every seat
+    """CREATE INDEX IF NOT EXISTS showtime_seats_hold_expiry_idx
+           ON showtime_seats (hold_expires_at) WHERE status = 'Selected'""",
+    # Catalog change feed: every change to movies/showtimes is sent as
+    # {"op": ..., "id": <movie_id or showtime_id>} on <table>_changed for the catalog cache
+    """CREATE OR REPLACE FUNCTION notify_catalog_change() RETURNS trigger AS $$
+       DECLARE
+           changed jsonb := to_jsonb(CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END);
+       BEGIN
+           -- Only the key: a whole movie row can exceed the 8000 byte payload limit
+           PERFORM pg_notify(TG_TABLE_NAME || '_changed', jsonb_build_object(
+               'op', TG_OP,
+               'id', changed -> CASE TG_TABLE_NAME WHEN 'movies' THEN 'movie_id' ELSE 'showtime_id' END
+           )::text);
+           RETURN NULL;
+       END;
+       $$ LANGUAGE plpgsql""",
+    # Seat change feed: each seat status change is sent as
+    # {"seat_id": ..., "status": ..., "held_by": ...} on showtime_seats_<showtime_id>,
+    # so open seat maps only hear about their own showtime
+    """CREATE OR REPLACE FUNCTION notify_seat_change() RETURNS trigger AS $$
+       BEGIN
+           PERFORM pg_notify('showtime_seats_' || NEW.showtime_id, json_build_object(
+               'seat_id', NEW.seat_id,
+               'status', NEW.status,
+               'held_by', NEW.held_by
+           )::text);
+           RETURN NULL;
+       END;
+       $$ LANGUAGE plpgsql""",
+    # Search runs in memory over the whole catalog (search.MovieSearchIndex); the full-text
+    # column for a PostgreSQL fallback only slowed down every movie write. Drops its index too
+    "ALTER TABLE movies DROP COLUMN IF EXISTS search_vector",
+]
+
+# (name, table, definition) of the change feed triggers. Each is created only
+# if it is missing: dropping and recreating one would lock its table and
+# leave a window in which changes send no NOTIFY. Changing a definition
+# therefore needs a new trigger name.
+TRIGGERS = [
+    ('showtimes_notify_change', 'showtimes', """AFTER INSERT OR UPDATE OR DELETE ON showtimes
+           FOR EACH ROW EXECUTE FUNCTION notify_catalog_change()"""),
+    ('movies_notify_change', 'movies', """AFTER INSERT OR UPDATE OR DELETE ON movies
+           FOR EACH ROW EXECUTE FUNCTION notify_catalog_change()"""),
+    ('showtime_seats_notify_change', 'showtime_seats', """AFTER UPDATE OF status, held_by ON showtime_seats
+           FOR EACH ROW
+           WHEN (OLD.status IS DISTINCT FROM NEW.status OR OLD.held_by IS DISTINCT FROM NEW.held_by)
+           EXECUTE FUNCTION notify_seat_change()"""),
+]
+
+
+def create_trigger_sql(name, table, definition):
+    return f"""DO $do$
+       BEGIN
+           IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{name}' AND tgrelid = '{table}'::regclass) THEN
+               CREATE TRIGGER {name} {definition};
+           END IF;
+       END
+       $do$"""
+
+
+# Covering indexes for the app's hot queries
+INDEXES = [
+    # Showtime resolution in book_seats and the upcoming-showtimes list:
+    # equality on movie_id, then the (show_date, show_time, showtime_id) keyset
+    """CREATE INDEX IF NOT EXISTS showtimes_movie_schedule_idx
+           ON showtimes (movie_id, show_date, show_time, showtime_id) INCLUDE (screen)""",
+    # Lets provisioning skip screen slots that are already scheduled
+    """CREATE INDEX IF NOT EXISTS showtimes_screen_slot_idx
+           ON showtimes (screen, show_date, show_time)""",
+    # The seat map and free seat counts read one showtime's rows through the primary key.
+    # A covering copy of it kept status in an index, so every hold and sale had to update
+    # that index too and could never be a HOT update; earlier databases drop it here
+    "DROP INDEX IF EXISTS showtime_seats_map_idx",
+    # The seats side of the seat map join, already in display order
+    """CREATE INDEX IF NOT EXISTS seats_position_idx
+           ON seats (row, column_number) INCLUDE (seat_id, seat_number)""",
+]
+
+SCHEMA = TABLES + MIGRATIONS + [create_trigger_sql(*trigger) for trigger in TRIGGERS] + INDEXES
+
+# Columns added by MIGRATIONS, as table.column
+REQUIRED_COLUMNS = ['showtime_seats.held_by', 'showtime_seats.hold_expires_at']
+
+# What the schema should contain, read without taking any locks
+MISSING_SCHEMA_SQL = """
+    SELECT name FROM unnest(%(relations)s::text[]) name WHERE to_regclass(name) IS NULL
+    UNION ALL
+    SELECT name FROM unnest(%(triggers)s::text[]) name
+    WHERE NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = name)
+    UNION ALL
+    SELECT name FROM unnest(%(columns)s::text[]) name
+    WHERE NOT EXISTS (SELECT 1 FROM information_schema.columns
+                      WHERE table_schema = current_schema() AND table_name || '.' || column_name = name)
+"""
+
+
+def schema_sql():
+    return ';\n\n'.join(statement.strip() for statement in SCHEMA) + ';\n'
+
+
+def missing_schema(connection):
+    """Names of the tables, indexes, triggers and columns the database is missing."""
+    relations = re.findall(r'CREATE (?:TABLE|INDEX) IF NOT EXISTS (\w+)', ' '.join(SCHEMA))
+    with connection.cursor() as cursor:
+        cursor.execute(MISSING_SCHEMA_SQL, {
+            'relations': relations,
+            'triggers': [name for name, _, _ in TRIGGERS],
+            'columns': REQUIRED_COLUMNS,
+        })
+        return [row[0] for row in cursor.fetchall()]
+
+
+def apply_migrations(connection):
+    with connection.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+    if not connection.autocommit:
+        connection.commit()
@@ -0,0 +1,185 @@
+import bisect, heapq, re
+
+# How much a match in each field counts towards a movie's rank
+FIELD_WEIGHTS = {'title': 10.0, 'genre': 4.0, 'release_year': 3.0, 'synopsis': 1.0}
+# A query word that matches a whole word (not just its prefix) counts this much more
+EXACT_MATCH_BONUS = 1.5
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text or '').casefold())
+
+
+class MovieSearchIndex:
+    """In-memory inverted index over movie title, genre, synopsis and release year.
+
+    Every query word is matched as a prefix, so results update as the
+    customer types. Prefixes are resolved with a binary search over the
+    sorted vocabulary, and each word's postings are kept as sets grouped by
+    field weight so matching and ranking run as set and dict operations. When
+    a query extends the previous one (the usual case while typing) only the
+    previous matches are narrowed instead of searching the whole index again.
+
+    There is no database fallback for big catalogs: the kiosk's catalog
+    already holds every movie in memory (the tickets and description tabs
+    read it), so the index never covers more than is loaded anyway.
+    """
+
+    def __init__(self, movies=(), version=None):
+        self.version = version
+        self._movies = {}
+        self._postings = {}   # token -> {weight: {movie_id, ...}}
+        self._forward = {}    # movie_id -> {token: weight}
+        for movie in movies:
+            self._add(movie)
+        self._vocabulary = sorted(self._postings)
+        self._average_words = sum(map(len, self._forward.values())) / max(1, len(self._forward))
+        # Normalized titles in sorted order, to find titles starting with the query
+        titles = sorted((' '.join(tokenize(movie.get('title'))), movie_id) for movie_id, movie in self._movies.items())
+        self._sorted_titles = [title for title, _ in titles]
+        self._sorted_title_ids = [movie_id for _, movie_id in titles]
+        # Equal scores rank shorter titles first, then alphabetically
+        by_length = sorted(titles, key=lambda entry: (len(entry[0]), entry[0]))
+        self._tiebreak = {movie_id: position for position, (_, movie_id) in enumerate(by_length)}
+        # The previous query, its matches, and the matches of all but its last word
+        self._last_tokens = None
+        self._last_base = None
+        self._last_matches = None
+
+    def __len__(self):
+        return len(self._movies)
+
+    def _add(self, movie):
+        movie_id = movie['movie_id']
+        self._movies[movie_id] = movie
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(movie.get(field)):
+                if weights.get(token, 0) < weight:
+                    weights[token] = weight
+        self._forward[movie_id] = weights
+        for token, weight in weights.items():
+            self._postings.setdefault(token, {}).setdefault(weight, set()).add(movie_id)
+
+    def _expand(self, prefix):
+        """Vocabulary words starting with `prefix`."""
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + '\U0010ffff', start)
+        return self._vocabulary[start:end]
+
+    @staticmethod
+    def _score(weight, token, prefix):
+        return weight * EXACT_MATCH_BONUS if token == prefix else weight
+
+    def _match_index(self, prefix, tokens, candidates=None):
+        by_score = {}
+        for token in tokens:
+            for weight, movie_ids in self._postings[token].items():
+                by_score.setdefault(self._score(weight, token, prefix), []).append(movie_ids)
+        scores = {}
+        # Lowest score first, so each movie ends up with its best match
+        for score in sorted(by_score):
+            movie_ids = set().union(*by_score[score])
+            if candidates is not None:
+                movie_ids &= candidates
+            scores.update(dict.fromkeys(movie_ids, score))
+        return scores
+
+    def _match_candidates(self, prefix, candidates):
+        scores = {}
+        for movie_id in candidates:
+            best = 0
+            for token, weight in self._forward[movie_id].items():
+                if token.startswith(prefix):
+                    best = max(best, self._score(weight, token, prefix))
+            if best:
+                scores[movie_id] = best
+        return scores
+
+    def _narrow(self, prefix, matches, base=None):
+        """Scores of the `matches` that also match `prefix`, added to their `base` scores."""
+        expanded = self._expand(prefix)
+        if matches is None:
+            return self._match_index(prefix, expanded)
+        postings = sum(len(movie_ids) for word in expanded for movie_ids in self._postings[word].values())
+        # Re-checking a handful of candidates word by word beats intersecting big postings
+        if len(matches) * self._average_words < postings / 8:
+            scores = self._match_candidates(prefix, matches)
+        else:
+            scores = self._match_index(prefix, expanded, matches.keys())
+        if base is None:
+            return scores
+        return {movie_id: base[movie_id] + score for movie_id, score in scores.items()}
+
+    def _matches(self, tokens):
+        """movie_id -> total score for movies matching every token (as a prefix)."""
+        last_tokens = self._last_tokens
+        if tokens == last_tokens:
+            # A trailing space or a re-run of the same query
+            return self._last_matches
+        if (last_tokens is not None and tokens[:-1] == last_tokens[:-1]
+                and tokens[-1].startswith(last_tokens[-1])):
+            # Typing more of the last word only narrows the previous matches
+            base = self._last_base
+            matches = self._narrow(tokens[-1], self._last_matches, base)
+        elif tokens[:-1] == last_tokens:
+            # A new word after the previous query
+            base = self._last_matches
+            matches = self._narrow(tokens[-1], base, base)
+        else:
+            # Start from the longest (usually rarest) word so the candidate set starts small
+            base = None
+            for token in sorted(tokens[:-1], key=len, reverse=True):
+                base = self._narrow(token, base, base)
+            matches = self._narrow(tokens[-1], base, base)
+        self._last_tokens, self._last_base, self._last_matches = tokens, base, matches
+        return matches
+
+    def _titles_starting_with(self, prefix):
+        start = bisect.bisect_left(self._sorted_titles, prefix)
+        end = bisect.bisect_left(self._sorted_titles, prefix + '\U0010ffff', start)
+        return self._sorted_title_ids[start:end]
+
+    def _best(self, matches, limit, exclude):
+        """Top `limit` of `matches` by score, without computing a sort key for every match."""
+        if limit <= 0:
+            return []
+        scores = heapq.nlargest(limit + len(exclude), matches.values())
+        if not scores:
+            return []
+        cutoff = scores[-1]
+        above = [movie_id for movie_id, score in matches.items() if score > cutoff and movie_id not in exclude]
+        above.sort(key=lambda movie_id: (-matches[movie_id], self._tiebreak[movie_id]))
+        tied = [movie_id for movie_id, score in matches.items() if score == cutoff and movie_id not in exclude]
+        return above + heapq.nsmallest(limit - len(above), tied, key=self._tiebreak.__getitem__)
+
+    def count(self, query):
+        """How many movies match `query`."""
+        tokens = tokenize(query)
+        return len(self._matches(tokens)) if tokens else 0
+
+    def search(self, query, limit=None):
+        """Movies matching every word of `query`, best match first."""
+        tokens = tokenize(query)
+        if not tokens:
+            self._last_tokens = self._last_base = self._last_matches = None
+            return []
+        matches = self._matches(tokens)
+
+        def rank(movie_id):
+            return (-matches[movie_id], self._tiebreak[movie_id])
+
+        # Titles that start with what was typed go first
+        preferred = {movie_id: matches[movie_id]
+                     for movie_id in self._titles_starting_with(' '.join(tokens)) if movie_id in matches}
+        if limit is None:
+            preferred = sorted(preferred, key=rank)
+            exclude = set(preferred)
+            rest = sorted((movie_id for movie_id in matches if movie_id not in exclude), key=rank)
+        else:
+            preferred = self._best(preferred, limit, ())
+            rest = self._best(matches, limit - len(preferred), set(preferred))
+        return [self._movies[movie_id] for movie_id in preferred + rest]
+
@@ -0,0 +1,145 @@
+import tkinter as tk
+
+
+def row_sort_key(row):
+    # 'A'..'Z' before 'AA', and '9' before '10'
+    return (len(str(row)), str(row))
+
+
+class SeatMapCanvas:
+    """Seat map drawn as image items on a single tk.Canvas.
+
+    Seats are laid out from each seat's row label and column_number, so any
+    hall shape works. Only seats inside (or near) the visible area get a
+    canvas item; the rest are created as the map is scrolled. Every seat in
+    a given state shares one PhotoImage, clicks are hit-tested from the
+    pointer coordinates, and a status change only reconfigures that seat's
+    item.
+    """
+
+    def __init__(self, parent, icons, on_click, pitch=64, margin=48, bg='black',
+                 label_font=("Poppins", 16, "bold"), max_height=520):
+        self.icons = icons
+        self.on_click = on_click
+        self.pitch = pitch
+        self.margin = margin
+        self.label_font = label_font
+        self.max_height = max_height
+
+        self.frame = tk.Frame(parent, bg=bg)
+        self.canvas = tk.Canvas(self.frame, bg=bg, highlightthickness=0)
+        self.x_scroll = tk.Scrollbar(self.frame, orient='horizontal', command=self._xview)
+        self.y_scroll = tk.Scrollbar(self.frame, orient='vertical', command=self._yview)
+        self.canvas.configure(xscrollcommand=self.x_scroll.set, yscrollcommand=self.y_scroll.set)
+        self.canvas.grid(row=0, column=0, sticky='nsew')
+        self.frame.rowconfigure(0, weight=1)
+        self.frame.columnconfigure(0, weight=1)
+
+        self.canvas.bind('<Button-1>', self._clicked)
+        self.canvas.bind('<Configure>', lambda event: self.render_visible())
+
+        self._seats = {}   # seat_id -> [row_index, column, status]
+        self._cells = {}   # (row_index, column) -> seat_id
+        self._items = {}   # seat_id -> canvas item id, for seats drawn so far
+        self.rows = []
+        self.columns = 0
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    # -- layout --------------------------------------------------------------
+
+    def load(self, seats):
+        """Lay out `seats`, an iterable of (seat_id, status, row, column_number)."""
+        self.canvas.delete('all')
+        self._seats, self._cells, self._items = {}, {}, {}
+        seats = list(seats)
+        self.rows = sorted({row for _, _, row, _ in seats}, key=row_sort_key)
+        row_index = {row: index for index, row in enumerate(self.rows)}
+        self.columns = max((column for *_, column in seats), default=0)
+        for seat_id, status, row, column in seats:
+            self._seats[seat_id] = [row_index[row], column, status]
+            self._cells[(row_index[row], column)] = seat_id
+
+        width = 2 * self.margin + self.columns * self.pitch
+        height = 2 * self.margin + len(self.rows) * self.pitch
+        self.canvas.configure(scrollregion=(0, 0, width, height),
+                              width=min(width, self.canvas.winfo_screenwidth() - 100),
+                              height=min(height, self.max_height))
+        # Scrollbars only when the hall does not fit
+        if width > self.canvas.winfo_screenwidth() - 100:
+            self.x_scroll.grid(row=1, column=0, sticky='ew')
+        if height > self.max_height:
+            self.y_scroll.grid(row=0, column=1, sticky='ns')
+
+        for index, row in enumerate(self.rows):
+            self.canvas.create_text(self.margin / 2, self._y(index), text=row, fill='white',
+                                    font=self.label_font, tags='label')
+        self.render_visible()
+
+    def _x(self, column):
+        return self.margin + (column - 1) * self.pitch + self.pitch / 2
+
+    def _y(self, row_index):
+        return self.margin + row_index * self.pitch + self.pitch / 2
+
+    def _xview(self, *args):
+        self.canvas.xview(*args)
+        self.render_visible()
+
+    def _yview(self, *args):
+        self.canvas.yview(*args)
+        self.render_visible()
+
+    def render_visible(self, overscan=4):
+        """Create items for seats in the visible area (plus `overscan` cells around it)."""
+        if not self._seats:
+            return
+        left, top = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        width = max(self.canvas.winfo_width(), int(self.canvas.cget('width')))
+        height = max(self.canvas.winfo_height(), int(self.canvas.cget('height')))
+        first_column = max(1, int((left - self.margin) // self.pitch) + 1 - overscan)
+        last_column = min(self.columns, int((left + width - self.margin) // self.pitch) + 1 + overscan)
+        first_row = max(0, int((top - self.margin) // self.pitch) - overscan)
+        last_row = min(len(self.rows) - 1, int((top + height - self.margin) // self.pitch) + overscan)
+        for row_index in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                seat_id = self._cells.get((row_index, column))
+                if seat_id is not None and seat_id not in self._items:
+                    status = self._seats[seat_id][2]
+                    self._items[seat_id] = self.canvas.create_image(
+                        self._x(column), self._y(row_index), image=self.icons[status], tags='seat')
+
+    # -- interaction ---------------------------------------------------------
+
+    def seat_at(self, x, y):
+        """Seat id under canvas coordinates (x, y), or None for the gaps between seats."""
+        column = int((x - self.margin) // self.pitch) + 1
+        row_index = int((y - self.margin) // self.pitch)
+        seat_id = self._cells.get((row_index, column))
+        if seat_id is None:
+            return None
+        icon = self.icons[self._seats[seat_id][2]]
+        if abs(x - self._x(column)) > icon.width() / 2 or abs(y - self._y(row_index)) > icon.height() / 2:
+            return None
+        return seat_id
+
+    def _clicked(self, event):
+        seat_id = self.seat_at(self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+        if seat_id is not None:
+            self.on_click(seat_id)
+
+    def status(self, seat_id):
+        return self._seats[seat_id][2]
+
+    def set_status(self, seat_id, status):
+        seat = self._seats.get(seat_id)
+        if seat is None or seat[2] == status:
+            return
+        seat[2] = status
+        item = self._items.get(seat_id)
+        if item is not None:
+            self.canvas.itemconfigure(item, image=self.icons[status])
+
+    def item_count(self):
+        return len(self._items)
@@ -0,0 +1,111 @@
+import time
+from collections import OrderedDict
+from tkinter import ttk
+
+# Closable tabs kept open before the least recently used one is closed
+MAX_OPEN_TABS = 8
+
+
+def widget_count(widget):
+    """Number of live widgets in the tree under `widget`, including itself."""
+    return 1 + sum(widget_count(child) for child in widget.winfo_children())
+
+
+def image_count(widget):
+    """Number of Tk images that exist in `widget`'s interpreter."""
+    return len(widget.tk.splitlist(widget.tk.call('image', 'names')))
+
+
+class TabManager:
+    """Opens the app's closable tabs, one per (view, key).
+
+    Opening a view that is already open (the same showtime, the same movie)
+    selects the existing tab instead of building a second one. Closing a
+    tab destroys its frame, which takes every widget under it, the images
+    they hold and the callbacks bound to them along. Once more than
+    `max_tabs` are open, the least recently selected one is closed.
+    Tabs added to the notebook directly (Home, Search) are left alone.
+    """
+
+    def __init__(self, notebook, max_tabs=MAX_OPEN_TABS, on_build=None):
+        self.notebook = notebook
+        self.max_tabs = max_tabs
+        # Optional on_build(view, seconds) hook, called with the time from creating a tab
+        # until the Tk loop next goes idle, i.e. how long the caller took to build it
+        self.on_build = on_build
+        self.opened = 0
+        self.reused = 0
+        self.closed = 0
+        self._tabs = OrderedDict()   # (view, key) -> frame, least recently selected first
+        self._keys = {}              # frame path -> (view, key)
+        notebook.bind('<<NotebookTabChanged>>', self._tab_selected, add='+')
+
+    def __len__(self):
+        return len(self._tabs)
+
+    def open(self, view, key=None, text=None):
+        """Select the tab for (view, key), creating an empty one if needed.
+
+        Returns (frame, created); the caller only builds the view when
+        `created` is True.
+        """
+        frame = self._tabs.get((view, key))
+        if frame is not None and frame.winfo_exists():
+            self._tabs.move_to_end((view, key))
+            self.notebook.select(frame)
+            self.reused += 1
+            return frame, False
+
+        frame = ttk.Frame(self.notebook)
+        self.notebook.add(frame, text=text or view)
+        self._tabs[(view, key)] = frame
+        self._keys[str(frame)] = (view, key)
+        # However the frame goes (close button, eviction, parent destroyed), forget it
+        frame.bind('<Destroy>', lambda event: self._forget(frame) if event.widget is frame else None, add='+')
+        self.opened += 1
+        if self.on_build is not None:
+            start = time.perf_counter()
+            # Scheduled on the notebook: callbacks scheduled on the frame die with it
+            self.notebook.after_idle(lambda: self.on_build(view, time.perf_counter() - start))
+        self.notebook.select(frame)
+        self._evict(keep=frame)
+        return frame, True
+
+    def close(self, frame):
+        """Remove a tab and destroy everything in it."""
+        self._forget(frame)
+        if frame.winfo_exists():
+            self.notebook.forget(frame)
+            frame.destroy()
+
+    def close_view(self, view, key=None):
+        frame = self._tabs.get((view, key))
+        if frame is not None:
+            self.close(frame)
+
+    def _forget(self, frame):
+        view_key = self._keys.pop(str(frame), None)
+        if view_key is not None and self._tabs.get(view_key) is frame:
+            del self._tabs[view_key]
+            self.closed += 1
+
+    def _evict(self, keep):
+        while len(self._tabs) > self.max_tabs:
+            oldest = next(frame for frame in self._tabs.values() if frame is not keep)
+            self.close(oldest)
+
+    def _tab_selected(self, event=None):
+        view_key = self._keys.get(self.notebook.select())
+        if view_key is not None:
+            self._tabs.move_to_end(view_key)
+
+    def stats(self):
+        root = self.notebook.winfo_toplevel()
+        return {
+            'open': len(self._tabs),
+            'opened': self.opened,
+            'reused': self.reused,
+            'closed': self.closed,
+            'widgets': widget_count(root),
+            'images': image_count(root),
+        }
@@ -0,0 +1,4 @@
+import os, sys
+
+# The app runs as `python src/main.py`, so its modules import each other by name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
@@ -0,0 +1,79 @@
+import datetime, json
+
+from catalog import ShowtimeCatalog, MOVIES_CHANNEL, SHOWTIMES_CHANNEL, MOVIE_SQL, SHOWTIME_SQL
+
+
+def movie(movie_id, title):
+    return {'movie_id': movie_id, 'title': title, 'synopsis': '', 'content_rating': 'PG', 'average_user_rating': 7.0,
+            'release_year': 2025, 'runtime_minutes': 120, 'genre': 'Drama'}
+
+
+def showtime(showtime_id, movie_id, show_date, show_time, screen='Screen 1'):
+    return {'showtime_id': showtime_id, 'movie_id': movie_id, 'show_date': show_date,
+            'show_time': show_time, 'screen': screen}
+
+
+def notify(catalog, channel, op, key, row=None):
+    """Run the notification's steps, answering its query with `row` (None: the row is gone)."""
+    steps = catalog.notification_steps(channel, json.dumps({'op': op, 'id': key}))
+    queries = []
+    try:
+        sql, params = next(steps)
+        queries.append((sql, params))
+        steps.send([tuple(row.values())] if row is not None else [])
+    except StopIteration:
+        pass
+    return queries
+
+
+def make_catalog():
+    catalog = ShowtimeCatalog()
+    catalog.load([movie(1, 'Sinners'), movie(2, 'Heat')],
+                 [showtime(10, 1, datetime.date(2026, 10, 20), datetime.time(19, 0))])
+    return catalog
+
+
+def test_showtime_insert_reads_the_row_back():
+    catalog = make_catalog()
+    queries = notify(catalog, SHOWTIMES_CHANNEL, 'INSERT', 11, showtime(11, 2, '2026-10-21', '13:00:00'))
+    assert queries == [(SHOWTIME_SQL, (11,))]
+    assert catalog.showtime_id(2, '2026-10-21', '13:00') == 11
+    assert catalog.dates_for(2) == ['2026-10-21']
+
+
+def test_showtime_update_moves_it_in_the_schedule():
+    catalog = make_catalog()
+    notify(catalog, SHOWTIMES_CHANNEL, 'UPDATE', 10, showtime(10, 1, '2026-10-20', '21:30:00'))
+    assert catalog.times_for(1, '2026-10-20') == ['21:30']
+    assert catalog.showtime_id(1, '2026-10-20', '19:00') is None
+
+
+def test_delete_needs_no_query():
+    catalog = make_catalog()
+    assert notify(catalog, SHOWTIMES_CHANNEL, 'DELETE', 10) == []
+    assert catalog.showtimes_for(1) == []
+    assert catalog.dates_for(1) == []
+
+
+def test_row_gone_before_it_was_read_is_removed():
+    catalog = make_catalog()
+    notify(catalog, SHOWTIMES_CHANNEL, 'UPDATE', 10, None)
+    assert catalog.showtime_id(1, '2026-10-20', '19:00') is None
+
+
+def test_movie_changes_update_titles_and_bump_the_version():
+    catalog = make_catalog()
+    version = catalog.version
+    queries = notify(catalog, MOVIES_CHANNEL, 'UPDATE', 2, movie(2, 'Heat (Director\'s Cut)'))
+    assert queries == [(MOVIE_SQL, (2,))]
+    assert catalog.movie_id_for_title('Heat') is None
+    assert catalog.movie_by_title("heat  (director's cut)")['movie_id'] == 2
+    notify(catalog, MOVIES_CHANNEL, 'DELETE', 1)
+    assert catalog.movie(1) is None
+    assert catalog.version == version + 2
+
+
+def test_other_channels_are_ignored():
+    catalog = make_catalog()
+    assert notify(catalog, 'showtime_seats_10', 'UPDATE', 10) == []
+    assert catalog.stats()['showtimes'] == 1
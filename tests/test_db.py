@@ -0,0 +1,106 @@
+import time
+
+import pytest
+
+pytest.importorskip('psycopg2')
+
+from db import BatchedSubscription, Database
+
+
+class FakeRoot:
+    """Stands in for Tk: `after` callbacks run when the test calls `run_pending`."""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback):
+        self.scheduled.append(callback)
+
+    def run_pending(self):
+        scheduled, self.scheduled = self.scheduled, []
+        for callback in scheduled:
+            callback()
+
+
+class FakeListener:
+    def __init__(self):
+        self.callbacks = {}
+
+    def listen(self, channel, callback):
+        self.callbacks[channel] = callback
+        return None
+
+    def unlisten(self, channel, callback):
+        self.callbacks.pop(channel, None)
+
+    def notify(self, channel, payload):
+        self.callbacks[channel](channel, payload)
+
+
+def subscribe(root, listener):
+    return BatchedSubscription(listener, root, 'seats', lambda payload: tuple(payload.split('=')))
+
+
+def test_changes_are_buffered_until_start_and_then_batched():
+    root, listener, batches = FakeRoot(), FakeListener(), []
+    subscription = subscribe(root, listener)
+    listener.notify('seats', '1=Selected')
+    listener.notify('seats', '1=Sold')
+    assert root.scheduled == []
+    subscription.start(batches.append)
+    assert batches == [{'1': 'Sold'}]
+    listener.notify('seats', '2=Sold')
+    root.run_pending()
+    root.run_pending()
+    assert batches == [{'1': 'Sold'}, {'2': 'Sold'}]
+    subscription.close()
+    assert listener.callbacks == {}
+    root.run_pending()
+    assert root.scheduled == []
+
+
+def test_merge_never_overwrites_a_newer_notification():
+    root, listener, batches = FakeRoot(), FakeListener(), []
+    subscription = subscribe(root, listener)
+    since = subscription.mark()
+    listener.notify('seats', '1=Sold')  # arrives while the state is being read
+    subscription.merge({'1': 'Available', '2': 'Sold'}, since)
+    subscription.start(batches.append)
+    assert batches == [{'1': 'Sold', '2': 'Sold'}]
+
+
+def test_failing_batch_does_not_stop_later_batches():
+    root, listener, batches = FakeRoot(), FakeListener(), []
+
+    def apply_batch(changes):
+        batches.append(changes)
+        if len(batches) == 1:
+            raise RuntimeError('widget destroyed')
+
+    subscription = subscribe(root, listener)
+    listener.notify('seats', '1=Sold')
+    subscription.start(apply_batch)
+    listener.notify('seats', '2=Sold')
+    root.run_pending()
+    assert batches == [{'1': 'Sold'}, {'2': 'Sold'}]
+
+
+def test_pump_keeps_delivering_after_a_callback_raises():
+    root, delivered = FakeRoot(), []
+    database = Database(root=root, max_connections=1)
+
+    def fail(result):
+        raise RuntimeError('invalid command name ".!frame"')
+
+    try:
+        database.background(lambda: 1, on_success=fail)
+        database.background(lambda: 2, on_success=delivered.append)
+        database.background(lambda: 1 / 0, on_error=lambda e: delivered.append(type(e)))
+        deadline = time.monotonic() + 5
+        while len(delivered) < 2 and time.monotonic() < deadline:
+            root.run_pending()
+            time.sleep(0.01)
+    finally:
+        database.close()
+    assert delivered == [2, ZeroDivisionError]
+    assert len(root.scheduled) == 1  # still pumping
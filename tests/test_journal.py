@@ -0,0 +1,130 @@
+import json
+
+from journal import SYNC_BOOKINGS_SQL, BookingJournal, BookingReplayer, OfflineSnapshot
+
+
+def book(journal, booking_id, showtime_id=1, seat_ids=(10,)):
+    return journal.append({'op': 'book', 'id': booking_id, 'showtime_id': showtime_id, 'seat_ids': list(seat_ids)})
+
+
+def read_records(path):
+    with open(path, 'rb') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_torn_last_record_is_dropped_on_open(tmp_path):
+    path = str(tmp_path / 'bookings.journal')
+    journal = BookingJournal(path)
+    book(journal, 'a').result()
+    book(journal, 'b', seat_ids=(11, 12)).result()
+    journal.close()
+    with open(path, 'ab') as f:
+        f.write(b'{"op":"book","id":"c","show')  # crashed mid-write
+
+    journal = BookingJournal(path)
+    assert [booking['id'] for booking in journal.pending()] == ['a', 'b']
+    assert journal.sold_seats(1) == {10, 11, 12}
+    # The torn bytes are gone, so the next record starts on a line of its own
+    book(journal, 'd').result()
+    journal.close()
+    assert [record['id'] for record in read_records(path)] == ['a', 'b', 'd']
+
+
+def test_bad_record_in_the_middle_is_skipped(tmp_path):
+    path = str(tmp_path / 'bookings.journal')
+    with open(path, 'wb') as f:
+        f.write(b'{"op":"book","id":"a","showtime_id":1,"seat_ids":[10]}\n'
+                b'not json\n'
+                b'{"op":"book","id":"b","showtime_id":1,"seat_ids":[11]}\n')
+    journal = BookingJournal(path)
+    assert [booking['id'] for booking in journal.pending()] == ['a', 'b']
+    journal.close()
+
+
+def test_synced_bookings_are_compacted_away(tmp_path):
+    path = str(tmp_path / 'bookings.journal')
+    journal = BookingJournal(path, compact_after=4)
+    for booking_id in 'abc':
+        book(journal, booking_id).result()
+    journal.mark_synced('a', [10], []).result()
+    assert len(read_records(path)) == 4
+
+    # Two synced bookings are four records compaction can drop, so this write compacts
+    journal.mark_synced('b', [10], []).result()
+    assert [record['id'] for record in read_records(path)] == ['c']
+    book(journal, 'd').result()
+    journal.close()
+    assert [record['id'] for record in read_records(path)] == ['c', 'd']
+    assert {booking['id'] for booking in BookingJournal(path).pending()} == {'c', 'd'}
+
+
+def test_mark_synced_ignores_unknown_bookings(tmp_path):
+    journal = BookingJournal(str(tmp_path / 'bookings.journal'))
+    assert journal.mark_synced('missing', [], []) is None
+    journal.close()
+
+
+class FakeCursor:
+    def __init__(self, sold):
+        self.sold = sold
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.executed.append((sql, params))
+
+    def fetchall(self):
+        _, params = self.executed[-1]
+        return [(booking_id, seat_id, 'Selected', seat_id in self.sold)
+                for booking_id, seat_id in zip(params['booking_ids'], params['seat_ids'])]
+
+
+class FakeConnection:
+    autocommit = True
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+def test_replay_lets_a_booking_take_over_its_own_session_hold(tmp_path):
+    journal = BookingJournal(str(tmp_path / 'bookings.journal'))
+    booking_id, written = journal.book(1, [10, 11], ['A10', 'A11'], session_id='kiosk-session')
+    written.result()
+    cursor = FakeCursor(sold={10, 11})
+    report = BookingReplayer(journal).replay(FakeConnection(cursor))
+    journal.close()
+
+    sql, params = cursor.executed[-1]
+    assert sql == SYNC_BOOKINGS_SQL
+    assert params['session_ids'] == ['kiosk-session', 'kiosk-session']
+    assert "ts.held_by = w.session_id" in sql
+    assert (report.synced, report.seats_sold, report.conflicts) == (1, 2, [])
+    assert journal.pending() == []
+
+
+def test_offline_snapshot_keeps_one_file_per_upcoming_showtime(tmp_path):
+    catalog_path, seats_dir = str(tmp_path / 'offline-catalog.json'), tmp_path / 'offline-seats'
+    snapshot = OfflineSnapshot(catalog_path, str(seats_dir))
+    snapshot.update_seat_map(1, [(10, 'Available', 'A1', 'A', 1)])
+    snapshot.update_seat_map(2, [(10, 'Available', 'A1', 'A', 1)])
+    snapshot.save()
+    snapshot.set_status(2, [10], 'Sold')
+    snapshot.save()
+    assert sorted(path.name for path in seats_dir.iterdir()) == ['1.json', '2.json']
+
+    snapshot = OfflineSnapshot(catalog_path, str(seats_dir))
+    assert snapshot.seat_map(2) == [(10, 'Sold', 'A1', 'A', 1)]
+    assert snapshot.seat_map(3) is None
+    snapshot.update_catalog([], [{'showtime_id': 1, 'show_date': '2000-01-01'},
+                                 {'showtime_id': 2, 'show_date': '2999-01-01'}])
+    snapshot.save()
+    assert [path.name for path in seats_dir.iterdir()] == ['2.json']
+    assert snapshot.seat_map(1) is None
@@ -0,0 +1,26 @@
+import threading
+
+from metrics import Metrics, QueryTimer
+
+
+def test_slow_queries_are_logged_off_the_calling_thread(tmp_path, monkeypatch):
+    path = tmp_path / 'slow-queries.log'
+    timer = QueryTimer(Metrics(), slow_seconds=0.1, log_path=str(path))
+    writers = []
+    real_open = open
+
+    def tracking_open(*args, **kwargs):
+        writers.append(threading.current_thread().name)
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr('builtins.open', tracking_open)
+    timer.record('SELECT 1', None, 0.01)
+    timer.record('SELECT  pg_sleep(1)', (1,), 1.0)
+    timer.record('SELECT 2', {'id': 2}, 0.5)
+    assert timer.flush(timeout=5)
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2
+    assert 'SELECT pg_sleep(1) -- params: (1,)' in lines[0]
+    assert "SELECT 2 -- params: {'id': 2}" in lines[1]
+    assert writers and set(writers) == {'slow-query-log'}
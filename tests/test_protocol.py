@@ -0,0 +1,74 @@
+import asyncio, datetime, json
+
+import pytest
+
+from protocol import ROUTES, HTTPError, encode_response, parse_body, parse_showtimes_query, read_request, route
+
+
+def read(data):
+    async def parse():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_request(reader)
+    return asyncio.run(parse())
+
+
+def test_routes_match_the_path_and_method():
+    assert route(ROUTES, 'GET', '/movies/') == ('movies', {}, [])
+    assert route(ROUTES, 'GET', '/movies/5/showtimes?limit=3') == ('showtimes', {'limit': ['3']}, ['5'])
+    assert route(ROUTES, 'POST', '/showtimes/7/holds/kiosk%3Aabc/confirm') == ('confirm', {}, ['7', 'kiosk:abc'])
+    assert route(ROUTES, 'DELETE', '/showtimes/7/holds/abc') == ('release', {}, ['7', 'abc'])
+
+
+def test_unknown_paths_and_methods_are_rejected():
+    with pytest.raises(HTTPError) as error:
+        route(ROUTES, 'GET', '/tickets')
+    assert error.value.status == 404
+    with pytest.raises(HTTPError) as error:
+        route(ROUTES, 'POST', '/movies')
+    assert error.value.status == 405
+
+
+@pytest.mark.parametrize('limit', ['0', '-1', '101', 'many', ''])
+def test_showtimes_limit_out_of_range_is_a_bad_request(limit):
+    with pytest.raises(HTTPError) as error:
+        parse_showtimes_query({'limit': [limit]})
+    assert error.value.status == 400
+
+
+def test_showtimes_query_parses_the_cursor_and_limit():
+    assert parse_showtimes_query({}) == (None, 20)
+    assert parse_showtimes_query({'limit': ['100'], 'after': ['2026-10-18,19:30,42']}) == \
+        ((datetime.date(2026, 10, 18), datetime.time(19, 30), 42), 100)
+    with pytest.raises(HTTPError):
+        parse_showtimes_query({'after': ['tomorrow']})
+
+
+def test_read_request_parses_headers_and_body():
+    body = json.dumps({'seat_ids': [1, 2]}).encode()
+    method, target, headers, raw = read(b'post /showtimes/7/holds HTTP/1.1\r\nContent-Length: %d\r\n'
+                                        b'Connection: close\r\n\r\n%s' % (len(body), body))
+    assert (method, target, headers['connection']) == ('POST', '/showtimes/7/holds', 'close')
+    assert parse_body(raw) == {'seat_ids': [1, 2]}
+    assert read(b'') is None
+
+
+def test_bad_requests_are_rejected():
+    with pytest.raises(HTTPError) as error:
+        read(b'nonsense\r\n\r\n')
+    assert error.value.status == 400
+    with pytest.raises(HTTPError) as error:
+        read(b'POST /holds HTTP/1.1\r\nContent-Length: 99999999\r\n\r\n')
+    assert error.value.status == 413
+    for body in (b'{', b'[1, 2]'):
+        with pytest.raises(HTTPError):
+            parse_body(body)
+
+
+def test_responses_are_json_with_a_length():
+    response = encode_response(200, {'date': datetime.date(2026, 10, 18)}, keep_alive=True)
+    head, _, body = response.partition(b'\r\n\r\n')
+    assert head.startswith(b'HTTP/1.1 200 OK\r\n')
+    assert b'Content-Length: %d' % len(body) in head and b'Connection: keep-alive' in head
+    assert json.loads(body) == {'date': '2026-10-18'}
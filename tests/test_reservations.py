@@ -0,0 +1,120 @@
+import pytest
+
+from reservations import SeatReservationEngine, SeatSelection, CLAIM_SEATS_SQL, HOLD_SEATS_SQL, SESSION_LOCK_SQL, run_steps
+
+
+def run(steps, rows):
+    """Run claim steps, answering the claim query with `rows`. Returns (result, (sql, params))."""
+    claim, answer = None, None
+    with pytest.raises(StopIteration) as done:
+        while True:
+            sql, params = steps.send(answer)
+            answer = None
+            if sql in (CLAIM_SEATS_SQL, HOLD_SEATS_SQL):
+                claim, answer = (sql, params), rows
+    return done.value.value, claim
+
+
+def test_claim_sorts_and_deduplicates_the_seats():
+    result, (sql, params) = run(SeatReservationEngine().claim_steps(7, [12, 10, 12]),
+                                [(10, 'Available', True, True, 0), (12, 'Available', True, True, 0)])
+    assert sql == CLAIM_SEATS_SQL
+    assert params['seat_ids'] == [10, 12] and params['count'] == 2 and params['showtime_id'] == 7
+    assert result.ok and result.claimed == [10, 12]
+
+
+def test_conflicts_keep_the_status_each_seat_had():
+    result, _ = run(SeatReservationEngine().claim_steps(7, [10, 11, 12]),
+                    [(10, 'Available', True, False, 0), (11, 'Sold', False, False, 0)])
+    assert not result.ok
+    assert result.claimed == []
+    assert result.conflicts == {11: 'Sold', 12: 'Missing'}
+
+
+def test_hold_passes_the_session_and_ttl():
+    engine = SeatReservationEngine(hold_ttl=90)
+    result, (sql, params) = run(engine.hold_steps(7, [10], 'kiosk-1:abc'), [(10, 'Available', True, True, 2)])
+    assert sql == HOLD_SEATS_SQL
+    assert params['session_id'] == 'kiosk-1:abc' and params['ttl'] == 90 and params['max_seats'] == 5
+    assert result.claimed == [10]
+
+
+def test_hold_takes_the_session_lock_in_its_own_transaction():
+    steps = SeatReservationEngine().hold_steps(7, [10], 'kiosk-1:abc')
+    assert next(steps) == ('BEGIN', None)
+    assert steps.send(None) == (SESSION_LOCK_SQL, {'session_id': 'kiosk-1:abc'})
+    assert steps.send([('',)])[0] == HOLD_SEATS_SQL
+    assert steps.send([(10, 'Available', True, True, 0)]) == ('COMMIT', None)
+
+
+def test_hold_over_the_session_limit_raises():
+    steps = SeatReservationEngine(max_seats=5).hold_steps(7, [10, 11], 'kiosk-1:abc')
+    while next(steps)[0] != HOLD_SEATS_SQL:
+        pass
+    with pytest.raises(ValueError, match='already holds 4'):
+        steps.send([(10, 'Available', True, False, 4), (11, 'Available', True, False, 4)])
+
+
+def test_too_many_seats_raise_before_querying():
+    with pytest.raises(ValueError):
+        next(SeatReservationEngine(max_seats=2).claim_steps(7, [1, 2, 3]))
+
+
+def test_no_seats_needs_no_query():
+    with pytest.raises(StopIteration) as done:
+        next(SeatReservationEngine().claim_steps(7, []))
+    assert done.value.value.ok
+
+
+def test_checkout_drops_conflicting_seats_from_the_selection():
+    selection = SeatSelection(7)
+    for seat_id in (10, 11):
+        selection.toggle(seat_id)
+    result, _ = run(SeatReservationEngine().checkout_steps(selection, 'kiosk-1:abc'),
+                    [(10, 'Available', True, False, 0), (11, 'Selected', False, False, 0)])
+    assert result.conflicts == {11: 'Selected'}
+    assert selection.seat_ids == {10}
+
+
+def test_steps_that_already_ran_cannot_be_rerun():
+    steps = SeatReservationEngine().claim_steps(7, [10])
+    next(steps)
+    with pytest.raises(ValueError):
+        run_steps(None, steps)
+
+
+class FakeConnection:
+    """Autocommit connection that tracks whether a BEGIN is open."""
+    autocommit = True
+
+    def __init__(self, fail_on):
+        self.fail_on = fail_on
+        self.executed = []
+        self.info = self
+        self.transaction_status = 0
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+        if sql in ('BEGIN', 'COMMIT', 'ROLLBACK'):
+            self.transaction_status = 2 if sql == 'BEGIN' else 0
+        if sql == self.fail_on:
+            raise RuntimeError('connection lost')
+
+    description = None
+    rowcount = 0
+
+
+def test_a_failed_hold_rolls_back_its_transaction():
+    connection = FakeConnection(fail_on=HOLD_SEATS_SQL)
+    with pytest.raises(RuntimeError):
+        run_steps(connection, SeatReservationEngine().hold_steps(7, [10], 'kiosk-1:abc'))
+    assert connection.executed == ['BEGIN', SESSION_LOCK_SQL, HOLD_SEATS_SQL, 'ROLLBACK']
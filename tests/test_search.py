@@ -0,0 +1,66 @@
+import random
+
+from search import MovieSearchIndex, tokenize, FIELD_WEIGHTS
+
+WORDS = ['star', 'start', 'stars', 'war', 'wars', 'warden', 'night', 'knight', 'nightmare', 'the', 'then', 'a', 'an']
+GENRES = ['Drama', 'Action', 'Animation', 'Documentary']
+
+
+def make_movies(count, seed=7):
+    rng = random.Random(seed)
+    return [{
+        'movie_id': movie_id,
+        'title': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))).title(),
+        'synopsis': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 6))),
+        'genre': rng.choice(GENRES),
+        'release_year': rng.choice([1999, 2001, 2024]),
+    } for movie_id in range(1, count + 1)]
+
+
+def brute_force(movies, query):
+    """Ids of the movies where every query word is a prefix of a word in a searched field."""
+    tokens = tokenize(query)
+    found = set()
+    for movie in movies:
+        words = [word for field in FIELD_WEIGHTS for word in tokenize(movie.get(field))]
+        if tokens and all(any(word.startswith(token) for word in words) for token in tokens):
+            found.add(movie['movie_id'])
+    return found
+
+
+def typed(text):
+    return [text[:end] for end in range(1, len(text) + 1)]
+
+
+def test_typing_narrows_to_the_same_results_as_a_fresh_search():
+    movies = make_movies(300)
+    index = MovieSearchIndex(movies)
+    for text in ['star wars', 'the night', 'an', 'wars  2001', 'kni dra']:
+        for query in typed(text):
+            results = index.search(query)
+            assert {movie['movie_id'] for movie in results} == brute_force(movies, query), query
+            # Same ranking as an index that has never seen the earlier keystrokes
+            assert results == MovieSearchIndex(movies).search(query), query
+
+
+def test_deleting_and_retyping_matches_brute_force():
+    movies = make_movies(300, seed=11)
+    index = MovieSearchIndex(movies)
+    for query in ['night', 'nig', 'nightm', 'night a', 'night', 'star th', 'star', '', 'war']:
+        assert {movie['movie_id'] for movie in index.search(query)} == brute_force(movies, query), query
+        assert index.count(query) == len(brute_force(movies, query)), query
+
+
+def test_limit_keeps_the_best_results_in_order():
+    movies = make_movies(300, seed=3)
+    index = MovieSearchIndex(movies)
+    for query in ['s', 'star', 'the kn']:
+        assert index.search(query, limit=10) == MovieSearchIndex(movies).search(query)[:10], query
+
+
+def test_titles_starting_with_the_query_come_first():
+    movies = [
+        {'movie_id': 1, 'title': 'Night Watch', 'synopsis': 'star', 'genre': 'Drama', 'release_year': 2001},
+        {'movie_id': 2, 'title': 'Star Night', 'synopsis': '', 'genre': 'Drama', 'release_year': 2001},
+    ]
+    assert [movie['movie_id'] for movie in MovieSearchIndex(movies).search('star')] == [2, 1]